@@ -0,0 +1,102 @@
+"""Сравнение форматов записей кеша: размер в байтах и время кодирования/декодирования по эндпоинтам.
+
+Запуск из корня репозитория:
+    python -m benchmarks.cache_codecs [--repeat 2000]
+"""
+import argparse
+import json
+import random
+import time
+import uuid
+
+from src.models.film import BaseFilm
+from src.services.codecs import CachePayloadCodec, available_codecs, available_compressors, project_hits
+
+WORDS = ('star', 'war', 'night', 'return', 'empire', 'hope', 'dark', 'rise', 'last', 'galaxy', 'trek', 'wars')
+
+
+def _text(words: int) -> str:
+    return ' '.join(random.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _person() -> dict:
+    return {'id': str(uuid.uuid4()), 'name': _text(2)}
+
+
+def _hit(index: str, source: dict) -> dict:
+    return {'_index': index, '_type': '_doc', '_id': source['id'], '_score': random.random() * 10, '_source': source}
+
+
+def film_hit() -> dict:
+    return _hit('movies', {
+        'id': str(uuid.uuid4()),
+        'title': _text(3),
+        'imdb_rating': round(random.uniform(1, 10), 1),
+        'description': _text(60),
+        'genre': [{'id': str(uuid.uuid4()), 'name': _text(1)} for _ in range(3)],
+        'actors': [_person() for _ in range(8)],
+        'writers': [_person() for _ in range(3)],
+        'directors': [_person()],
+        'actors_names': [_text(2) for _ in range(8)],
+        'writers_names': [_text(2) for _ in range(3)],
+        'director': [_text(2)],
+    })
+
+
+def person_hit() -> dict:
+    return _hit('person', {'id': str(uuid.uuid4()), 'full_name': _text(2), 'role': ['actor', 'writer']})
+
+
+def genre_hit() -> dict:
+    return _hit('genre', {'id': str(uuid.uuid4()), 'name': _text(1)})
+
+
+def endpoints() -> dict:
+    film_page = [film_hit() for _ in range(50)]
+    return {
+        # (raw hits, поля, которые реально нужны ответу)
+        '/api/v1/film/': (film_page, tuple(BaseFilm.__fields__)),
+        '/api/v1/film/search': (film_page, tuple(BaseFilm.__fields__)),
+        '/api/v1/film/{id}': ([film_hit()], None),
+        '/api/v1/person/search': ([person_hit() for _ in range(50)], None),
+        '/api/v1/genre/': ([genre_hit() for _ in range(30)], None),
+    }
+
+
+def _measure(dumps, loads, value, repeat: int) -> tuple[int, float, float]:
+    payload = dumps(value)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        dumps(value)
+    encode = (time.perf_counter() - started) / repeat
+    started = time.perf_counter()
+    for _ in range(repeat):
+        loads(payload)
+    decode = (time.perf_counter() - started) / repeat
+    return len(payload), encode, decode
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--compression-min-bytes', type=int, default=4096)
+    args = parser.parse_args()
+
+    random.seed(0)
+    print(f'{"endpoint":<24}{"format":<28}{"bytes":>10}{"encode, us":>14}{"decode, us":>14}')
+    for endpoint, (hits, fields) in endpoints().items():
+        envelope = {'data': hits, 'soft': time.time(), 'delta': 0.01}
+        size, encode, decode = _measure(lambda v: json.dumps(v).encode(), json.loads, envelope, args.repeat)
+        print(f'{endpoint:<24}{"stdlib json, raw hits":<28}{size:>10}{encode * 1e6:>14.1f}{decode * 1e6:>14.1f}')
+
+        projected = {**envelope, 'data': project_hits(hits, fields)}
+        for codec in available_codecs():
+            for compression in available_compressors():
+                payload_codec = CachePayloadCodec(codec, compression, args.compression_min_bytes)
+                size, encode, decode = _measure(payload_codec.dumps, payload_codec.loads, projected, args.repeat)
+                name = f'{codec}+{compression}, projected'
+                print(f'{endpoint:<24}{name:<28}{size:>10}{encode * 1e6:>14.1f}{decode * 1e6:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,611 @@
+"""Локальные заменители Elasticsearch и Redis для нагрузочных прогонов без docker-compose.
+
+FakeElasticsearch понимает ровно те запросы, которые строят сервисы приложения, а FakeRedis - то подмножество
+API aioredis 1.3, которым пользуется RedisBaseClass. Оба считают обращения, чтобы отчёт показывал число походов
+в бэкенды на один HTTP-запрос, и умеют добавлять искусственную сетевую задержку.
+"""
+import asyncio
+import fnmatch
+import functools
+import random
+import time
+import uuid
+from collections import Counter
+from typing import Any, Optional
+
+from elasticsearch.exceptions import NotFoundError
+
+from src.core import metrics
+from src.services.person_films import APPLY_FILM_SCRIPT
+
+WORDS = (
+    'star', 'war', 'night', 'return', 'empire', 'hope', 'dark', 'rise', 'last', 'galaxy', 'trek', 'wars', 'king',
+    'ring', 'lord', 'space', 'time', 'love', 'city', 'dream', 'ghost', 'shadow', 'river', 'storm', 'island',
+)
+GENRES = (
+    'Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Documentary', 'Drama', 'Family', 'Fantasy', 'History',
+    'Horror', 'Music', 'Mystery', 'Romance', 'Sci-Fi', 'Sport', 'Thriller', 'War', 'Western', 'Biography',
+)
+
+
+def _title(rnd: random.Random, words: int) -> str:
+    return ' '.join(rnd.choice(WORDS) for _ in range(words)).title()
+
+
+class Dataset:
+    def __init__(self, films: int = 1000, persons: int = 500, seed: int = 0):
+        rnd = random.Random(seed)
+        self.genres = [{'id': str(uuid.UUID(int=rnd.getrandbits(128), version=4)), 'name': name} for name in GENRES]
+        self.persons = [
+            {'id': str(uuid.UUID(int=rnd.getrandbits(128), version=4)), 'full_name': _title(rnd, 2),
+             'role': rnd.sample(['actor', 'writer', 'director'], rnd.randint(1, 2))}
+            for _ in range(persons)
+        ]
+        self.films = []
+        for _ in range(films):
+            cast = rnd.sample(self.persons, min(len(self.persons), 12))
+            actors = [{'id': p['id'], 'name': p['full_name']} for p in cast[:8]]
+            writers = [{'id': p['id'], 'name': p['full_name']} for p in cast[8:11]]
+            directors = [{'id': p['id'], 'name': p['full_name']} for p in cast[11:]]
+            self.films.append({
+                'id': str(uuid.UUID(int=rnd.getrandbits(128), version=4)),
+                'title': _title(rnd, rnd.randint(1, 4)),
+                'imdb_rating': round(rnd.uniform(1, 10), 1),
+                'description': _title(rnd, 40),
+                'genre': rnd.sample(self.genres, rnd.randint(1, 3)),
+                'actors': actors,
+                'writers': writers,
+                'directors': directors,
+                'actors_names': [a['name'] for a in actors],
+                'writers_names': [w['name'] for w in writers],
+                'director': [d['name'] for d in directors],
+            })
+        self.indexes = {'movies': self.films, 'person': self.persons, 'genre': self.genres}
+
+
+def _index_name(index) -> str:
+    if isinstance(index, (list, tuple)):
+        return index[0]
+    return index.split(',')[0]
+
+
+def _field_values(document: dict, path: str) -> list:
+    values = [document]
+    for part in path.split('.'):
+        next_values = []
+        for value in values:
+            if isinstance(value, dict) and part in value:
+                item = value[part]
+                next_values.extend(item if isinstance(item, list) else [item])
+            elif isinstance(value, list):
+                next_values.extend(v[part] for v in value if isinstance(v, dict) and part in v)
+        values = next_values
+    return values
+
+
+def _project_source(document: dict, includes: list[str]) -> dict:
+    # _source includes с вложенными путями: 'actors.id' оставляет только id в каждом элементе actors
+    source = {}
+    for path in includes:
+        field, _, rest = path.partition('.')
+        if field not in document:
+            continue
+        value = document[field]
+        if not rest:
+            source[field] = value
+        elif isinstance(value, list):
+            projected = [_project_source(item, [rest]) for item in value]
+            source[field] = [{**old, **new} for old, new in zip(source.get(field, [{}] * len(value)), projected)]
+        elif isinstance(value, dict):
+            source[field] = {**source.get(field, {}), **_project_source(value, [rest])}
+    return source
+
+
+def _text_values(document: Any) -> list[str]:
+    if isinstance(document, str):
+        return [document.lower()]
+    if isinstance(document, dict):
+        return [text for value in document.values() for text in _text_values(value)]
+    if isinstance(document, list):
+        return [text for value in document for text in _text_values(value)]
+    return []
+
+
+class _Engine:
+    """Вычисляет query DSL над документами индекса: {позиция документа: score}.
+
+    Для match/term/terms/ids строит инвертированные списки по полю при первом обращении,
+    полнотекстовые multi_match и prefix-запросы сканируют индекс.
+    """
+
+    def __init__(self, documents: list[dict]):
+        self.documents = documents
+        self._postings: dict[str, dict[str, set]] = {}
+        self._texts: Optional[list[str]] = None
+
+    def evaluate(self, query: dict) -> dict[int, float]:
+        (kind, body), = query.items()
+        return getattr(self, f'_{kind}')(body)
+
+    def _postings_for(self, field: str) -> dict[str, set]:
+        postings = self._postings.get(field)
+        if postings is None:
+            postings = self._postings[field] = {}
+            for position, document in enumerate(self.documents):
+                for value in _field_values(document, field):
+                    value = str(value).lower()
+                    for term in {value, *value.split()}:
+                        postings.setdefault(term, set()).add(position)
+        return postings
+
+    def _match_all(self, body):
+        return dict.fromkeys(range(len(self.documents)), 1.0)
+
+    def _match(self, body):
+        (field, value), = body.items()
+        if isinstance(value, dict):
+            value = value['query']
+        return dict.fromkeys(self._postings_for(field).get(str(value).lower(), ()), 1.0)
+
+    _term = _match
+
+    def _terms(self, body):
+        (field, values), = body.items()
+        postings = self._postings_for(field)
+        return dict.fromkeys(set().union(*(postings.get(str(v).lower(), set()) for v in values)), 1.0)
+
+    def _ids(self, body):
+        return self._terms({'id': body['values']})
+
+    def _multi_match(self, body):
+        if self._texts is None:
+            self._texts = [' '.join(_text_values({k: v for k, v in document.items() if k != 'id'}))
+                           for document in self.documents]
+        tokens = str(body['query']).lower().split()
+        scores = {}
+        for position, text in enumerate(self._texts):
+            score = sum(1.0 for token in tokens if token in text)
+            if score:
+                scores[position] = score
+        return scores
+
+    def _match_phrase_prefix(self, body):
+        (field, value), = body.items()
+        if isinstance(value, dict):
+            value = value['query']
+        prefix = str(value).lower()
+        return {position: 1.0 for position, document in enumerate(self.documents)
+                if any(str(v).lower().startswith(prefix) for v in _field_values(document, field))}
+
+    def _nested(self, body):
+        return self.evaluate(body['query'])
+
+    def _bool(self, body):
+        matched = None
+        scores = Counter()
+        for clause in _as_list(body.get('must')):
+            result = self.evaluate(clause)
+            matched = set(result) if matched is None else matched & set(result)
+            scores.update(result)
+        for clause in _as_list(body.get('filter')):
+            result = self.evaluate(clause)
+            matched = set(result) if matched is None else matched & set(result)
+        should = _as_list(body.get('should'))
+        should_counts = Counter()
+        for clause in should:
+            result = self.evaluate(clause)
+            should_counts.update(dict.fromkeys(result, 1))
+            scores.update(result)
+        minimum = int(body.get('minimum_should_match', 0 if matched is not None else 1))
+        if matched is None:
+            matched = set(should_counts) if should and minimum else set(range(len(self.documents)))
+        if should and minimum:
+            matched = {position for position in matched if should_counts[position] >= minimum}
+        for clause in _as_list(body.get('must_not')):
+            matched -= set(self.evaluate(clause))
+        return {position: scores[position] or 1.0 for position in matched}
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _sort_spec(sort: list) -> list[tuple[str, bool]]:
+    spec = []
+    for item in sort:
+        if isinstance(item, str):
+            if item.startswith('-'):
+                field, order = item[1:], 'desc'
+            else:
+                field, order = item, 'desc' if item == '_score' else 'asc'
+        else:
+            (field, options), = item.items()
+            order = options.get('order', 'asc') if isinstance(options, dict) else options
+        spec.append((field, order == 'desc'))
+    return spec
+
+
+def _compare(left: list, right: list, spec: list[tuple[str, bool]]) -> int:
+    for a, b, (_, descending) in zip(left, right, spec):
+        if a == b:
+            continue
+        result = -1 if a < b else 1
+        return -result if descending else result
+    return 0
+
+
+class _Transport:
+    def __init__(self, elastic: 'FakeElasticsearch'):
+        self.elastic = elastic
+
+    async def perform_request(self, method: str, url: str, params: Optional[dict] = None, body=None):
+        await self.elastic._call('transport')
+        if method == 'POST' and url.endswith('/_pit'):
+            pit_id = uuid.uuid4().hex
+            self.elastic.pits[pit_id] = url.strip('/').split('/')[0]
+            return {'id': pit_id}
+        if method == 'DELETE' and url == '/_pit':
+            self.elastic.pits.pop((body or {}).get('id'), None)
+            return {'succeeded': True}
+        raise NotImplementedError(f'{method} {url}')
+
+
+class _Indices:
+    def __init__(self, elastic: 'FakeElasticsearch'):
+        self.elastic = elastic
+
+    async def stats(self, index: str, metric: Optional[str] = None, **kwargs) -> dict:
+        await self.elastic._call('stats')
+        indices = {}
+        for name in index.split(','):
+            count = len(self.elastic._documents(name))
+            indices[name] = {'primaries': {
+                'docs': {'count': count, 'deleted': 0},
+                'indexing': {'index_total': count, 'delete_total': 0},
+                'refresh': {'total': 1},
+            }}
+        return {'indices': indices}
+
+
+class FakeElasticsearch:
+    def __init__(self, dataset: Dataset, latency_ms: float = 0.0):
+        self.dataset = dataset
+        self.latency = latency_ms / 1000
+        self.calls = Counter()
+        self.pits: dict[str, str] = {}
+        self.transport = _Transport(self)
+        self.indices = _Indices(self)
+        self._engines: dict[str, _Engine] = {}
+
+    async def _call(self, name: str):
+        # Реальный клиент замеряется в ElasticTransport, здесь учитываем только эмулированную задержку
+        self.calls[name] += 1
+        started = time.perf_counter()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        metrics.record(metrics.ELASTIC_REQUEST_DURATION, 'es', time.perf_counter() - started, name, '')
+
+    def _documents(self, index: str) -> list[dict]:
+        if index not in self.dataset.indexes:
+            raise NotFoundError(404, 'index_not_found_exception', {'index': index})
+        return self.dataset.indexes[index]
+
+    async def ping(self, **kwargs) -> bool:
+        await self._call('ping')
+        return True
+
+    async def info(self, **kwargs) -> dict:
+        await self._call('info')
+        return {'version': {'number': '7.16.2'}}
+
+    async def close(self):
+        pass
+
+    async def get(self, index, id, **kwargs) -> dict:
+        await self._call('get')
+        index = _index_name(index)
+        for document in self._documents(index):
+            if document['id'] == str(id):
+                return {'_index': index, '_id': document['id'], 'found': True, '_source': document}
+        raise NotFoundError(404, 'not_found', {'_id': id})
+
+    async def mget(self, body: dict, index=None, **kwargs) -> dict:
+        await self._call('mget')
+        index = _index_name(index)
+        by_id = {document['id']: document for document in self._documents(index)}
+        return {'docs': [
+            {'_index': index, '_id': str(doc_id), 'found': True, '_source': by_id[str(doc_id)]}
+            if str(doc_id) in by_id else {'_index': index, '_id': str(doc_id), 'found': False}
+            for doc_id in body['ids']
+        ]}
+
+    async def search(self, body: Optional[dict] = None, index=None, **kwargs) -> dict:
+        await self._call('search')
+        return self._search(index, body or {})
+
+    async def msearch(self, body, index=None, **kwargs) -> dict:
+        await self._call('msearch')
+        responses = []
+        for header, search_body in zip(body[::2], body[1::2]):
+            try:
+                responses.append(self._search(header.get('index', index), search_body))
+            except NotFoundError as error:
+                responses.append({'error': {'type': error.error}, 'status': 404})
+        return {'responses': responses}
+
+    def _search(self, index, body: dict) -> dict:
+        pit = body.get('pit')
+        index = self.pits[pit['id']] if pit else _index_name(index)
+        engine = self._engines.get(index)
+        if engine is None:
+            engine = self._engines[index] = _Engine(self._documents(index))
+        documents = engine.documents
+        hits = [(score, documents[position])
+                for position, score in engine.evaluate(body.get('query', {'match_all': {}})).items()]
+
+        spec = _sort_spec(body.get('sort', []))
+        if spec:
+            def sort_values(hit):
+                score, document = hit
+                return [score if field == '_score' else (_field_values(document, field) or [None])[0]
+                        for field, _ in spec]
+
+            hits = [(sort_values(hit), hit) for hit in hits]
+            hits.sort(key=functools.cmp_to_key(lambda a, b: _compare(a[0], b[0], spec)))
+            if 'search_after' in body:
+                hits = [hit for hit in hits if _compare(hit[0], body['search_after'], spec) > 0]
+        else:
+            hits = [(None, hit) for hit in sorted(hits, key=lambda hit: -hit[0])]
+
+        start = body.get('from', 0)
+        page = hits[start:start + body.get('size', 10)]
+        includes = body.get('_source')
+        if isinstance(includes, dict):
+            includes = includes.get('includes')
+        response_hits = []
+        for values, (score, document) in page:
+            source = _project_source(document, includes) if includes else document
+            hit = {'_index': index, '_type': '_doc', '_id': document['id'], '_score': score, '_source': source}
+            if values is not None:
+                hit['sort'] = values
+            response_hits.append(hit)
+        response = {'hits': {'total': {'value': len(hits), 'relation': 'eq'}, 'hits': response_hits}}
+        if pit:
+            response['pit_id'] = pit['id']
+        if body.get('aggs'):
+            response['aggregations'] = self._aggregations(body['aggs'], [document for _, (_, document) in hits])
+        return response
+
+    def _aggregations(self, aggs: dict, documents: list[dict]) -> dict:
+        result = {}
+        for name, agg in aggs.items():
+            if 'nested' in agg:
+                result[name] = {'doc_count': len(documents), **self._aggregations(agg.get('aggs', {}), documents)}
+            elif 'terms' in agg:
+                counts = Counter(value for document in documents
+                                 for value in set(map(str, _field_values(document, agg['terms']['field']))))
+                size = agg['terms'].get('size', 10)
+                result[name] = {'buckets': [{'key': key, 'doc_count': count}
+                                            for key, count in counts.most_common(size)]}
+        return result
+
+
+class _Pipeline:
+    def __init__(self, redis: 'FakeRedis'):
+        self.redis = redis
+        self.commands = []
+
+    def __getattr__(self, name: str):
+        def command(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+        return command
+
+    async def execute(self) -> list:
+        await self.redis._call('pipeline')
+        return [getattr(self.redis, f'_{name}')(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class _Channel:
+    """Канал подписки в стиле aioredis.Channel: wait_message() возвращает False после закрытия."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.messages: asyncio.Queue = asyncio.Queue()
+        self._next = None
+
+    async def wait_message(self) -> bool:
+        if self._next is None:
+            self._next = await self.messages.get()
+        return self._next is not _CLOSED
+
+    async def get(self) -> Optional[bytes]:
+        if not await self.wait_message():
+            return None
+        message, self._next = self._next, None
+        return message
+
+    def close(self):
+        self.messages.put_nowait(_CLOSED)
+
+
+_CLOSED = object()
+
+
+class FakeRedis:
+    SET_IF_NOT_EXIST = 'SET_IF_NOT_EXIST'
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.calls = Counter()
+        self.data: dict[str, Any] = {}
+        self.expires: dict[str, float] = {}
+        self.channels: list[_Channel] = []
+
+    async def _call(self, name: str):
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _alive(self, key: str) -> bool:
+        expire_at = self.expires.get(key)
+        if expire_at is not None and expire_at <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    @staticmethod
+    def _key(key) -> str:
+        return key.decode() if isinstance(key, bytes) else key
+
+    def _get(self, key):
+        key = self._key(key)
+        return self.data[key] if self._alive(key) else None
+
+    def _set(self, key, value, expire=0, pexpire=0, exist=None):
+        key = self._key(key)
+        if exist == self.SET_IF_NOT_EXIST and self._alive(key):
+            return False
+        self.data[key] = value.encode() if isinstance(value, str) else value
+        self.expires.pop(key, None)
+        if expire or pexpire:
+            self.expires[key] = time.monotonic() + (expire or pexpire / 1000)
+        return True
+
+    def _mget(self, *keys):
+        return [self._get(key) for key in keys]
+
+    def _pttl(self, key):
+        key = self._key(key)
+        if not self._alive(key):
+            return -2
+        if key not in self.expires:
+            return -1
+        return int((self.expires[key] - time.monotonic()) * 1000)
+
+    def _expire(self, key, seconds):
+        key = self._key(key)
+        if not self._alive(key):
+            return 0
+        self.expires[key] = time.monotonic() + seconds
+        return 1
+
+    def _delete(self, *keys):
+        deleted = 0
+        for key in map(self._key, keys):
+            if self._alive(key):
+                deleted += 1
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return deleted
+
+    def _sadd(self, key, *members):
+        key = self._key(key)
+        if not self._alive(key):
+            self.data[key] = set()
+        before = len(self.data[key])
+        self.data[key].update(m.encode() if isinstance(m, str) else m for m in members)
+        return len(self.data[key]) - before
+
+    def _smembers(self, key):
+        key = self._key(key)
+        return list(self.data[key]) if self._alive(key) else []
+
+    def _sunion(self, *keys):
+        return list(set().union(*(self._smembers(key) for key in keys)))
+
+    def _hset(self, key, field, value):
+        key = self._key(key)
+        if not self._alive(key):
+            self.data[key] = {}
+        self.data[key][self._key(field)] = value.encode() if isinstance(value, str) else value
+        return 1
+
+    def _hget(self, key, field):
+        key = self._key(key)
+        return self.data[key].get(self._key(field)) if self._alive(key) else None
+
+    def _hvals(self, key):
+        key = self._key(key)
+        return list(self.data[key].values()) if self._alive(key) else []
+
+    def _exists(self, key):
+        return int(self._alive(self._key(key)))
+
+    def _hmget(self, key, *fields):
+        return [self._hget(key, field) for field in fields]
+
+    def _hdel(self, key, *fields):
+        key = self._key(key)
+        if not self._alive(key):
+            return 0
+        return sum(1 for field in fields if self.data[key].pop(self._key(field), None) is not None)
+
+    def _ping(self):
+        return b'PONG'
+
+    def __getattr__(self, name: str):
+        # Асинхронные команды в стиле aioredis поверх синхронных _<команда>
+        implementation = getattr(type(self), f'_{name}', None)
+        if implementation is None:
+            raise AttributeError(name)
+
+        async def command(*args, **kwargs):
+            await self._call(name)
+            return implementation(self, *args, **kwargs)
+        return command
+
+    def pipeline(self) -> _Pipeline:
+        return _Pipeline(self)
+
+    def _eval(self, script: str, keys=(), args=()):
+        # Скрипты приложения выполняются их аналогами на Python - так же атомарно, без переключения корутин
+        keys = [self._key(key) for key in keys]
+        args = [arg.encode() if isinstance(arg, str) else arg for arg in args]
+        if script == APPLY_FILM_SCRIPT:
+            return self._apply_film_script(keys, args)
+        return self._release_lock_script(keys, args)
+
+    def _release_lock_script(self, keys: list[str], args: list[bytes]) -> int:
+        if self._get(keys[0]) == args[0]:
+            return self._delete(keys[0])
+        return 0
+
+    def _apply_film_script(self, keys: list[str], args: list[bytes]) -> int:
+        film_id, card, prefix, *person_ids = args
+        for person_id in self._smembers(keys[0]):
+            if person_id not in person_ids:
+                self._hdel(prefix + person_id, film_id)
+        self._delete(keys[0])
+        for person_id in person_ids:
+            self._hset(prefix + person_id, film_id, card)
+            self._sadd(keys[0], person_id)
+        return len(person_ids)
+
+    async def iscan(self, match: str = '*', count: int = None):
+        await self._call('scan')
+        for key in list(self.data):
+            if self._alive(key) and fnmatch.fnmatchcase(key, match):
+                yield key.encode()
+
+    async def subscribe(self, *names: str) -> list[_Channel]:
+        await self._call('subscribe')
+        channels = [_Channel(name) for name in names]
+        self.channels.extend(channels)
+        return channels
+
+    async def publish(self, name: str, message) -> int:
+        await self._call('publish')
+        receivers = [channel for channel in self.channels if channel.name == name]
+        for channel in receivers:
+            channel.messages.put_nowait(message.encode() if isinstance(message, str) else message)
+        return len(receivers)
+
+    def close(self):
+        for channel in self.channels:
+            channel.close()
+        self.channels.clear()
+
+    async def wait_closed(self):
+        pass
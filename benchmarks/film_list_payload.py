@@ -0,0 +1,48 @@
+"""Размер ответа Elasticsearch и записи кеша для списков фильмов с полным _source и с source filtering.
+
+Нужен запущенный Elasticsearch с индексом movies (адрес берётся из настроек приложения):
+    python -m benchmarks.film_list_payload [--size 50] [--sort -imdb_rating] [--query star]
+"""
+import argparse
+import asyncio
+import time
+
+import orjson
+from elasticsearch import AsyncElasticsearch
+from elasticsearch_dsl import Search
+
+from src.core.config import settings
+from src.services.codecs import cache_codec, project_hits
+from src.services.film import FILM_LIST_FIELDS
+
+
+async def measure(elastic: AsyncElasticsearch, name: str, search: Search):
+    for variant, s in (('full _source', search), ('source filtering', search.source(FILM_LIST_FIELDS))):
+        started = time.perf_counter()
+        response = await elastic.search(index='movies', body=s.to_dict())
+        elapsed = time.perf_counter() - started
+        hits = response['hits']['hits']
+        response_bytes = len(orjson.dumps(response))
+        cache_bytes = len(cache_codec.dumps({'data': project_hits(hits), 'soft': time.time(), 'delta': elapsed}))
+        print(f'{name:<16}{variant:<20}{len(hits):>6}{response_bytes:>16}{cache_bytes:>14}{elapsed * 1000:>12.1f}')
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=50)
+    parser.add_argument('--sort', default='-imdb_rating')
+    parser.add_argument('--query', default='star')
+    args = parser.parse_args()
+
+    elastic = AsyncElasticsearch(hosts=[f'{settings.ELASTIC_HOST}:{settings.ELASTIC_PORT}'])
+    try:
+        print(f'{"endpoint":<16}{"variant":<20}{"hits":>6}{"ES bytes":>16}{"cache bytes":>14}{"ES, ms":>12}')
+        await measure(elastic, '/film/', Search(index='movies').query('match_all').sort(args.sort)[:args.size])
+        await measure(elastic, '/film/search', Search(index='movies').query(
+            'multi_match', query=args.query, fuzziness='auto')[:args.size])
+    finally:
+        await elastic.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
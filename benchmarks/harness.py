@@ -0,0 +1,25 @@
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from benchmarks.fakes import FakeElasticsearch, FakeRedis
+
+
+@asynccontextmanager
+async def app_with_backends(elastic: FakeElasticsearch, redis: FakeRedis):
+    """Поднимает src.main:app с обычными startup/shutdown, подменив фабрики клиентов на заменители."""
+    from src import main
+
+    async def create_redis_pool(*args, **kwargs):
+        return redis
+
+    original_aioredis, original_elastic = main.aioredis, main.AsyncElasticsearch
+    main.aioredis = SimpleNamespace(create_redis_pool=create_redis_pool)
+    main.AsyncElasticsearch = lambda *args, **kwargs: elastic
+    try:
+        await main.startup()
+        try:
+            yield main.app
+        finally:
+            await main.shutdown()
+    finally:
+        main.aioredis, main.AsyncElasticsearch = original_aioredis, original_elastic
@@ -0,0 +1,154 @@
+"""Нагрузочный прогон src.main:app на локальных заменителях Elasticsearch и Redis.
+
+Приложение вызывается напрямую как ASGI, без сети, поэтому результаты отражают стоимость кода и число
+обращений к бэкендам. Задержку бэкендов можно сэмулировать через --es-latency-ms/--redis-latency-ms.
+
+Запуск из корня репозитория:
+    python -m benchmarks.load [--films 1000] [--requests 500] [--concurrency 20] [--scenario film_list ...]
+    python -m benchmarks.load --max-es-calls 2  # код возврата 1, если сценарий в среднем делает больше запросов в ES
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from typing import Callable
+from urllib.parse import quote
+
+from benchmarks.fakes import WORDS, Dataset, FakeElasticsearch, FakeRedis
+
+Scenario = Callable[[random.Random, Dataset], str]
+
+SCENARIOS: dict[str, Scenario] = {
+    'film_list': lambda rnd, data: (
+        f'/api/v1/film/?sort=-imdb_rating&page[number]={rnd.randint(1, 5)}&page[size]=50'
+    ),
+    'film_list_genre': lambda rnd, data: (
+        f'/api/v1/film/?sort=-imdb_rating&filter[genre]={rnd.choice(data.genres)["id"]}&page[size]=50'
+    ),
+    'film_facets': lambda rnd, data: f'/api/v1/film/facets?filter[genre]={rnd.choice(data.genres)["id"]}',
+    'film_search': lambda rnd, data: f'/api/v1/film/search?query={quote(rnd.choice(WORDS))}&page[size]=50',
+    'film_suggest': lambda rnd, data: f'/api/v1/film/suggest?query={quote(rnd.choice(WORDS)[:rnd.randint(1, 4)])}',
+    'person_suggest':
+        lambda rnd, data: f'/api/v1/person/suggest?query={quote(rnd.choice(WORDS)[:rnd.randint(1, 4)])}',
+    'film_detail': lambda rnd, data: f'/api/v1/film/{rnd.choice(data.films)["id"]}',
+    'person_search': lambda rnd, data: f'/api/v1/person/search?query={quote(rnd.choice(WORDS))}&page[size]=50',
+    'person_detail': lambda rnd, data: f'/api/v1/person/{rnd.choice(data.persons)["id"]}',
+    'person_films': lambda rnd, data: f'/api/v1/person/{rnd.choice(data.persons)["id"]}/film',
+    'genre_list': lambda rnd, data: '/api/v1/genre/',
+    'genre_detail': lambda rnd, data: f'/api/v1/genre/{rnd.choice(data.genres)["id"]}',
+}
+
+
+async def call_app(app, url: str) -> tuple[int, bytes]:
+    path, _, query = url.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', b'benchmark')], 'client': ('127.0.0.1', 0), 'server': ('benchmark', 80),
+    }
+    status = 0
+    body = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body':
+            body.append(message.get('body', b''))
+
+    await app(scope, receive, send)
+    return status, b''.join(body)
+
+
+async def run_scenario(app, name: str, scenario: Scenario, dataset: Dataset, elastic: FakeElasticsearch,
+                       redis: FakeRedis, requests: int, concurrency: int, seed: int) -> dict:
+    rnd = random.Random(seed)
+    urls = [scenario(rnd, dataset) for _ in range(requests)]
+    latencies = []
+    statuses = Counter()
+    queue = iter(urls)
+    es_before, redis_before = sum(elastic.calls.values()), sum(redis.calls.values())
+
+    async def worker():
+        for url in queue:
+            started = time.perf_counter()
+            status, _ = await call_app(app, url)
+            latencies.append(time.perf_counter() - started)
+            statuses[int(status)] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'scenario': name,
+        'rps': requests / elapsed,
+        'p50': quantiles[49] * 1000,
+        'p95': quantiles[94] * 1000,
+        'p99': quantiles[98] * 1000,
+        'es_calls': (sum(elastic.calls.values()) - es_before) / requests,
+        'redis_calls': (sum(redis.calls.values()) - redis_before) / requests,
+        'statuses': dict(statuses),
+    }
+
+
+def print_report(results: list[dict]):
+    print(f'{"scenario":<18}{"rps":>10}{"p50, ms":>10}{"p95, ms":>10}{"p99, ms":>10}'
+          f'{"ES/req":>10}{"Redis/req":>11}  statuses')
+    for r in results:
+        print(f'{r["scenario"]:<18}{r["rps"]:>10.0f}{r["p50"]:>10.2f}{r["p95"]:>10.2f}{r["p99"]:>10.2f}'
+              f'{r["es_calls"]:>10.2f}{r["redis_calls"]:>11.2f}  {r["statuses"]}')
+
+
+async def main(args: argparse.Namespace) -> int:
+    # Настройки читаются при импорте приложения, поэтому выставляем их до него
+    if args.no_http_cache:
+        os.environ['HTTP_CACHE_ENABLED'] = 'false'
+    if args.local_cache:
+        os.environ['LOCAL_CACHE_ENABLED'] = 'true'
+
+    dataset = Dataset(films=args.films, persons=args.persons, seed=args.seed)
+    elastic = FakeElasticsearch(dataset, latency_ms=args.es_latency_ms)
+    redis = FakeRedis(latency_ms=args.redis_latency_ms)
+
+    from benchmarks.harness import app_with_backends
+    async with app_with_backends(elastic, redis) as app:
+        results = []
+        for number, name in enumerate(args.scenario or SCENARIOS):
+            results.append(await run_scenario(app, name, SCENARIOS[name], dataset, elastic, redis, args.requests,
+                                              args.concurrency, args.seed + number))
+    print_report(results)
+
+    if args.max_es_calls is not None:
+        failed = [r['scenario'] for r in results if r['es_calls'] > args.max_es_calls]
+        if failed:
+            print(f'ES calls per request above {args.max_es_calls}: {", ".join(failed)}', file=sys.stderr)
+            return 1
+    return 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--films', type=int, default=1000)
+    parser.add_argument('--persons', type=int, default=500)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS))
+    parser.add_argument('--es-latency-ms', type=float, default=2.0)
+    parser.add_argument('--redis-latency-ms', type=float, default=0.3)
+    parser.add_argument('--no-http-cache', action='store_true', help='disable the response cache middleware')
+    parser.add_argument('--local-cache', action='store_true', help='enable the in-process cache in front of Redis')
+    parser.add_argument('--max-es-calls', type=float, help='fail if a scenario averages more ES calls per request')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main(parse_args())))
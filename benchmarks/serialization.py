@@ -0,0 +1,75 @@
+"""CPU на сборку ответа: прежний путь (валидация моделей сервиса, API-моделей и response_model)
+против construct_trusted + dict + ORJSONResponse.
+
+Запуск из корня репозитория:
+    python -m benchmarks.serialization [--repeat 500]
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from fastapi.responses import ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from benchmarks.cache_codecs import film_hit
+from src.api.v1.film import Film, FilmBase
+from src.api.v1.genre import Genre
+from src.api.v1.serializers import film_out, film_short_out
+from src.models.film import BaseFilm, FullFilm
+
+
+async def old_list(sources: list[dict], field) -> bytes:
+    films = [BaseFilm(**source) for source in sources]
+    films_out = [FilmBase(uuid=film.id, **film.__dict__) for film in films]
+    content = await serialize_response(field=field, response_content=films_out)
+    return ORJSONResponse(content).body
+
+
+async def new_list(sources: list[dict], field) -> bytes:
+    films = [BaseFilm.construct_trusted(source) for source in sources]
+    return ORJSONResponse([film_short_out(film) for film in films]).body
+
+
+async def old_detail(source: dict, field) -> bytes:
+    film = FullFilm(**source)
+    genre_out = [Genre(uuid=genre.id, name=genre.name) for genre in film.genre]
+    del(film.__dict__['genre'])
+    content = await serialize_response(field=field, response_content=Film(uuid=film.id, genre=genre_out,
+                                                                           **film.__dict__))
+    return ORJSONResponse(content).body
+
+
+async def new_detail(source: dict, field) -> bytes:
+    return ORJSONResponse(film_out(FullFilm.construct_trusted(source))).body
+
+
+async def measure(name: str, func, payload, field, repeat: int):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await func(payload, field)
+    print(f'{name:<28}{(time.perf_counter() - started) / repeat * 1e6:>14.1f}')
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=500)
+    parser.add_argument('--page-size', type=int, default=50)
+    args = parser.parse_args()
+
+    random.seed(0)
+    page = [film_hit()['_source'] for _ in range(args.page_size)]
+    detail = film_hit()['_source']
+    list_field = create_response_field(name='films', type_=list[FilmBase])
+    detail_field = create_response_field(name='film', type_=Film)
+
+    print(f'{"path":<28}{"us per request":>14}')
+    await measure('film list, validated', old_list, page, list_field, args.repeat)
+    await measure('film list, trusted', new_list, page, list_field, args.repeat)
+    await measure('film detail, validated', old_detail, detail, detail_field, args.repeat)
+    await measure('film detail, trusted', new_detail, detail, detail_field, args.repeat)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
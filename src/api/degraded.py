@@ -0,0 +1,62 @@
+import logging
+import math
+from http import HTTPStatus
+
+from elasticsearch.exceptions import ConnectionError, TransportError
+from fastapi.responses import ORJSONResponse
+from starlette.requests import Request
+
+from src.core.config import settings
+from src.db.elastic import UNAVAILABLE_STATUSES, ElasticOverloadedError
+from src.services.redis import Freshness, current_freshness
+
+logger = logging.getLogger(__name__)
+
+STALE_HEADERS = [(b'x-cache-status', b'stale'), (b'warning', b'110 - "Response is Stale"')]
+
+
+class StaleResponseMiddleware:
+    """Помечает заголовками ответы из устаревших записей кеша, которые не удалось обновить (см. refresh_unavailable).
+
+    Стоит внутри HTTPCacheMiddleware, чтобы тот видел пометку и не сохранял такие ответы.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        freshness = Freshness()
+        token = current_freshness.set(freshness)
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start' and freshness.stale:
+                message = {**message, 'headers': list(message.get('headers', [])) + STALE_HEADERS}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_freshness.reset(token)
+
+
+async def elastic_error_handler(request: Request, error: TransportError) -> ORJSONResponse:
+    if isinstance(error, ElasticOverloadedError):
+        # Лимит параллельных запросов: отказываем сразу, не добавляя нагрузки на кластер
+        return ORJSONResponse(
+            {'detail': 'search backend is overloaded'},
+            status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+            headers={'Retry-After': '1'},
+        )
+    # Недоступный Elasticsearch при пустом кеше - быстрый 503, а не 500 после таймаута
+    if isinstance(error, ConnectionError) or error.status_code in UNAVAILABLE_STATUSES:
+        logger.warning('Elasticsearch is unavailable: %s', error)
+        return ORJSONResponse(
+            {'detail': 'search backend is unavailable'},
+            status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+            headers={'Retry-After': str(math.ceil(settings.ELASTIC_BREAKER_RESET_TIMEOUT_IN_SECONDS))},
+        )
+    logger.exception('Elasticsearch request failed', exc_info=error)
+    return ORJSONResponse({'detail': 'Internal Server Error'}, status_code=HTTPStatus.INTERNAL_SERVER_ERROR)
@@ -0,0 +1,32 @@
+from http import HTTPStatus
+
+from aioredis import Redis
+from elasticsearch import AsyncElasticsearch
+from fastapi import APIRouter, Depends
+from fastapi.responses import ORJSONResponse
+
+from src.db.elastic import get_elastic
+from src.db.redis import get_redis
+from src.services.health import check_backends
+
+router = APIRouter()
+
+
+@router.get('/live')
+async def liveness():
+    # Процесс жив и обслуживает event loop; бэкенды не проверяем, чтобы их сбой не приводил к перезапуску
+    return ORJSONResponse({'status': 'ok'})
+
+
+@router.get('/ready')
+async def readiness(redis: Redis = Depends(get_redis), elastic: AsyncElasticsearch = Depends(get_elastic)):
+    # Готовность зависит только от Redis: без Elasticsearch воркер отвечает из кеша, и снимать его с балансировки
+    # или перезапускать именно тогда нельзя. Недоступный ES отражается в статусе degraded
+    backends = await check_backends(redis, elastic)
+    if not backends['redis']:
+        status, status_code = 'unavailable', HTTPStatus.SERVICE_UNAVAILABLE
+    elif not all(backends.values()):
+        status, status_code = 'degraded', HTTPStatus.OK
+    else:
+        status, status_code = 'ok', HTTPStatus.OK
+    return ORJSONResponse({'status': status, 'backends': backends}, status_code=status_code)
@@ -0,0 +1,171 @@
+import hashlib
+import logging
+import math
+import time
+import weakref
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode
+
+from aioredis import Redis
+
+from src.core.config import settings
+from src.db.local_cache import LocalCache
+
+logger = logging.getLogger(__name__)
+
+# Сколько ответ по сущности считается свежим у клиента и CDN, совпадает со сроком кеша сервиса
+MAX_AGE_BY_PREFIX = (
+    ('/api/v1/film', lambda: settings.FILM_CACHE_EXPIRE_IN_SECONDS),
+    ('/api/v1/genre', lambda: settings.GENRE_CACHE_EXPIRE_IN_SECONDS),
+    ('/api/v1/person', lambda: settings.PERSON_CACHE_EXPIRE_IN_SECONDS),
+)
+
+# Хранилища ответов всех HTTPCacheMiddleware воркера, чтобы сбросить их по сообщению об инвалидации
+_stores: weakref.WeakSet = weakref.WeakSet()
+_subscribed = False
+
+
+class HTTPCacheMiddleware:
+    """Кеширует готовые ответы GET /api/v1/* в памяти воркера и выставляет ETag и Cache-Control.
+
+    Ключ - путь и отсортированные параметры запроса. Тела ответов хранятся HTTP_CACHE_STORE_EXPIRE_IN_SECONDS,
+    их ETag - весь срок max-age, так что на совпавший If-None-Match воркер отвечает 304, не доходя до сервисов,
+    Redis и Elasticsearch. Оба хранилища сбрасываются по сообщению об инвалидации (см. listen_for_invalidations).
+    """
+
+    def __init__(self, app, max_entries: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.app = app
+        self.store = LocalCache(
+            max_entries=max_entries or settings.HTTP_CACHE_MAX_ENTRIES,
+            max_bytes=max_bytes or settings.HTTP_CACHE_MAX_BYTES,
+            ttl=settings.HTTP_CACHE_STORE_EXPIRE_IN_SECONDS,
+        )
+        # Ключ -> (ETag, момент окончания max-age); размер записи считаем по длине ключа и ETag
+        self.etags = LocalCache(
+            max_entries=settings.HTTP_CACHE_ETAG_MAX_ENTRIES,
+            max_bytes=settings.HTTP_CACHE_ETAG_MAX_ENTRIES * 1024,
+            ttl=max(max_age() for _, max_age in MAX_AGE_BY_PREFIX),
+        )
+        _stores.update((self.store, self.etags))
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'GET':
+            await self.app(scope, receive, send)
+            return
+        max_age = self._max_age(scope['path'])
+        if max_age is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = self._cache_key(scope)
+        if_none_match = self._header(scope, b'if-none-match')
+        cached = self.store.get(key)
+        if cached is not None:
+            await self._send_cached(cached, if_none_match, send)
+            return
+        if if_none_match is not None:
+            known = self.etags.get(key)
+            if known is not None and self._etag_matches(known[0], if_none_match):
+                # Тело уже вытеснено, но ETag ещё в пределах max-age: клиенту продлеваем только остаток срока
+                remaining = max(0, math.ceil(known[1] - time.monotonic()))
+                await self._send_not_modified(
+                    [(b'etag', known[0]), (b'cache-control', f'public, max-age={remaining}'.encode())], send,
+                )
+                return
+
+        start_message = {}
+        body_parts = []
+
+        async def capture(message):
+            if message['type'] == 'http.response.start':
+                start_message.update(message)
+            elif message['type'] == 'http.response.body':
+                body_parts.append(message.get('body', b''))
+                if not message.get('more_body', False):
+                    await finish()
+
+        async def finish():
+            body = b''.join(body_parts)
+            if start_message['status'] != 200:
+                self.etags.delete(key)
+                await send(start_message)
+                await send({'type': 'http.response.body', 'body': body})
+                return
+            if (b'x-cache-status', b'stale') in start_message.get('headers', []):
+                # Ответ из устаревших данных не сохраняем, чтобы он не пережил восстановление Elasticsearch
+                self.etags.delete(key)
+                headers = [(name, value) for name, value in start_message['headers']
+                           if name.lower() != b'cache-control']
+                await send({**start_message, 'headers': headers + [(b'cache-control', b'no-cache')]})
+                await send({'type': 'http.response.body', 'body': body})
+                return
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'.encode()
+            headers = [(name, value) for name, value in start_message.get('headers', [])
+                       if name.lower() not in (b'etag', b'cache-control')]
+            headers += [(b'etag', etag), (b'cache-control', f'public, max-age={max_age}'.encode())]
+            cached = {'status': 200, 'headers': headers, 'body': body, 'etag': etag}
+            self.store.set(key, cached, len(body), ttl=max_age)
+            self.etags.set(key, (etag, time.monotonic() + max_age), len(key) + len(etag), ttl=max_age)
+            await self._send_cached(cached, if_none_match, send)
+
+        await self.app(scope, receive, capture)
+
+    @classmethod
+    async def _send_cached(cls, cached: dict, if_none_match: Optional[bytes], send):
+        if if_none_match is not None and cls._etag_matches(cached['etag'], if_none_match):
+            headers = [(name, value) for name, value in cached['headers'] if name in (b'etag', b'cache-control')]
+            await cls._send_not_modified(headers, send)
+            return
+        await send({'type': 'http.response.start', 'status': cached['status'], 'headers': cached['headers']})
+        await send({'type': 'http.response.body', 'body': cached['body']})
+
+    @staticmethod
+    async def _send_not_modified(headers: list, send):
+        await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    @staticmethod
+    def _etag_matches(etag: bytes, if_none_match: bytes) -> bool:
+        return etag in [tag.strip() for tag in if_none_match.split(b',')]
+
+    @staticmethod
+    def _max_age(path: str) -> Optional[int]:
+        for prefix, max_age in MAX_AGE_BY_PREFIX:
+            if path.startswith(prefix):
+                return max_age()
+        return None
+
+    @staticmethod
+    def _cache_key(scope) -> str:
+        # Порядок параметров не влияет на ключ: ?a=1&b=2 и ?b=2&a=1 дают одну запись
+        query = sorted(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+        return f'{scope["path"]}?{urlencode(query)}'
+
+    @staticmethod
+    def _header(scope, name: bytes) -> Optional[bytes]:
+        for header_name, value in scope['headers']:
+            if header_name == name:
+                return value
+        return None
+
+
+def purge_response_caches():
+    for store in list(_stores):
+        store.clear()
+
+
+async def listen_for_invalidations(redis: Redis):
+    """Сбрасывает HTTP-кеш воркера по сообщениям RedisBaseClass.invalidate_*. Возвращается при потере соединения.
+
+    Какие ответы упоминают сущность, по ETag без тела не понять, поэтому сбрасывается всё: инвалидация редкая.
+    """
+    global _subscribed
+    channel, = await redis.subscribe(settings.CACHE_INVALIDATION_CHANNEL)
+    if _subscribed:
+        # Пока подписки не было, сообщения могли потеряться
+        purge_response_caches()
+    _subscribed = True
+    while await channel.wait_message():
+        message = await channel.get()
+        logger.info('Cache invalidation %s, purging HTTP cache', message)
+        purge_response_caches()
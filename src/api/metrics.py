@@ -0,0 +1,107 @@
+import time
+from typing import Optional
+
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Match
+
+from src.core import metrics
+from src.core.config import settings
+from src.db import elastic, local_cache
+
+CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class MetricsMiddleware:
+    """Замеряет каждый HTTP-запрос: длительность и размер ответа по шаблону маршрута, число запросов в Elasticsearch.
+
+    Стоит снаружи HTTPCacheMiddleware, поэтому учитывает и ответы из кеша, а Server-Timing не попадает в кешированные
+    заголовки.
+    """
+
+    def __init__(self, app, server_timing: Optional[bool] = None):
+        self.app = app
+        self.server_timing = settings.METRICS_SERVER_TIMING_ENABLED if server_timing is None else server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        timing = metrics.RequestTiming()
+        token = metrics.current_timing.set(timing)
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if self.server_timing:
+                    total = time.perf_counter() - timing.started
+                    headers = list(message.get('headers', []))
+                    headers.append((b'server-timing', timing.server_timing(total).encode()))
+                    message = {**message, 'headers': headers}
+            elif message['type'] == 'http.response.body':
+                size += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.current_timing.reset(token)
+            route = self._route(scope)
+            metrics.HTTP_REQUEST_DURATION.observe(time.perf_counter() - timing.started, scope['method'], route,
+                                                  status)
+            metrics.HTTP_RESPONSE_SIZE.observe(size, route)
+            metrics.ELASTIC_REQUESTS_PER_HTTP_REQUEST.observe(timing.count('es'), route)
+
+    @staticmethod
+    def _route(scope) -> str:
+        # Шаблон пути, а не сам путь, чтобы id не раздували число рядов метрик
+        router = scope.get('router') or getattr(scope.get('app'), 'router', None)
+        if router is None:
+            return 'unmatched'
+        endpoint = scope.get('endpoint')
+        for route in router.routes:
+            if endpoint is not None:
+                if getattr(route, 'endpoint', None) is endpoint:
+                    return route.path
+            elif route.matches(scope)[0] == Match.FULL:
+                # Ответ отдан до роутинга, например из HTTP-кеша
+                return route.path
+        return 'unmatched'
+
+
+def _local_cache_stats():
+    if local_cache.local_cache is None:
+        return
+    for name, value in local_cache.local_cache.stats.items():
+        if name in ('entries', 'bytes'):
+            yield f'# TYPE local_cache_{name} gauge'
+            yield f'local_cache_{name} {value}'
+        else:
+            yield f'# TYPE local_cache_{name}_total counter'
+            yield f'local_cache_{name}_total {value}'
+
+
+def _elastic_transport_stats():
+    transport = getattr(elastic.es, 'transport', None)
+    if not isinstance(transport, elastic.ElasticTransport):
+        return
+    yield '# TYPE elasticsearch_circuit_breaker_open gauge'
+    yield f'elasticsearch_circuit_breaker_open {int(transport.breaker.state != transport.breaker.CLOSED)}'
+    yield '# TYPE elasticsearch_requests_in_flight gauge'
+    for query_class, limiter in transport.limiters.items():
+        yield f'elasticsearch_requests_in_flight{{query_class="{query_class}"}} {limiter.active}'
+    yield '# TYPE elasticsearch_requests_queued gauge'
+    for query_class, limiter in transport.limiters.items():
+        yield f'elasticsearch_requests_queued{{query_class="{query_class}"}} {limiter.queued}'
+
+
+metrics.registry.register_collector(_local_cache_stats)
+metrics.registry.register_collector(_elastic_transport_stats)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(metrics.registry.render(), media_type=CONTENT_TYPE_LATEST)
@@ -3,14 +3,21 @@ from typing import Optional
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from pydantic import UUID4, BaseModel, Field
 
 from src.api.v1.genre import Genre
+from src.api.v1.pagination import cursor_page_items
+from src.api.v1.serializers import film_out, film_short_out, genre_facet_out
+from src.core.config import settings
 from src.models.person import PersonBase
 from src.services.film import FilmService
+from src.services.helpers import InvalidCursorError
 
 router = APIRouter()
 
+MAX_BATCH_IDS = 100
+
 
 class FilmBase(BaseModel):
     uuid: UUID4
@@ -18,6 +25,12 @@ class FilmBase(BaseModel):
     imdb_rating: float
 
 
+class GenreFacet(BaseModel):
+    uuid: UUID4
+    name: Optional[str]
+    count: int
+
+
 class Film(FilmBase):
     description: Optional[str] = Field(default_factory=str)
     genre: list[Genre]
@@ -32,14 +45,34 @@ async def get_films(
         film_service: FilmService = Depends(),
         page_number=Query(default=1, alias='page[number]'),
         size=Query(default=50, alias='page[size]'),
-        filter_request: Optional[UUID] = Query(None, alias='filter[genre]')
+        filter_request: Optional[UUID] = Query(None, alias='filter[genre]'),
+        cursor: Optional[str] = Query(None, alias='page[cursor]'),
 ):
-    films = await film_service.get_film_list(sort=sort, page_number=page_number, size=size,
-                                             filter_request=filter_request)
+    headers = {}
+    if cursor is not None:
+        try:
+            page = await film_service.get_film_list_after(sort=sort, size=size, filter_request=filter_request,
+                                                          cursor=cursor)
+        except InvalidCursorError as error:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=str(error))
+        films, headers = cursor_page_items(page)
+    else:
+        films = await film_service.get_film_list(sort=sort, page_number=page_number, size=size,
+                                                 filter_request=filter_request)
     if not films:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='film not found')
-    films_out = [FilmBase(uuid=film.id, **film.__dict__) for film in films]
-    return films_out
+    return ORJSONResponse([film_short_out(film) for film in films], headers=headers)
+
+
+@router.get('/facets', response_model=list[GenreFacet])
+async def get_film_facets(
+        film_service: FilmService = Depends(),
+        filter_request: Optional[UUID] = Query(None, alias='filter[genre]'),
+):
+    facets = await film_service.get_genre_facets(filter_request=filter_request)
+    if not facets:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='film not found')
+    return ORJSONResponse([genre_facet_out(facet) for facet in facets])
 
 
 @router.get('/search', response_model=list[FilmBase])
@@ -47,21 +80,52 @@ async def search_films(
         query: str,
         film_service: FilmService = Depends(),
         page_number=Query(default=1, alias='page[number]'),
-        size=Query(default=50, alias='page[size]')
+        size=Query(default=50, alias='page[size]'),
+        cursor: Optional[str] = Query(None, alias='page[cursor]'),
 ):
-    films = await film_service.search_film_in_elastic(query=query, page_number=page_number, size=size)
+    headers = {}
+    if cursor is not None:
+        try:
+            page = await film_service.search_film_after(query=query, size=size, cursor=cursor)
+        except InvalidCursorError as error:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=str(error))
+        films, headers = cursor_page_items(page)
+    else:
+        films = await film_service.search_film_in_elastic(query=query, page_number=page_number, size=size)
     if not films:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='film not found')
-    films_out = [FilmBase(uuid=film.id, **film.__dict__) for film in films]
-    return films_out
+    return ORJSONResponse([film_short_out(film) for film in films], headers=headers)
+
+
+@router.get('/suggest', response_model=list[FilmBase])
+async def suggest_films(
+        query: str = Query(..., min_length=1, description='title prefix'),
+        size: int = Query(settings.SUGGEST_DEFAULT_SIZE, ge=1, le=settings.SUGGEST_MAX_SIZE),
+        film_service: FilmService = Depends(),
+):
+    films = await film_service.suggest_films(query, size)
+    return ORJSONResponse([film_short_out(film) for film in films])
+
+
+@router.get('/batch', response_model=list[Film])
+async def films_by_ids(
+        ids: str = Query(..., description='comma separated film ids'),
+        film_service: FilmService = Depends(),
+):
+    try:
+        film_ids = list(dict.fromkeys(str(UUID(film_id)) for film_id in ids.split(',') if film_id))
+    except ValueError:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail='ids must be comma separated uuids')
+    if not film_ids or len(film_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=f'pass from 1 to {MAX_BATCH_IDS} ids')
+    films = await film_service.get_by_ids(film_ids)
+    return ORJSONResponse([film_out(film) for film in films if film])
 
 
 @router.get('/{film_id}', response_model=Film)
-async def film_details(film_id: str, film_service: FilmService = Depends()) -> Film:
+async def film_details(film_id: str, film_service: FilmService = Depends()):
     film = await film_service.get_by_id(film_id)
     if not film:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='film not found')
-    genre_out = [Genre(uuid=genre.id, name=genre.name) for genre in film.genre]
-    del(film.__dict__['genre'])
-    film_out = Film(uuid=film.id, genre=genre_out, **film.__dict__)
-    return film_out
+    return ORJSONResponse(film_out(film))
+
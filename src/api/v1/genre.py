@@ -1,8 +1,10 @@
 from http import HTTPStatus
 
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from pydantic import UUID4, BaseModel
 
+from src.api.v1.serializers import genre_out
 from src.services.genre import GenreService
 
 router = APIRouter()
@@ -18,8 +20,7 @@ async def get_genres(genre_service: GenreService = Depends()):
     genres = await genre_service.get_genre_list()
     if not genres:
         return []
-    genres = [Genre(uuid=genre.id, name=genre.name) for genre in genres]
-    return genres
+    return ORJSONResponse([genre_out(genre) for genre in genres])
 
 
 @router.get('/{genre_id:uuid}', response_model=Genre)
@@ -27,5 +28,4 @@ async def get_genre_by_id(genre_id: UUID4, genre_service: GenreService = Depends
     genre = await genre_service.get_genre_by_id(genre_id)
     if not genre:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='genre not found')
-    genre = Genre(uuid=genre.id, name=genre.name)
-    return genre
+    return ORJSONResponse(genre_out(genre))
@@ -0,0 +1,14 @@
+from typing import Optional
+
+from src.services.helpers import CursorPage
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def cursor_page_items(page: Optional[CursorPage]) -> tuple[Optional[list], dict]:
+    # page[cursor] без значения начинает выдачу с первой страницы, следующий курсор приходит в X-Next-Cursor
+    if page is None:
+        return None, {}
+    if page.next_cursor:
+        return page.items, {NEXT_CURSOR_HEADER: page.next_cursor}
+    return page.items, {}
@@ -1,10 +1,16 @@
 from http import HTTPStatus
+from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from pydantic import UUID4
 
+from src.api.v1.pagination import cursor_page_items
+from src.api.v1.serializers import film_source_out, person_base_out, person_out
+from src.core.config import settings
 from src.models.film import BaseFilm
-from src.models.person import Person
+from src.models.person import Person, PersonBase
+from src.services.helpers import InvalidCursorError
 from src.services.person import PersonService
 
 router = APIRouter()
@@ -15,12 +21,31 @@ async def search_persons(
     query: str,
     page_number: int = Query(default=1, alias='page[number]'),
     page_size: int = Query(default=50, alias='page[size]'),
+    cursor: Optional[str] = Query(None, alias='page[cursor]'),
     service: PersonService = Depends(),
 ):
-    person = await service.search_person(query, page_number, page_size)
+    headers = {}
+    if cursor is not None:
+        try:
+            page = await service.search_person_after(query, page_size, cursor)
+        except InvalidCursorError as error:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=str(error))
+        person, headers = cursor_page_items(page)
+    else:
+        person = await service.search_person(query, page_number, page_size)
     if not person:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='persons not found for this query')
-    return person
+    return ORJSONResponse([person_out(p) for p in person], headers=headers)
+
+
+@router.get('/suggest', response_model=list[PersonBase])
+async def suggest_persons(
+    query: str = Query(..., min_length=1, description='name prefix'),
+    size: int = Query(settings.SUGGEST_DEFAULT_SIZE, ge=1, le=settings.SUGGEST_MAX_SIZE),
+    service: PersonService = Depends(),
+):
+    persons = await service.suggest_persons(query, size)
+    return ORJSONResponse([person_base_out(person) for person in persons])
 
 
 @router.get('/{id:uuid}', response_model=Person)
@@ -31,7 +56,7 @@ async def get_persons_by_id(
     person = await service.get_person_by_id(id)
     if not person:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='person not found')
-    return person
+    return ORJSONResponse(person_out(person))
 
 
 @router.get('/{id:uuid}/film', response_model=list[BaseFilm])
@@ -42,4 +67,4 @@ async def get_person_films(
     person_films = await service.get_person_films_by_person_id(id)
     if not person_films:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='person not found')
-    return person_films
+    return ORJSONResponse([film_source_out(film) for film in person_films])
@@ -0,0 +1,47 @@
+from src.models.film import BaseFilm, FullFilm
+from src.models.genre import Genre, GenreFacet
+from src.models.person import Person, PersonBase
+
+# Ответы собираются напрямую в dict и отдаются через ORJSONResponse без повторной валидации по response_model.
+# Структура совпадает с моделями ответа, которые остаются в роутерах для документации OpenAPI.
+
+
+def film_short_out(film: BaseFilm) -> dict:
+    return {'uuid': film.id, 'title': film.title, 'imdb_rating': film.imdb_rating}
+
+
+def film_out(film: FullFilm) -> dict:
+    return {
+        **film_short_out(film),
+        'description': film.description,
+        'genre': [genre_out(genre) for genre in film.genre],
+        'actors': [person_base_out(person) for person in film.actors],
+        'writers': _persons_out(film.writers),
+        'directors': _persons_out(film.directors),
+    }
+
+
+def film_source_out(film: dict) -> dict:
+    return {'id': film['id'], 'title': film['title'], 'imdb_rating': film['imdb_rating']}
+
+
+def genre_out(genre: Genre) -> dict:
+    return {'uuid': genre.id, 'name': genre.name}
+
+
+def genre_facet_out(facet: GenreFacet) -> dict:
+    return {'uuid': facet.id, 'name': facet.name, 'count': facet.count}
+
+
+def person_base_out(person: PersonBase) -> dict:
+    return {'uuid': person.id, 'full_name': person.name}
+
+
+def person_out(person: Person) -> dict:
+    return {**person_base_out(person), 'role': person.role, 'film_ids': person.film_ids}
+
+
+def _persons_out(persons):
+    if persons is None:
+        return None
+    return [person_base_out(person) for person in persons]
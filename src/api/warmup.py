@@ -0,0 +1,75 @@
+import asyncio
+import logging
+from http import HTTPStatus
+from urllib.parse import urlencode
+
+from elasticsearch import AsyncElasticsearch
+from elasticsearch_dsl import Search
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+WARM_UP_SORT = '-imdb_rating'
+
+
+async def get_top_genre_ids(elastic: AsyncElasticsearch, limit: int) -> list[str]:
+    # Жанры с наибольшим числом фильмов - одна агрегация без самих документов
+    search = Search(index='movies').extra(size=0)
+    search.aggs.bucket('genre', 'nested', path='genre').bucket('top', 'terms', field='genre.id', size=limit)
+    response = await elastic.search(index='movies', body=search.to_dict())
+    return [bucket['key'] for bucket in response['aggregations']['genre']['top']['buckets']]
+
+
+def get_warm_up_paths(genre_ids: list[str]) -> list[str]:
+    paths = ['/api/v1/genre/', '/api/v1/film/facets']
+    for page_number in range(1, settings.WARM_UP_FILM_PAGES + 1):
+        params = {'sort': WARM_UP_SORT}
+        if page_number > 1:
+            params['page[number]'] = page_number
+        paths.append(f'/api/v1/film/?{urlencode(params)}')
+    for genre_id in genre_ids:
+        paths.append(f'/api/v1/genre/{genre_id}')
+        paths.append(f'/api/v1/film/?{urlencode({"sort": WARM_UP_SORT, "filter[genre]": genre_id})}')
+    return paths
+
+
+async def warm_up(app, elastic: AsyncElasticsearch):
+    """Прогоняет самые частые запросы через само приложение до того, как воркер начнёт принимать трафик.
+
+    Запросы проходят весь стек, поэтому заполняются и Redis, и кеши в памяти воркера (локальный и HTTP).
+    """
+    genre_ids = await get_top_genre_ids(elastic, settings.WARM_UP_TOP_GENRES)
+    paths = get_warm_up_paths(genre_ids)
+    semaphore = asyncio.Semaphore(settings.WARM_UP_CONCURRENCY)
+
+    async def request(path: str) -> int:
+        async with semaphore:
+            return await _call_app(app, path)
+
+    statuses = await asyncio.gather(*(request(path) for path in paths))
+    failed = [path for path, status in zip(paths, statuses) if status != HTTPStatus.OK]
+    logger.info('Cache warm-up: %s requests, %s failed', len(paths), len(failed))
+    if failed:
+        logger.warning('Cache warm-up failed for %s', ', '.join(failed))
+
+
+async def _call_app(app, url: str) -> int:
+    path, _, query = url.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', b'warm-up')], 'client': ('127.0.0.1', 0), 'server': ('warm-up', 80),
+    }
+    status = 0
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await app(scope, receive, send)
+    return status
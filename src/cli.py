@@ -0,0 +1,89 @@
+"""Служебные команды для ETL и эксплуатации.
+
+    python -m src.cli invalidate --entity <uuid> [--entity <uuid> ...]
+    python -m src.cli invalidate --index movies
+    python -m src.cli person-films --rebuild
+    python -m src.cli person-films --film <uuid> [--film <uuid> ...]
+    python -m src.cli snapshot [--dir <path>]
+"""
+import argparse
+import asyncio
+from pathlib import Path
+
+import aioredis
+from elasticsearch import AsyncElasticsearch
+
+from src.core.config import settings
+from src.services.person_films import PersonFilmsProjection
+from src.services.redis import RedisBaseClass
+from src.services.snapshot import export_snapshot
+
+
+async def invalidate(args: argparse.Namespace):
+    redis = await aioredis.create_redis_pool((settings.REDIS_HOST, settings.REDIS_PORT))
+    try:
+        cache = RedisBaseClass(redis=redis, local_cache=None)
+        if args.entity:
+            deleted = await cache.invalidate_entities(args.entity)
+            print(f'Invalidated {deleted} cache keys for {len(args.entity)} entities')
+        for index in args.index or ():
+            deleted = await cache.invalidate_index(index)
+            print(f'Invalidated {deleted} cache keys of index {index}')
+    finally:
+        redis.close()
+        await redis.wait_closed()
+
+
+async def person_films(args: argparse.Namespace):
+    redis = await aioredis.create_redis_pool((settings.REDIS_HOST, settings.REDIS_PORT))
+    elastic = AsyncElasticsearch(hosts=[f'{settings.ELASTIC_HOST}:{settings.ELASTIC_PORT}'])
+    try:
+        projection = PersonFilmsProjection(redis=redis)
+        if args.rebuild:
+            films = await projection.rebuild(elastic)
+            print(f'Rebuilt person films projection from {films} films')
+        if args.film:
+            updated, removed = await projection.refresh_films(elastic, args.film)
+            print(f'Updated {updated} films, removed {removed} films from person films projection')
+    finally:
+        redis.close()
+        await redis.wait_closed()
+        await elastic.close()
+
+
+async def snapshot(args: argparse.Namespace):
+    elastic = AsyncElasticsearch(hosts=[f'{settings.ELASTIC_HOST}:{settings.ELASTIC_PORT}'])
+    try:
+        path = await export_snapshot(elastic, Path(args.dir))
+        print(f'Exported catalogue snapshot to {path}')
+    finally:
+        await elastic.close()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m src.cli')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    invalidate_parser = subparsers.add_parser('invalidate', help='purge cache entries that mention entities')
+    invalidate_parser.add_argument('--entity', action='append', help='film/person/genre id, can be repeated')
+    invalidate_parser.add_argument('--index', action='append', help='drop every cache entry of an index')
+    invalidate_parser.set_defaults(handler=invalidate)
+
+    person_films_parser = subparsers.add_parser('person-films', help='maintain the person -> films projection')
+    person_films_parser.add_argument('--rebuild', action='store_true', help='rebuild from the whole movies index')
+    person_films_parser.add_argument('--film', action='append', help='changed or deleted film id, can be repeated')
+    person_films_parser.set_defaults(handler=person_films)
+
+    snapshot_parser = subparsers.add_parser('snapshot', help='export movies, persons and genres to a local snapshot')
+    snapshot_parser.add_argument('--dir', default=str(settings.SNAPSHOT_DIR), help='snapshot directory')
+    snapshot_parser.set_defaults(handler=snapshot)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    asyncio.run(args.handler(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
 from logging import config as logging_config
 from pathlib import Path
+from typing import Optional
 
 from pydantic import BaseSettings
 
@@ -16,17 +17,141 @@ class Settings(BaseSettings):
     # Настройки Redis
     REDIS_HOST: str = '127.0.0.1'
     REDIS_PORT: int = 6379
+    REDIS_POOL_MIN_SIZE: int = 10
+    REDIS_POOL_MAX_SIZE: int = 20
+    REDIS_CONNECT_TIMEOUT_IN_SECONDS: float = 2
 
     # Настройки Elasticsearch
     ELASTIC_HOST: str = '127.0.0.1'
     ELASTIC_PORT: int = 9200
+    # Предел соединений воркера к каждому узлу. По умолчанию - сумма лимитов классов запросов ELASTIC_CONCURRENCY_*
+    # (или 10 без лимитов): меньший пул снова ставит запросы по id в общую очередь aiohttp за поиском
+    ELASTIC_MAX_CONNECTIONS: Optional[int] = None
+    ELASTIC_TIMEOUT_IN_SECONDS: float = 10
+    ELASTIC_KEEPALIVE_TIMEOUT_IN_SECONDS: float = 30
+    # Повторы уходят на другой узел; упавший узел исключается на ELASTIC_DEAD_TIMEOUT_IN_SECONDS,
+    # при повторных отказах срок удваивается
+    ELASTIC_MAX_RETRIES: int = 2
+    ELASTIC_RETRY_ON_TIMEOUT: bool = True
+    ELASTIC_DEAD_TIMEOUT_IN_SECONDS: float = 60
+    ELASTIC_SNIFF_ON_START: bool = False
+    ELASTIC_SNIFF_ON_CONNECTION_FAIL: bool = False
+    ELASTIC_SNIFFER_TIMEOUT_IN_SECONDS: Optional[float] = None
+    # Общий срок на запрос к Elasticsearch вместе с повторами
+    ELASTIC_DEADLINE_IN_SECONDS: float = 2
+    # Предохранитель: после стольких сбоев подряд запросы в Elasticsearch отклоняются сразу, пока не пройдёт пауза
+    ELASTIC_BREAKER_ENABLED: bool = True
+    ELASTIC_BREAKER_FAILURE_THRESHOLD: int = 5
+    ELASTIC_BREAKER_RESET_TIMEOUT_IN_SECONDS: float = 5
+    # Лимиты одновременных запросов воркера в Elasticsearch по классам: по id, списки и фильтры, нечёткий поиск.
+    # Сверх лимита запросы ждут в очереди класса не дольше ELASTIC_QUEUE_MAX_WAIT_IN_SECONDS, иначе сразу 503
+    ELASTIC_CONCURRENCY_LIMITS_ENABLED: bool = True
+    ELASTIC_CONCURRENCY_BY_ID: int = 32
+    ELASTIC_CONCURRENCY_LIST: int = 16
+    ELASTIC_CONCURRENCY_SEARCH: int = 4
+    ELASTIC_QUEUE_MAX_SIZE: int = 100
+    ELASTIC_QUEUE_MAX_WAIT_IN_SECONDS: float = 0.5
+
+    # Всего соединений с бэкендами: число воркеров * (REDIS_POOL_MAX_SIZE + размер пула ES * узлов ES)
+
+    # Подключение при старте: число попыток и начальная пауза между ними (удваивается)
+    STARTUP_CONNECT_ATTEMPTS: int = 5
+    STARTUP_RETRY_BACKOFF_IN_SECONDS: float = 0.5
+    # Сколько ждать ответа бэкенда в /health/ready
+    HEALTH_CHECK_TIMEOUT_IN_SECONDS: float = 1
+
+    # Курсорная пагинация: закреплять ли выдачу за point-in-time и на сколько продлевать его при каждом запросе
+    ELASTIC_PIT_ENABLED: bool = False
+    ELASTIC_PIT_KEEP_ALIVE: str = '1m'
 
     # Корень проекта
     BASE_DIR: Path = Path(__file__).resolve().parent.parent
 
+    FILM_CACHE_EXPIRE_IN_SECONDS: int = 5 * 60
     GENRE_CACHE_EXPIRE_IN_SECONDS: int = 5 * 60
     PERSON_CACHE_EXPIRE_IN_SECONDS: int = 5 * 60
 
+    # Кеш готовых HTTP-ответов в памяти воркера (ETag/304 и Cache-Control)
+    HTTP_CACHE_ENABLED: bool = True
+    HTTP_CACHE_MAX_ENTRIES: int = 4096
+    HTTP_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    HTTP_CACHE_STORE_EXPIRE_IN_SECONDS: int = 30
+    # ETag ответов помнятся весь срок max-age, чтобы отвечать 304 и после вытеснения тела
+    HTTP_CACHE_ETAG_MAX_ENTRIES: int = 65536
+    # Канал Redis, в который python -m src.cli invalidate сообщает воркерам о сбросе кеша
+    CACHE_INVALIDATION_CHANNEL: str = 'cache-invalidation'
+
+    # Каталог жанров в памяти воркера: загружается при старте и периодически обновляется
+    GENRE_CATALOGUE_ENABLED: bool = True
+    GENRE_CATALOGUE_REFRESH_INTERVAL_IN_SECONDS: int = 60
+
+    # Подсказки по префиксу (/film/suggest, /person/suggest) из индекса в памяти воркера,
+    # перестраиваемого периодически
+    SUGGEST_ENABLED: bool = True
+    # Раз в интервал (плюс случайная добавка до JITTER) воркер проверяет статистику индексов и перестраивает
+    # подсказки, только если movies или person изменились
+    SUGGEST_REFRESH_INTERVAL_IN_SECONDS: int = 5 * 60
+    SUGGEST_REFRESH_JITTER_IN_SECONDS: int = 60
+    SUGGEST_DEFAULT_SIZE: int = 10
+    SUGGEST_MAX_SIZE: int = 20
+    # Для префиксов до этой длины top-k считается при построении индекса
+    SUGGEST_PRECOMPUTED_PREFIX_LENGTH: int = 3
+    SUGGEST_CACHE_MAX_ENTRIES: int = 10000
+
+    # Проекция персона -> фильмы в Redis, которую ведёт python -m src.cli person-films.
+    # Пока она не построена целиком, фильмы персон ищутся запросом к Elasticsearch
+    PERSON_FILMS_PROJECTION_ENABLED: bool = True
+
+    # Режим снимка: карточки, списки и фильтр по жанру читаются из локального файла (python -m src.cli snapshot),
+    # полнотекстовый поиск по-прежнему идёт в Elasticsearch
+    SNAPSHOT_ENABLED: bool = False
+    SNAPSHOT_DIR: Path = BASE_DIR.parent / 'snapshots'
+    SNAPSHOT_REFRESH_INTERVAL_IN_SECONDS: int = 30
+    SNAPSHOT_KEEP: int = 2
+
+    # Локальный (в памяти воркера) кеш перед Redis
+    LOCAL_CACHE_ENABLED: bool = False
+    LOCAL_CACHE_MAX_ENTRIES: int = 1024
+    LOCAL_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    LOCAL_CACHE_EXPIRE_IN_SECONDS: int = 10
+
+    # Межворкерная блокировка на заполнение кеша: только один воркер ходит в Elasticsearch за ключом
+    CACHE_LOCK_ENABLED: bool = False
+    CACHE_LOCK_LEASE_IN_MS: int = 3000
+    CACHE_LOCK_POLL_INTERVAL_IN_MS: int = 50
+
+    # Сколько ещё хранится устаревшая запись после мягкого TTL: она отдаётся, пока обновляется в фоне,
+    # и остаётся запасным ответом, пока Elasticsearch недоступен
+    CACHE_STALE_TTL_IN_SECONDS: int = 30 * 60
+    # Коэффициент вероятностного раннего обновления (XFetch), 0 - отключено
+    CACHE_XFETCH_BETA: float = 1.0
+
+    # Увеличивается при изменении формы кешируемых данных, чтобы старые ключи перестали читаться
+    CACHE_KEY_SCHEMA_VERSION: int = 1
+
+    # Формат записей кеша: orjson или msgpack, сжатие none/zlib/zstd/lz4 для записей крупнее порога
+    CACHE_CODEC: str = 'orjson'
+    CACHE_COMPRESSION: str = 'none'
+    CACHE_COMPRESSION_MIN_BYTES: int = 4096
+
+    # Продакшен-запуск через gunicorn (src/gunicorn.conf.py): 0 воркеров - по числу доступных ядер
+    # с учётом квоты CPU контейнера
+    WEB_WORKERS: int = 0
+    WEB_BIND: str = '0.0.0.0:8000'
+    WEB_KEEPALIVE_IN_SECONDS: int = 5
+    # Сколько при остановке ждать завершения запросов в работе, прежде чем воркер будет убит
+    WEB_GRACEFUL_TIMEOUT_IN_SECONDS: int = 30
+
+    # Прогрев кешей при старте воркера: первые страницы фильмов, жанры и фильмы самых популярных жанров
+    WARM_UP_ENABLED: bool = True
+    WARM_UP_TOP_GENRES: int = 10
+    WARM_UP_FILM_PAGES: int = 3
+    WARM_UP_CONCURRENCY: int = 4
+
+    # Метрики Prometheus на /metrics и заголовок Server-Timing с разбивкой времени запроса по бэкендам
+    METRICS_ENABLED: bool = True
+    METRICS_SERVER_TIMING_ENABLED: bool = True
+
     class Config:
         case_sensitive = True
 
@@ -0,0 +1,229 @@
+"""Метрики в формате Prometheus и разбивка времени запроса по бэкендам для заголовка Server-Timing.
+
+Реестр живёт в памяти процесса: при нескольких воркерах каждый отдаёт на /metrics свои значения.
+При METRICS_ENABLED=False все inc/observe/timer сводятся к проверке одного флага.
+"""
+import bisect
+import time
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional
+
+from src.core.config import settings
+
+enabled: bool = settings.METRICS_ENABLED
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+
+class RequestTiming:
+    """Суммарное время и число обращений к каждому бэкенду в рамках одного HTTP-запроса."""
+
+    __slots__ = ('started', 'spans')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: dict[str, list] = {}
+
+    def add(self, name: str, seconds: float):
+        span = self.spans.get(name)
+        if span is None:
+            self.spans[name] = [seconds, 1]
+        else:
+            span[0] += seconds
+            span[1] += 1
+
+    def count(self, name: str) -> int:
+        span = self.spans.get(name)
+        return span[1] if span else 0
+
+    def server_timing(self, total: float) -> str:
+        # app - всё, что не ушло на бэкенды: роутинг, сборка моделей, сериализация ответа
+        parts = []
+        backends = 0.0
+        for name, (seconds, calls) in self.spans.items():
+            backends += seconds
+            parts.append(f'{name};dur={seconds * 1000:.2f};desc="{calls}"')
+        parts.append(f'app;dur={max(total - backends, 0) * 1000:.2f}')
+        parts.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(parts)
+
+
+current_timing: ContextVar[Optional[RequestTiming]] = ContextVar('current_timing', default=None)
+
+
+class Metric:
+    type = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        registry.register(self)
+
+    def _format_labels(self, values: tuple, extra: str = '') -> str:
+        pairs = [f'{name}="{self._escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    @staticmethod
+    def _escape(value) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        if enabled:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self._values.items():
+            yield f'{self.name}{self._format_labels(labels)} {value}'
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [счётчики по корзинам (последняя - +Inf), сумма]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        if not enabled:
+            return
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f'{self.name}_bucket{self._format_labels(labels, le)} {cumulative}'
+            yield f'{self.name}_sum{self._format_labels(labels)} {total}'
+            yield f'{self.name}_count{self._format_labels(labels)} {cumulative}'
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list[Metric] = []
+        # Gauge-значения, которые дешевле снять в момент выгрузки, чем поддерживать на каждом запросе
+        self._collectors: list[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric: Metric):
+        self._metrics.append(metric)
+
+    def register_collector(self, collector: Callable[[], Iterable[str]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.samples())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class _Timer:
+    __slots__ = ('histogram', 'backend', 'labels', 'started')
+
+    def __init__(self, histogram: Histogram, backend: str, labels: tuple):
+        self.histogram = histogram
+        self.backend = backend
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record(self.histogram, self.backend, time.perf_counter() - self.started, *self.labels)
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_null_timer = _NullTimer()
+
+
+def record(histogram: Histogram, backend: str, seconds: float, *labels):
+    """Учитывает обращение к бэкенду и в гистограмме, и во времени текущего HTTP-запроса."""
+    histogram.observe(seconds, *labels)
+    timing = current_timing.get()
+    if timing is not None:
+        timing.add(backend, seconds)
+
+
+def timer(histogram: Histogram, backend: str, *labels):
+    if not enabled:
+        return _null_timer
+    return _Timer(histogram, backend, labels)
+
+
+HTTP_REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'HTTP request duration', ('method', 'route', 'status'),
+)
+HTTP_RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes', 'HTTP response body size', ('route',), buckets=SIZE_BUCKETS,
+)
+ELASTIC_REQUEST_DURATION = Histogram(
+    'elasticsearch_request_duration_seconds', 'Elasticsearch request duration', ('operation', 'index'),
+)
+ELASTIC_REQUESTS_PER_HTTP_REQUEST = Histogram(
+    'elasticsearch_requests_per_http_request', 'Elasticsearch requests made while serving one HTTP request',
+    ('route',), buckets=COUNT_BUCKETS,
+)
+REDIS_COMMAND_DURATION = Histogram(
+    'redis_command_duration_seconds', 'Redis command or pipeline duration', ('operation',),
+)
+CACHE_CODEC_DURATION = Histogram(
+    'cache_codec_duration_seconds', 'Cache entry encode/decode duration', ('operation',),
+)
+ELASTIC_BREAKER_REJECTIONS = Counter(
+    'elasticsearch_circuit_breaker_rejections_total', 'Elasticsearch requests rejected by the open circuit breaker',
+)
+ELASTIC_QUEUE_WAIT = Histogram(
+    'elasticsearch_queue_wait_seconds', 'Time spent waiting for a concurrency slot before an Elasticsearch request',
+    ('query_class',),
+)
+ELASTIC_QUEUE_REJECTIONS = Counter(
+    'elasticsearch_queue_rejections_total', 'Elasticsearch requests rejected by the concurrency limiter',
+    ('query_class', 'reason'),
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Cache lookups by result: hit, stale (served and refreshed) or miss',
+    ('index', 'result'),
+)
+CACHE_FILLS = Counter('cache_fills_total', 'Cache entries filled from Elasticsearch', ('index',))
+CACHE_ENTRY_SIZE = Histogram(
+    'cache_entry_size_bytes', 'Encoded cache entry size', ('index', 'operation'), buckets=SIZE_BUCKETS,
+)
@@ -0,0 +1,56 @@
+import time
+
+
+class CircuitBreaker:
+    """Размыкается после failure_threshold ошибок подряд и reset_timeout секунд отклоняет вызовы, не трогая бэкенд.
+
+    Затем пропускает один пробный вызов (half-open): успех замыкает цепь, ошибка снова размыкает её.
+    Состояние своё у каждого воркера.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.failure_threshold:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def rejects_requests(self) -> bool:
+        # Проверка без захвата пробного вызова: отсекает запросы до очереди лимитера
+        state = self.state
+        return state == self.OPEN or (state == self.HALF_OPEN and self._trial_in_flight)
+
+    def allow_request(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self._trial_in_flight = False
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        # Пробный вызов завершился без результата (отмена, отказ): следующий запрос сможет стать пробным
+        self._trial_in_flight = False
@@ -0,0 +1,57 @@
+import asyncio
+from collections import deque
+
+
+class ConcurrencyLimitExceeded(Exception):
+    pass
+
+
+class ConcurrencyLimiter:
+    """Семафор с ограниченной FIFO-очередью и предельным временем ожидания.
+
+    Не больше limit одновременных вызовов; следующие ждут в очереди до max_wait секунд, а при полной очереди
+    или по истечении ожидания получают ConcurrencyLimitExceeded сразу, не нагружая бэкенд.
+    """
+
+    def __init__(self, limit: int, max_queue: int, max_wait: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self._waiters: deque = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise ConcurrencyLimitExceeded('queue is full')
+        future = asyncio.get_event_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await asyncio.wait_for(future, self.max_wait)
+        except asyncio.TimeoutError:
+            raise ConcurrencyLimitExceeded('wait timeout')
+        except asyncio.CancelledError:
+            # Слот мог быть передан нам одновременно с отменой - возвращаем его следующему
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            try:
+                self._waiters.remove(future)
+            except ValueError:
+                pass
+
+    def release(self):
+        # Слот передаётся первому ожидающему без уменьшения active, чтобы его не перехватил новый вызов
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
@@ -1,9 +1,207 @@
+import asyncio
+import logging
+import time
 from typing import Optional
 
+import aiohttp
 from elasticsearch import AsyncElasticsearch
+from elasticsearch._async.compat import get_running_loop
+from elasticsearch._async.http_aiohttp import AIOHttpConnection, ESClientResponse
+from elasticsearch._async.transport import AsyncTransport
+from elasticsearch.exceptions import ConnectionError, ConnectionTimeout, TransportError
+
+from src.core import metrics
+from src.core.config import settings
+from src.db.circuit_breaker import CircuitBreaker
+from src.db.concurrency import ConcurrencyLimiter, ConcurrencyLimitExceeded
+
+logger = logging.getLogger(__name__)
 
 es: Optional[AsyncElasticsearch] = None
 
+DEFAULT_MAX_CONNECTIONS = 10
+
+# Ответы Elasticsearch, означающие перегрузку или недоступность кластера
+UNAVAILABLE_STATUSES = (429, 502, 503, 504)
+
+
+class CircuitOpenError(ConnectionError):
+    """Запрос отклонён без обращения к Elasticsearch: цепь разомкнута после серии ошибок."""
+
+
+class ElasticOverloadedError(ConnectionError):
+    """Запрос отклонён без обращения к Elasticsearch: очередь его класса переполнена или ждали слишком долго."""
+
+
+# Классы запросов со своими лимитами, чтобы дешёвые запросы по id не стояли в очереди за нечётким поиском
+QUERY_CLASS_BY_ID = 'by_id'
+QUERY_CLASS_LIST = 'list'
+QUERY_CLASS_SEARCH = 'search'
+
+BY_ID_OPERATIONS = ('_doc', '_source', '_mget')
+FUZZY_MARKERS = ('fuzziness', 'multi_match')
+
+
+class ElasticTransport(AsyncTransport):
+    """Транспорт с предохранителем, лимитами параллельных запросов по классам, общим дедлайном на запрос
+    вместе с повторами и замером каждого запроса.
+
+    Через него проходят все вызовы клиента, включая msearch, mget и PIT.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = CircuitBreaker(settings.ELASTIC_BREAKER_FAILURE_THRESHOLD,
+                                      settings.ELASTIC_BREAKER_RESET_TIMEOUT_IN_SECONDS)
+        self.limiters = {
+            query_class: ConcurrencyLimiter(limit, settings.ELASTIC_QUEUE_MAX_SIZE,
+                                            settings.ELASTIC_QUEUE_MAX_WAIT_IN_SECONDS)
+            for query_class, limit in (
+                (QUERY_CLASS_BY_ID, settings.ELASTIC_CONCURRENCY_BY_ID),
+                (QUERY_CLASS_LIST, settings.ELASTIC_CONCURRENCY_LIST),
+                (QUERY_CLASS_SEARCH, settings.ELASTIC_CONCURRENCY_SEARCH),
+            )
+        }
+
+    async def perform_request(self, method, url, headers=None, params=None, body=None):
+        if settings.ELASTIC_BREAKER_ENABLED and self.breaker.rejects_requests():
+            self._reject_open_circuit()
+        operation, index = self._describe(method, url)
+        limiter = None
+        if settings.ELASTIC_CONCURRENCY_LIMITS_ENABLED:
+            query_class = self._query_class(operation, body)
+            limiter = self.limiters[query_class]
+            await self._acquire(limiter, query_class)
+        # Пробный вызов half-open занимаем только со слотом лимитера на руках, чтобы отказ очереди его не потерял
+        trial = False
+        if settings.ELASTIC_BREAKER_ENABLED:
+            trial = self.breaker.state == CircuitBreaker.HALF_OPEN
+            if not self.breaker.allow_request():
+                if limiter is not None:
+                    limiter.release()
+                self._reject_open_circuit()
+        started = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(
+                super().perform_request(method, url, headers=headers, params=params, body=body),
+                settings.ELASTIC_DEADLINE_IN_SECONDS,
+            )
+        except asyncio.TimeoutError as error:
+            self.breaker.record_failure()
+            raise ConnectionTimeout('TIMEOUT', 'Elasticsearch request deadline exceeded', error)
+        except TransportError as error:
+            # 404 и ошибки запроса означают, что кластер отвечает; в предохранитель идут только сбои доступности
+            if isinstance(error, ConnectionError) or error.status_code in UNAVAILABLE_STATUSES:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        else:
+            self.breaker.record_success()
+            return response
+        finally:
+            if trial:
+                # После record_* это ничего не меняет, а при отмене или неожиданной ошибке освобождает пробный
+                # вызов, иначе предохранитель навсегда остался бы в half-open
+                self.breaker.release_trial()
+            if limiter is not None:
+                limiter.release()
+            metrics.record(metrics.ELASTIC_REQUEST_DURATION, 'es', time.perf_counter() - started, operation, index)
+
+    @staticmethod
+    def _reject_open_circuit():
+        metrics.ELASTIC_BREAKER_REJECTIONS.inc()
+        raise CircuitOpenError('N/A', 'Circuit breaker is open', None)
+
+    @staticmethod
+    async def _acquire(limiter: ConcurrencyLimiter, query_class: str):
+        started = time.perf_counter()
+        try:
+            await limiter.acquire()
+        except ConcurrencyLimitExceeded as error:
+            metrics.ELASTIC_QUEUE_REJECTIONS.inc(query_class, str(error))
+            raise ElasticOverloadedError('N/A', f'Too many concurrent {query_class} requests: {error}', None)
+        finally:
+            metrics.ELASTIC_QUEUE_WAIT.observe(time.perf_counter() - started, query_class)
+
+    @staticmethod
+    def _query_class(operation: str, body) -> str:
+        if operation in BY_ID_OPERATIONS:
+            return QUERY_CLASS_BY_ID
+        if body is not None and _contains_marker(body, FUZZY_MARKERS):
+            return QUERY_CLASS_SEARCH
+        return QUERY_CLASS_LIST
+
+    @staticmethod
+    def _describe(method: str, url: str) -> tuple[str, str]:
+        # /movies/_search -> (_search, movies), /_msearch -> (_msearch, ''), /movies/_doc/<id> -> (_doc, movies)
+        parts = url.strip('/').split('/')
+        index = parts[0] if parts and not parts[0].startswith('_') else ''
+        operation = next((part for part in parts if part.startswith('_')), method)
+        return operation, index
+
+
+def connection_pool_size() -> int:
+    """Размер пула соединений к узлу: не меньше суммы лимитов классов, чтобы классы не делили одну очередь пула."""
+    if not settings.ELASTIC_CONCURRENCY_LIMITS_ENABLED:
+        return settings.ELASTIC_MAX_CONNECTIONS or DEFAULT_MAX_CONNECTIONS
+    class_limits = (settings.ELASTIC_CONCURRENCY_BY_ID + settings.ELASTIC_CONCURRENCY_LIST
+                    + settings.ELASTIC_CONCURRENCY_SEARCH)
+    if settings.ELASTIC_MAX_CONNECTIONS is None:
+        return class_limits
+    if settings.ELASTIC_MAX_CONNECTIONS < class_limits:
+        logger.warning(
+            'ELASTIC_MAX_CONNECTIONS=%s is below the sum of ELASTIC_CONCURRENCY_* limits (%s): requests of different '
+            'classes will queue for the same connections', settings.ELASTIC_MAX_CONNECTIONS, class_limits,
+        )
+    return settings.ELASTIC_MAX_CONNECTIONS
+
+
+def breaker_rejects_requests() -> bool:
+    # Пока предохранитель отклоняет запросы, фоновое обновление кеша заведомо упадёт с CircuitOpenError
+    if es is None or not settings.ELASTIC_BREAKER_ENABLED:
+        return False
+    breaker = getattr(es.transport, 'breaker', None)
+    return breaker is not None and breaker.rejects_requests()
+
+
+def _contains_marker(body, markers: tuple[str, ...]) -> bool:
+    # Тело msearch приходит уже сериализованным в NDJSON, тело search - словарём
+    if isinstance(body, (str, bytes)):
+        text = body.decode() if isinstance(body, bytes) else body
+        return any(marker in text for marker in markers)
+    if isinstance(body, dict):
+        return any(key in markers or _contains_marker(value, markers) for key, value in body.items())
+    if isinstance(body, (list, tuple)):
+        return any(_contains_marker(item, markers) for item in body)
+    return False
+
+
+class KeepAliveConnection(AIOHttpConnection):
+    """AIOHttpConnection с настраиваемым временем жизни простаивающих keep-alive соединений.
+
+    Повторяет AIOHttpConnection._create_aiohttp_session из elasticsearch==7.9.1, добавляя keepalive_timeout.
+    """
+
+    def __init__(self, *args, keepalive_timeout: float = 15, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._keepalive_timeout = keepalive_timeout
+
+    async def _create_aiohttp_session(self):
+        if self.loop is None:
+            self.loop = get_running_loop()
+        self.session = aiohttp.ClientSession(
+            headers=self.headers,
+            auto_decompress=True,
+            loop=self.loop,
+            cookie_jar=aiohttp.DummyCookieJar(),
+            response_class=ESClientResponse,
+            connector=aiohttp.TCPConnector(
+                limit=self._limit, use_dns_cache=True, ssl=self._ssl_context,
+                keepalive_timeout=self._keepalive_timeout,
+            ),
+        )
+
 
 # Функция понадобится при внедрении зависимостей
 async def get_elastic() -> AsyncElasticsearch:
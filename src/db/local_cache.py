@@ -0,0 +1,93 @@
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from src.core.config import settings
+
+
+class LocalCache:
+    """In-process LRU cache с TTL, ограниченный числом записей и суммарным размером в байтах.
+
+    Хранит уже распарсенные объекты, поэтому вызывающий код не должен их изменять.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expire_at, size, value = entry
+        if expire_at <= time.monotonic():
+            self._remove(key, size)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, size: int, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or size > self.max_bytes:
+            self.delete(key)
+            return
+        self.delete(key)
+        self._data[key] = (time.monotonic() + ttl, size, value)
+        self.size_bytes += size
+        while len(self._data) > self.max_entries or self.size_bytes > self.max_bytes:
+            old_key, (_, old_size, _) = self._data.popitem(last=False)
+            self.size_bytes -= old_size
+            self.evictions += 1
+
+    def delete(self, key: str):
+        entry = self._data.get(key)
+        if entry is not None:
+            self._remove(key, entry[1])
+
+    def clear(self):
+        self._data.clear()
+        self.size_bytes = 0
+
+    def _remove(self, key: str, size: int):
+        del self._data[key]
+        self.size_bytes -= size
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'entries': len(self._data),
+            'bytes': self.size_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+local_cache: Optional[LocalCache] = None
+
+
+def create_local_cache() -> Optional[LocalCache]:
+    if not settings.LOCAL_CACHE_ENABLED:
+        return None
+    return LocalCache(
+        max_entries=settings.LOCAL_CACHE_MAX_ENTRIES,
+        max_bytes=settings.LOCAL_CACHE_MAX_BYTES,
+        ttl=settings.LOCAL_CACHE_EXPIRE_IN_SECONDS,
+    )
+
+
+# Функция понадобится при внедрении зависимостей
+async def get_local_cache() -> Optional[LocalCache]:
+    return local_cache
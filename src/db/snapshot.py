@@ -0,0 +1,304 @@
+"""Снимок каталога (фильмы, персоны, жанры) в одном файле, который читается через mmap без загрузки в память.
+
+Формат: MAGIC, длина заголовка, JSON-заголовок с таблицей секций {имя: [смещение, длина]}, затем секции,
+выровненные по 8 байт. Для каждого индекса:
+    <index>.docs         - документы подряд в JSON
+    <index>.docs.offsets - Q[n + 1], границы документов в docs
+    <index>.ids          - id документов по 16 байт (UUID)
+    <index>.table        - i[2^k], хеш-таблица с открытой адресацией id -> номер документа (-1 - пусто)
+Для фильмов ещё краткие карточки (id, title, imdb_rating) для списков - movies.cards - и номера документов, заранее
+отсортированные по рейтингу и по названию - movies.by_<порядок>. Для жанров - постинги: позиции фильмов жанра в этих
+порядках (genre.by_<порядок>), для персон - фильмы персоны по убыванию рейтинга (person.films).
+"""
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, Iterable, Optional, Union
+from uuid import UUID
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'MVSNAP01'
+PREAMBLE = struct.Struct('<8sQ')
+ALIGNMENT = 8
+PERSON_ROLES = ('actors', 'writers', 'directors')
+# Параметр sort API -> порядок в снимке
+SORT_ORDERS = {'imdb_rating': 'rating', 'title': 'title'}
+FILM_CARD_FIELDS = ('id', 'title', 'imdb_rating')
+
+
+class SnapshotFormatError(Exception):
+    pass
+
+
+def _id_bytes(document_id: Any) -> Optional[bytes]:
+    try:
+        return UUID(str(document_id)).bytes
+    except ValueError:
+        return None
+
+
+def _with_uuid_ids(name: str, documents: list[dict]) -> list[dict]:
+    # Поиск по id в снимке рассчитан на UUID; документ с другим id пропускаем, а не роняем всю выгрузку
+    valid = [document for document in documents if _id_bytes(document.get('id')) is not None]
+    if len(valid) < len(documents):
+        skipped = [document.get('id') for document in documents if _id_bytes(document.get('id')) is None]
+        logger.warning('Skipped %s %s documents without a UUID id: %s', len(skipped), name, skipped[:10])
+    return valid
+
+
+def _slot(key: bytes, mask: int) -> int:
+    # id - случайные UUID, поэтому первых 8 байт достаточно как хеша
+    return int.from_bytes(key[:8], 'little') & mask
+
+
+def _build_hash_table(ids: list[bytes]) -> array:
+    size = 1
+    while size < 2 * len(ids):
+        size *= 2
+    mask = size - 1
+    table = array('i', [-1]) * size
+    for ordinal, key in enumerate(ids):
+        slot = _slot(key, mask)
+        while table[slot] != -1:
+            slot = (slot + 1) & mask
+        table[slot] = ordinal
+    return table
+
+
+def _postings(lists: list[list[int]]) -> tuple[array, array]:
+    values = array('I')
+    offsets = array('Q', [0])
+    for values_list in lists:
+        values.extend(values_list)
+        offsets.append(len(values))
+    return values, offsets
+
+
+def _blob_sections(name: str, documents: Iterable[dict]) -> dict[str, bytes]:
+    blobs = [orjson.dumps(document) for document in documents]
+    offsets = array('Q', [0])
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    return {name: b''.join(blobs), f'{name}.offsets': offsets.tobytes()}
+
+
+def _index_sections(name: str, documents: list[dict]) -> dict[str, bytes]:
+    ids = [_id_bytes(document['id']) for document in documents]
+    return {
+        **_blob_sections(f'{name}.docs', documents),
+        f'{name}.ids': b''.join(ids),
+        f'{name}.table': _build_hash_table(ids).tobytes(),
+    }
+
+
+def write_snapshot(path: Path, movies: list[dict], persons: list[dict], genres: list[dict]):
+    """Пишет снимок во временный файл рядом и переименовывает его, так что читатели не видят его недописанным."""
+    movies = _with_uuid_ids('movies', movies)
+    persons = _with_uuid_ids('person', persons)
+    genres = _with_uuid_ids('genre', genres)
+    sections = {}
+    for name, documents in (('movies', movies), ('person', persons), ('genre', genres)):
+        sections.update(_index_sections(name, documents))
+    # Спискам не нужны вложенные персоны и жанры: разбирать полный документ на каждый элемент страницы дорого
+    sections.update(_blob_sections('movies.cards', (
+        {field: movie.get(field) for field in FILM_CARD_FIELDS} for movie in movies
+    )))
+
+    genre_ordinals = {str(genre['id']): ordinal for ordinal, genre in enumerate(genres)}
+    person_ordinals = {str(person['id']): ordinal for ordinal, person in enumerate(persons)}
+    orders = {
+        'rating': sorted(range(len(movies)), key=lambda ordinal: (
+            movies[ordinal].get('imdb_rating') or 0, movies[ordinal].get('title') or '', str(movies[ordinal]['id']),
+        )),
+        'title': sorted(range(len(movies)), key=lambda ordinal: (
+            movies[ordinal].get('title') or '', str(movies[ordinal]['id']),
+        )),
+    }
+    for order, ordinals in orders.items():
+        sections[f'movies.by_{order}'] = array('I', ordinals).tobytes()
+        genre_positions = [[] for _ in genres]
+        for position, ordinal in enumerate(ordinals):
+            for genre in movies[ordinal].get('genre') or ():
+                genre_ordinal = genre_ordinals.get(str(genre['id']))
+                if genre_ordinal is not None:
+                    genre_positions[genre_ordinal].append(position)
+        values, offsets = _postings(genre_positions)
+        sections[f'genre.by_{order}'] = values.tobytes()
+        sections[f'genre.by_{order}.offsets'] = offsets.tobytes()
+
+    person_films = [[] for _ in persons]
+    for ordinal in reversed(orders['rating']):
+        person_ids = {str(person['id']) for role in PERSON_ROLES for person in movies[ordinal].get(role) or ()}
+        for person_id in person_ids:
+            person_ordinal = person_ordinals.get(person_id)
+            if person_ordinal is not None:
+                person_films[person_ordinal].append(ordinal)
+    values, offsets = _postings(person_films)
+    sections['person.films'] = values.tobytes()
+    sections['person.films.offsets'] = offsets.tobytes()
+
+    table = {}
+    position = 0
+    for name, data in sections.items():
+        table[name] = [position, len(data)]
+        position += len(data) + (-len(data) % ALIGNMENT)
+    header = orjson.dumps({'byteorder': sys.byteorder, 'sections': table})
+    data_start = PREAMBLE.size + len(header)
+    data_start += -data_start % ALIGNMENT
+
+    temporary_path = path.with_name(f'{path.name}.tmp')
+    with open(temporary_path, 'wb') as file:
+        file.write(PREAMBLE.pack(MAGIC, len(header)))
+        file.write(header)
+        file.write(b'\0' * (data_start - PREAMBLE.size - len(header)))
+        for data in sections.values():
+            file.write(data)
+            file.write(b'\0' * (-len(data) % ALIGNMENT))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+class _Postings:
+    def __init__(self, values: memoryview, offsets: memoryview):
+        self.values = values
+        self.offsets = offsets
+
+    def __getitem__(self, ordinal: int) -> memoryview:
+        return self.values[self.offsets[ordinal]:self.offsets[ordinal + 1]]
+
+
+class _Blobs:
+    def __init__(self, snapshot: 'CatalogueSnapshot', name: str):
+        self._mmap = snapshot.mmap
+        self._start = snapshot.section_offset(name)
+        self.offsets = snapshot.section(f'{name}.offsets', 'Q')
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, ordinal: int) -> dict:
+        return orjson.loads(self._mmap[self._start + self.offsets[ordinal]:self._start + self.offsets[ordinal + 1]])
+
+    def many(self, ordinals: Iterable[int]) -> list[dict]:
+        return [self[ordinal] for ordinal in ordinals]
+
+
+class _DocumentTable:
+    def __init__(self, snapshot: 'CatalogueSnapshot', name: str):
+        self.docs = _Blobs(snapshot, f'{name}.docs')
+        self.ids = snapshot.section(f'{name}.ids')
+        self.table = snapshot.section(f'{name}.table', 'i')
+        self._mask = len(self.table) - 1
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def ordinal(self, document_id: Any) -> Optional[int]:
+        key = _id_bytes(document_id)
+        if key is None:
+            return None
+        slot = _slot(key, self._mask)
+        while True:
+            ordinal = self.table[slot]
+            if ordinal < 0:
+                return None
+            if self.ids[ordinal * 16:(ordinal + 1) * 16] == key:
+                return ordinal
+            slot = (slot + 1) & self._mask
+
+    def get(self, document_id: Any) -> Optional[dict]:
+        ordinal = self.ordinal(document_id)
+        return self.docs[ordinal] if ordinal is not None else None
+
+
+class CatalogueSnapshot:
+    """Неизменяемый снимок каталога поверх mmap файла.
+
+    Объект подменяется целиком при появлении нового снимка; старый файл отображён, пока на него есть ссылки
+    у запросов в работе, и закрывается сборщиком мусора.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, 'rb') as file:
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.mmap)
+        magic, header_length = PREAMBLE.unpack_from(self.mmap)
+        if magic != MAGIC:
+            raise SnapshotFormatError(f'{path} is not a catalogue snapshot')
+        header = orjson.loads(self.mmap[PREAMBLE.size:PREAMBLE.size + header_length])
+        if header['byteorder'] != sys.byteorder:
+            raise SnapshotFormatError(f'{path} was written with {header["byteorder"]} byte order')
+        data_start = PREAMBLE.size + header_length
+        data_start += -data_start % ALIGNMENT
+        self._sections = {
+            name: (data_start + offset, length) for name, (offset, length) in header['sections'].items()
+        }
+
+        self.movies = _DocumentTable(self, 'movies')
+        self.persons = _DocumentTable(self, 'person')
+        self.genres = _DocumentTable(self, 'genre')
+        self.film_cards = _Blobs(self, 'movies.cards')
+        self.orders = {order: self.section(f'movies.by_{order}', 'I') for order in SORT_ORDERS.values()}
+        self.genre_postings = {
+            order: _Postings(self.section(f'genre.by_{order}', 'I'), self.section(f'genre.by_{order}.offsets', 'Q'))
+            for order in SORT_ORDERS.values()
+        }
+        self.person_films = _Postings(self.section('person.films', 'I'), self.section('person.films.offsets', 'Q'))
+
+    @property
+    def name(self) -> str:
+        return self.path.name
+
+    def section_offset(self, name: str) -> int:
+        return self._sections[name][0]
+
+    def section(self, name: str, typecode: str = 'B') -> memoryview:
+        offset, length = self._sections[name]
+        view = self.buffer[offset:offset + length]
+        return view.cast(typecode) if typecode != 'B' else view
+
+    def get_film(self, film_id: Any) -> Optional[dict]:
+        return self.movies.get(film_id)
+
+    def get_person(self, person_id: Any) -> Optional[dict]:
+        return self.persons.get(person_id)
+
+    def get_genre(self, genre_id: Any) -> Optional[dict]:
+        return self.genres.get(genre_id)
+
+    def list_genres(self) -> list[dict]:
+        return self.genres.docs.many(range(len(self.genres)))
+
+    def get_person_films(self, person_id: Any) -> Optional[list[dict]]:
+        ordinal = self.persons.ordinal(person_id)
+        if ordinal is None:
+            return None
+        return self.film_cards.many(self.person_films[ordinal])
+
+    def list_films(self, sort: str, start: int, end: int, genre_id: Any = None) -> Optional[list[dict]]:
+        """Страница карточек фильмов в порядке sort ('-imdb_rating', 'title', ...).
+
+        None - такой сортировки в снимке нет.
+        """
+        order = SORT_ORDERS.get(sort.lstrip('-'))
+        if order is None:
+            return None
+        ordinals = self.orders[order]
+        positions: Union[range, memoryview] = range(len(ordinals))
+        if genre_id is not None:
+            genre_ordinal = self.genres.ordinal(genre_id)
+            if genre_ordinal is None:
+                return []
+            positions = self.genre_postings[order][genre_ordinal]
+        if sort.startswith('-'):
+            positions = positions[::-1]
+        return self.film_cards.many(ordinals[position] for position in positions[start:end])
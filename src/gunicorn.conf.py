@@ -0,0 +1,44 @@
+# Конфигурация продакшен-запуска: gunicorn src.main:app -c src/gunicorn.conf.py
+import math
+import os
+from typing import Optional
+
+from src.core.config import settings
+
+
+def cgroup_cpu_limit() -> Optional[int]:
+    # Квота CPU контейнера: cgroup v2 (cpu.max) или v1 (cfs_quota_us / cfs_period_us); None - квоты нет
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as file:
+            quota, period = file.read().split()[:2]
+    except OSError:
+        try:
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as file:
+                quota = file.read().strip()
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as file:
+                period = file.read().strip()
+        except OSError:
+            return None
+    if quota in ('max', '-1'):
+        return None
+    return max(1, math.ceil(int(quota) / int(period)))
+
+
+def available_cpus() -> int:
+    # multiprocessing.cpu_count() видит все ядра хоста, а не ограничения контейнера
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    limit = cgroup_cpu_limit()
+    return min(cpus, limit) if limit else cpus
+
+
+bind = settings.WEB_BIND
+# Каждый воркер - отдельный event loop, поэтому одного воркера на ядро достаточно, чтобы занять все ядра
+workers = settings.WEB_WORKERS or available_cpus()
+# UvicornWorker сам выбирает uvloop и httptools, если они установлены
+worker_class = 'uvicorn.workers.UvicornWorker'
+keepalive = settings.WEB_KEEPALIVE_IN_SECONDS
+# По SIGTERM воркер перестаёт принимать соединения и дожидается запросов в работе не дольше graceful_timeout
+graceful_timeout = settings.WEB_GRACEFUL_TIMEOUT_IN_SECONDS
+# Прогрев кешей при старте воркера не должен приниматься за зависание
+timeout = max(30, settings.WEB_GRACEFUL_TIMEOUT_IN_SECONDS)
+accesslog = '-'
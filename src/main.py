@@ -1,12 +1,28 @@
+import logging
+
 import aioredis
 import uvicorn
 from elasticsearch import AsyncElasticsearch
+from elasticsearch.exceptions import TransportError
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
 
+from src.api import health
+from src.api.degraded import StaleResponseMiddleware, elastic_error_handler
+from src.api.http_cache import HTTPCacheMiddleware, listen_for_invalidations
+from src.api.metrics import MetricsMiddleware, metrics_endpoint
+from src.api.warmup import warm_up
 from src.api.v1 import film, genre, person
 from src.core.config import settings
-from src.db import elastic, redis
+from src.db import elastic, local_cache, redis
+from src.services.background import run_periodically, stop_background_tasks
+from src.services.genre_catalogue import refresh_genre_catalogue
+from src.services.health import retry_with_backoff
+from src.services.snapshot import refresh_snapshot
+from src.services.suggest_index import refresh_suggest_index
+from src.services.redis import wait_for_background_refreshes
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -16,15 +32,85 @@ app = FastAPI(
 )
 
 
+async def _ping_elastic():
+    if not await elastic.es.ping():
+        raise ConnectionError('ping failed')
+
+
 @app.on_event('startup')
 async def startup():
-    redis.redis = await aioredis.create_redis_pool((settings.REDIS_HOST, settings.REDIS_PORT), minsize=10, maxsize=20)
-    elastic.es = AsyncElasticsearch(hosts=[f'{settings.ELASTIC_HOST}:{settings.ELASTIC_PORT}'])
+    # Пул сразу открывает REDIS_POOL_MIN_SIZE соединений, поэтому без Redis воркер не стартует
+    redis.redis = await retry_with_backoff(
+        lambda: aioredis.create_redis_pool(
+            (settings.REDIS_HOST, settings.REDIS_PORT),
+            minsize=settings.REDIS_POOL_MIN_SIZE,
+            maxsize=settings.REDIS_POOL_MAX_SIZE,
+            timeout=settings.REDIS_CONNECT_TIMEOUT_IN_SECONDS,
+        ),
+        'Redis',
+    )
+    elastic.es = AsyncElasticsearch(
+        hosts=[f'{settings.ELASTIC_HOST}:{settings.ELASTIC_PORT}'],
+        transport_class=elastic.ElasticTransport,
+        connection_class=elastic.KeepAliveConnection,
+        maxsize=elastic.connection_pool_size(),
+        timeout=settings.ELASTIC_TIMEOUT_IN_SECONDS,
+        keepalive_timeout=settings.ELASTIC_KEEPALIVE_TIMEOUT_IN_SECONDS,
+        max_retries=settings.ELASTIC_MAX_RETRIES,
+        retry_on_timeout=settings.ELASTIC_RETRY_ON_TIMEOUT,
+        dead_timeout=settings.ELASTIC_DEAD_TIMEOUT_IN_SECONDS,
+        sniff_on_start=settings.ELASTIC_SNIFF_ON_START,
+        sniff_on_connection_fail=settings.ELASTIC_SNIFF_ON_CONNECTION_FAIL,
+        sniffer_timeout=settings.ELASTIC_SNIFFER_TIMEOUT_IN_SECONDS,
+    )
+    # Прогрев: сессия, DNS и первое соединение к Elasticsearch. Если кластер недоступен, воркер всё равно стартует,
+    # а /health/ready отвечает 503, пока он не поднимется
+    try:
+        await retry_with_backoff(_ping_elastic, 'Elasticsearch')
+    except Exception:
+        logger.exception('Elasticsearch is not available at startup')
+    local_cache.local_cache = local_cache.create_local_cache()
+    if settings.HTTP_CACHE_ENABLED:
+        # Подписка держит одно соединение пула Redis; после обрыва переподключается через секунду
+        run_periodically(lambda: listen_for_invalidations(redis.redis), 1, 'HTTP cache invalidation listener')
+    if settings.GENRE_CATALOGUE_ENABLED:
+        try:
+            await refresh_genre_catalogue(elastic.es)
+        except Exception:
+            # Пока каталог не загружен, жанры отдаются через Redis/Elasticsearch
+            logger.exception('Genre catalogue is not loaded at startup')
+        run_periodically(lambda: refresh_genre_catalogue(elastic.es),
+                         settings.GENRE_CATALOGUE_REFRESH_INTERVAL_IN_SECONDS, 'genre catalogue refresh')
+    if settings.SUGGEST_ENABLED:
+        try:
+            await refresh_suggest_index(elastic.es)
+        except Exception:
+            # Без индекса подсказки идут префиксным запросом в Elasticsearch
+            logger.exception('Suggest index is not built at startup')
+        run_periodically(lambda: refresh_suggest_index(elastic.es), settings.SUGGEST_REFRESH_INTERVAL_IN_SECONDS,
+                         'suggest index refresh', jitter=settings.SUGGEST_REFRESH_JITTER_IN_SECONDS)
+    if settings.SNAPSHOT_ENABLED:
+        try:
+            await refresh_snapshot()
+        except Exception:
+            # Без снимка все запросы обслуживаются через Redis/Elasticsearch
+            logger.exception('Catalogue snapshot is not loaded at startup')
+        run_periodically(refresh_snapshot, settings.SNAPSHOT_REFRESH_INTERVAL_IN_SECONDS,
+                         'catalogue snapshot refresh')
+    if settings.WARM_UP_ENABLED:
+        # Воркер начинает принимать соединения только после завершения startup, то есть уже с прогретыми кешами
+        try:
+            await warm_up(app, elastic.es)
+        except Exception:
+            logger.exception('Cache warm-up failed')
 
 
 @app.on_event('shutdown')
 async def shutdown():
-    await redis.redis.close()
+    await stop_background_tasks()
+    await wait_for_background_refreshes(settings.WEB_GRACEFUL_TIMEOUT_IN_SECONDS)
+    redis.redis.close()
+    await redis.redis.wait_closed()
     await elastic.es.close()
 
 
@@ -33,6 +119,19 @@ async def shutdown():
 app.include_router(film.router, prefix='/api/v1/film', tags=['film'])
 app.include_router(genre.router, prefix='/api/v1/genre', tags=['genre'])
 app.include_router(person.router, prefix='/api/v1/person', tags=['person'])
+app.include_router(health.router, prefix='/health', tags=['health'])
+
+app.add_exception_handler(TransportError, elastic_error_handler)
+
+# Middleware добавляются изнутри наружу: пометка устаревших ответов должна быть видна HTTP-кешу
+app.add_middleware(StaleResponseMiddleware)
+if settings.HTTP_CACHE_ENABLED:
+    app.add_middleware(HTTPCacheMiddleware)
+
+# Добавляется последним, чтобы оказаться снаружи остальных middleware
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    app.add_route('/metrics', metrics_endpoint, include_in_schema=False)
 
 if __name__ == '__main__':
     uvicorn.run(
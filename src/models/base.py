@@ -1,6 +1,10 @@
+from copy import deepcopy
+from typing import Any
+
 import orjson
 # Используем pydantic для упрощения работы при перегонке данных из json в объекты
 from pydantic import BaseModel as PydanticBaseModel
+from pydantic.fields import SHAPE_SINGLETON
 
 
 def orjson_dumps(v, *, default):
@@ -12,3 +16,29 @@ class BaseModel(PydanticBaseModel):
         json_loads = orjson.loads
         json_dumps = orjson_dumps
         allow_population_by_field_name = True
+
+    @classmethod
+    def construct_trusted(cls, data: dict) -> Any:
+        # Данные из нашего же Elasticsearch/кеша уже прошли валидацию при индексации, поэтому собираем модель
+        # без неё. В отличие от construct() понимает алиасы и вложенные модели
+        values, fields_set = {}, set()
+        for name, field in cls.__fields__.items():
+            if field.alias in data:
+                value = data[field.alias]
+            elif name in data:
+                value = data[name]
+            elif not field.required:
+                # Как construct() в pydantic 1.8: ModelField.get_default() появился только в 1.9
+                default_factory = field.default_factory
+                values[name] = default_factory() if default_factory is not None else deepcopy(field.default)
+                continue
+            else:
+                continue
+            fields_set.add(name)
+            if value is not None and isinstance(field.type_, type) and issubclass(field.type_, BaseModel):
+                if field.shape == SHAPE_SINGLETON:
+                    value = field.type_.construct_trusted(value)
+                else:
+                    value = [field.type_.construct_trusted(item) for item in value]
+            values[name] = value
+        return cls.construct(_fields_set=fields_set, **values)
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import UUID4
 
 from src.models.base import BaseModel
@@ -6,3 +8,9 @@ from src.models.base import BaseModel
 class Genre(BaseModel):
     id: UUID4
     name: str
+
+
+class GenreFacet(BaseModel):
+    id: UUID4
+    name: Optional[str]
+    count: int
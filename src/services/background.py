@@ -0,0 +1,33 @@
+import asyncio
+import logging
+import random
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# Фоновые задачи приложения, останавливаются при shutdown
+_tasks: set = set()
+
+
+def run_periodically(func: Callable[[], Awaitable[Any]], interval: float, name: str,
+                     jitter: float = 0) -> asyncio.Task:
+    # jitter - случайная добавка к паузе, чтобы воркеры, запущенные одновременно, не ходили в бэкенды разом
+    async def loop():
+        while True:
+            await asyncio.sleep(interval + random.uniform(0, jitter))
+            try:
+                await func()
+            except Exception:
+                logger.exception('Periodic task %s failed', name)
+
+    task = asyncio.ensure_future(loop())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+async def stop_background_tasks():
+    tasks = list(_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,58 @@
+import hashlib
+from typing import Any, Iterable, Union
+
+import orjson
+
+from src.core.config import settings
+
+# Вложенные сущности фильма, id которых тоже попадают в теги записи
+NESTED_ENTITY_FIELDS = ('genre', 'actors', 'writers', 'directors')
+
+
+def make_cache_key(query: Any, index: str) -> str:
+    # Ключ строится по каноническому JSON запроса: порядок ключей в словарях не влияет на результат
+    canonical_query = orjson.dumps(query, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+    hash_key = hashlib.sha1(canonical_query).hexdigest()
+    return f'{index}::v{settings.CACHE_KEY_SCHEMA_VERSION}::{hash_key}'
+
+
+def make_document_key(document_id: Any, index: str) -> str:
+    # Документы, полученные по id, кешируются под id сущности, а не под хешем запроса
+    return f'{index}::v{settings.CACHE_KEY_SCHEMA_VERSION}::doc::{document_id}'
+
+
+def make_person_films_key(person_id: Any) -> str:
+    # Проекция персона -> фильмы: hash film_id -> краткая карточка фильма
+    return f'person_films::v{settings.CACHE_KEY_SCHEMA_VERSION}::{person_id}'
+
+
+def make_person_films_ready_key() -> str:
+    # Выставляется после полного построения проекции: с ним отсутствие hash означает "фильмов нет"
+    return f'person_films::v{settings.CACHE_KEY_SCHEMA_VERSION}::ready'
+
+
+def make_film_persons_key(film_id: Any) -> str:
+    # Обратная связь для инкрементального обновления: персоны, в чьих проекциях сейчас есть фильм
+    return f'film_persons::v{settings.CACHE_KEY_SCHEMA_VERSION}::{film_id}'
+
+
+def make_tag_key(entity_id: str) -> str:
+    return f'tag::{entity_id}'
+
+
+def extract_entity_ids(hits: Union[Iterable[dict], dict]) -> set[str]:
+    if isinstance(hits, dict):
+        # Одиночный документ (_source), закешированный по id
+        hits = [{'_source': hits}]
+    entity_ids = set()
+    for hit in hits:
+        if '_id' in hit:
+            entity_ids.add(hit['_id'])
+        source = hit.get('_source') or {}
+        if 'id' in source:
+            entity_ids.add(str(source['id']))
+        for field in NESTED_ENTITY_FIELDS:
+            for entity in source.get(field) or ():
+                if isinstance(entity, dict) and 'id' in entity:
+                    entity_ids.add(str(entity['id']))
+    return entity_ids
@@ -0,0 +1,207 @@
+import zlib
+from typing import Any, Iterable, Optional
+
+import orjson
+
+from src.core.config import settings
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - необязательная зависимость
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - необязательная зависимость
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover - необязательная зависимость
+    lz4_frame = None
+
+# Формат записи: [версия формата][id кодека][id сжатия] + полезная нагрузка.
+# Кодек и сжатие читаются из заголовка, поэтому смена настроек не требует очистки Redis.
+PAYLOAD_VERSION = 1
+HEADER_SIZE = 3
+
+# Поля hit, которые сохраняются в кеше; остальные (_index, _score, _type...) отбрасываются
+HIT_META_FIELDS = ('_id', '_source', 'sort')
+
+
+class CachePayloadError(ValueError):
+    pass
+
+
+class Codec:
+    codec_id: int
+    name: str
+
+    def dumps(self, value: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, data: bytes) -> Any:
+        raise NotImplementedError
+
+
+class OrjsonCodec(Codec):
+    codec_id = 1
+    name = 'orjson'
+
+    def dumps(self, value: Any) -> bytes:
+        return orjson.dumps(value)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackCodec(Codec):
+    codec_id = 2
+    name = 'msgpack'
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+
+class Compressor:
+    compressor_id: int
+    name: str
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decompress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+
+class NoCompressor(Compressor):
+    compressor_id = 0
+    name = 'none'
+
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def decompress(self, data: bytes) -> bytes:
+        return data
+
+
+class ZlibCompressor(Compressor):
+    compressor_id = 1
+    name = 'zlib'
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, 1)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class ZstdCompressor(Compressor):
+    compressor_id = 2
+    name = 'zstd'
+
+    def __init__(self):
+        self._compressor = zstandard.ZstdCompressor(level=3)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decompressor.decompress(data)
+
+
+class Lz4Compressor(Compressor):
+    compressor_id = 3
+    name = 'lz4'
+
+    def compress(self, data: bytes) -> bytes:
+        return lz4_frame.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return lz4_frame.decompress(data)
+
+
+def available_codecs() -> dict[str, Codec]:
+    codecs = {'orjson': OrjsonCodec()}
+    if msgpack is not None:
+        codecs['msgpack'] = MsgpackCodec()
+    return codecs
+
+
+def available_compressors() -> dict[str, Compressor]:
+    compressors = {'none': NoCompressor(), 'zlib': ZlibCompressor()}
+    if zstandard is not None:
+        compressors['zstd'] = ZstdCompressor()
+    if lz4_frame is not None:
+        compressors['lz4'] = Lz4Compressor()
+    return compressors
+
+
+class CachePayloadCodec:
+    """Упаковывает записи кеша в версионированный бинарный формат и распаковывает любые известные версии."""
+
+    def __init__(self, codec: str = 'orjson', compression: str = 'none', compression_min_bytes: int = 4096):
+        codecs = available_codecs()
+        compressors = available_compressors()
+        if codec not in codecs:
+            raise ValueError(
+                f'Cache codec {codec!r} is not available, install its package or pick one of {list(codecs)}'
+            )
+        if compression not in compressors:
+            raise ValueError(
+                f'Cache compression {compression!r} is not available, install its package or pick one of '
+                f'{list(compressors)}'
+            )
+        self.codec = codecs[codec]
+        self.compressor = compressors[compression]
+        self.compression_min_bytes = compression_min_bytes
+        self._codecs_by_id = {c.codec_id: c for c in codecs.values()}
+        self._compressors_by_id = {c.compressor_id: c for c in compressors.values()}
+
+    def dumps(self, value: Any) -> bytes:
+        data = self.codec.dumps(value)
+        compressor = self.compressor
+        if len(data) < self.compression_min_bytes:
+            compressor = self._compressors_by_id[NoCompressor.compressor_id]
+        header = bytes((PAYLOAD_VERSION, self.codec.codec_id, compressor.compressor_id))
+        return header + compressor.compress(data)
+
+    def loads(self, payload: bytes) -> Any:
+        if len(payload) < HEADER_SIZE:
+            raise CachePayloadError(f'Cache payload is shorter than its {HEADER_SIZE}-byte header')
+        version, codec_id, compressor_id = payload[:HEADER_SIZE]
+        if version != PAYLOAD_VERSION:
+            raise CachePayloadError(f'Unsupported cache payload version {version}')
+        if codec_id not in self._codecs_by_id or compressor_id not in self._compressors_by_id:
+            raise CachePayloadError(f'Unknown cache codec {codec_id} or compression {compressor_id}')
+        data = self._compressors_by_id[compressor_id].decompress(payload[HEADER_SIZE:])
+        return self._codecs_by_id[codec_id].loads(data)
+
+
+def project_hits(hits: list[dict], fields: Optional[Iterable[str]] = None) -> list[dict]:
+    """Оставляет в hits только то, что нужно для ответа: _id, sort и, если заданы fields, часть _source."""
+    if fields is not None:
+        fields = tuple(fields)
+    projected = []
+    for hit in hits:
+        hit = {name: hit[name] for name in HIT_META_FIELDS if name in hit}
+        if fields is not None and '_source' in hit:
+            source = hit['_source']
+            hit['_source'] = {name: source[name] for name in fields if name in source}
+        projected.append(hit)
+    return projected
+
+
+def create_cache_codec() -> CachePayloadCodec:
+    return CachePayloadCodec(
+        codec=settings.CACHE_CODEC,
+        compression=settings.CACHE_COMPRESSION,
+        compression_min_bytes=settings.CACHE_COMPRESSION_MIN_BYTES,
+    )
+
+
+cache_codec = create_cache_codec()
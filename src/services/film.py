@@ -1,4 +1,4 @@
-from typing import Optional, Union
+from typing import Iterable, Optional, Union
 from uuid import UUID
 
 import elasticsearch
@@ -6,43 +6,59 @@ from elasticsearch import AsyncElasticsearch
 from elasticsearch_dsl import Search, Q
 from fastapi import Depends
 
-from src.services.helpers import get_pagination_param
+from src.core.config import settings
+from src.services.cache_keys import make_document_key
+from src.services.codecs import project_hits
+from src.services.genre_catalogue import GenreCatalogue, get_genre_catalogue
+from src.services.helpers import CursorPage, get_cursor_page, get_documents_by_ids
+from src.services.snapshot import get_snapshot
+from src.services.suggest_index import SuggestIndex, get_suggest_index
 from src.db.elastic import get_elastic
+from src.db.snapshot import CatalogueSnapshot
 from src.models.film import BaseFilm, FullFilm
+from src.models.genre import GenreFacet
 from src.services.redis import RedisBaseClass
 
-FILM_CACHE_EXPIRE_IN_SECONDS = 60 * 5  # 5 минут
+# Спискам и поиску нужны только поля BaseFilm, остальной _source из Elasticsearch не запрашиваем
+FILM_LIST_FIELDS = list(BaseFilm.__fields__)
+GENRE_FACETS_LIMIT = 100
 
 
 class FilmService:
-    def __init__(self, redis: RedisBaseClass = Depends(), elastic: AsyncElasticsearch = Depends(get_elastic)):
+    def __init__(self, redis: RedisBaseClass = Depends(), elastic: AsyncElasticsearch = Depends(get_elastic),
+                 genre_catalogue: Optional[GenreCatalogue] = Depends(get_genre_catalogue),
+                 suggest_index: Optional[SuggestIndex] = Depends(get_suggest_index),
+                 snapshot: Optional[CatalogueSnapshot] = Depends(get_snapshot)):
         self.elastic = elastic
         self.redis = redis
+        self.genre_catalogue = genre_catalogue
+        self.suggest_index = suggest_index
+        self.snapshot = snapshot
 
     async def get_by_id(self, film_id: str) -> Union[FullFilm, None]:
-        s = Search(index='movies').query("match", id=film_id)
-        film = await self._get_data(s)
-        if film is None:
-            return None
-        film = film[0]['_source']
-        film_out = FullFilm(**film)
-        return film_out
-
-    async def _get_data(self, s: Search) -> Union[dict, list, None]:
-        s_dict = s.to_dict()
-        index = s._index[0]
-        key = str(s_dict)
-        data = await self.redis.get_data_from_cache(key, index)
-        if not data:
+        films = await self.get_by_ids([film_id])
+        return films[0]
+
+    async def get_by_ids(self, film_ids: list[str]) -> list[Optional[FullFilm]]:
+        if self.snapshot is not None:
+            films = [self.snapshot.get_film(film_id) for film_id in film_ids]
+            return [FullFilm.construct_trusted(film) if film else None for film in films]
+        films = await self.redis.get_or_fill_many(
+            [str(film_id) for film_id in film_ids], 'movies',
+            lambda ids: get_documents_by_ids(self.elastic, 'movies', ids),
+            settings.FILM_CACHE_EXPIRE_IN_SECONDS, key_builder=make_document_key,
+        )
+        return [FullFilm.construct_trusted(film) if film else None for film in films]
+
+    async def _get_data(self, s: Search, fields: Optional[Iterable[str]] = None) -> Union[dict, list, None]:
+        async def get_from_elastic():
             try:
-                data = await self._get_film_from_elastic(s)
+                return project_hits(await self._get_film_from_elastic(s), fields)
             except elasticsearch.exceptions.NotFoundError:
-                data = None
-            if not data:
                 return None
-            await self.redis.put_data_to_cache(data, key, index, FILM_CACHE_EXPIRE_IN_SECONDS)
-        return data
 
+        return await self.redis.get_or_fill(s.to_dict(), s._index[0], get_from_elastic,
+                                            settings.FILM_CACHE_EXPIRE_IN_SECONDS)
 
     @staticmethod
     def _get_pagination_param(page_number: str, size: str) -> tuple:
@@ -54,29 +70,96 @@ class FilmService:
 
     async def get_film_list(self, sort: str, page_number: str, size: str,
                             filter_request: UUID) -> Union[list[BaseFilm], None]:
+        if filter_request and self.genre_catalogue is not None and filter_request not in self.genre_catalogue:
+            # Несуществующий жанр отсекаем по каталогу в памяти, не обращаясь к Redis и Elasticsearch
+            return None
         start_number, end_number = self._get_pagination_param(page_number, size)
-
-        s = Search(index='movies').query("match_all").sort(sort)[start_number:end_number]
-        if filter_request:
-            s = Search(index="movies").query("bool", minimum_should_match=1, should=[
-                Q("nested", path="genre", query=Q("match", genre__id=str(filter_request)))
-            ])
-        films = await self._get_data(s)
+        if self.snapshot is not None:
+            # Список из заранее отсортированных массивов снимка, без обращения к сети
+            films = self.snapshot.list_films(sort, start_number, end_number, filter_request)
+            if films is not None:
+                return [BaseFilm.construct_trusted(film) for film in films]
+        s = self._film_list_search(filter_request).sort(sort)[start_number:end_number]
+        films = await self._get_data(s.source(FILM_LIST_FIELDS), fields=FILM_LIST_FIELDS)
         if films is None:
             return None
-        films_out = [BaseFilm(**film['_source']) for film in films]
+        films_out = [BaseFilm.construct_trusted(film['_source']) for film in films]
         return films_out
 
+    async def get_film_list_after(self, sort: str, size: str, filter_request: Optional[UUID],
+                                  cursor: str) -> Optional[CursorPage]:
+        if filter_request and self.genre_catalogue is not None and filter_request not in self.genre_catalogue:
+            return None
+        s = self._film_list_search(filter_request)
+        # id - тайбрейкер, без него search_after может пропускать фильмы с одинаковым значением сортировки
+        s = s.sort(sort, 'id')
+        return await self._get_cursor_page(s.source(FILM_LIST_FIELDS), cursor, size)
+
+    async def get_genre_facets(self, filter_request: Optional[UUID]) -> Optional[list[GenreFacet]]:
+        if filter_request and self.genre_catalogue is not None and filter_request not in self.genre_catalogue:
+            return None
+        # Число фильмов по жанрам для того же фильтра, что и у списка: одна агрегация без документов
+        s = self._film_list_search(filter_request).extra(size=0)
+        s.aggs.bucket('genre', 'nested', path='genre').bucket(
+            'ids', 'terms', field='genre.id', size=GENRE_FACETS_LIMIT,
+        )
+
+        async def get_from_elastic():
+            response = await self.elastic.search(index='movies', body=s.to_dict())
+            buckets = response['aggregations']['genre']['ids']['buckets']
+            return [{'id': bucket['key'], 'count': bucket['doc_count']} for bucket in buckets]
+
+        facets = await self.redis.get_or_fill(s.to_dict(), 'movies', get_from_elastic,
+                                              settings.FILM_CACHE_EXPIRE_IN_SECONDS)
+        if not facets:
+            return None
+        # Названия берём из каталога жанров в памяти, а не из Elasticsearch
+        return [
+            GenreFacet.construct_trusted({**facet, 'name': self._genre_name(facet['id'])}) for facet in facets
+        ]
+
+    def _genre_name(self, genre_id: str) -> Optional[str]:
+        genre = self.genre_catalogue.get(genre_id) if self.genre_catalogue is not None else None
+        return genre.name if genre is not None else None
+
+    @staticmethod
+    def _film_list_search(filter_request: Optional[UUID]) -> Search:
+        s = Search(index='movies')
+        if filter_request:
+            # Фильтр в filter context: не считает score и кешируется в node query cache Elasticsearch,
+            # поэтому сортировка и пагинация сочетаются с ним в одном запросе
+            s = s.filter('nested', path='genre', query=Q('term', genre__id=str(filter_request)))
+        return s
+
+    async def search_film_after(self, query: str, size: str, cursor: str) -> Optional[CursorPage]:
+        s = Search(index='movies').query("multi_match", query=query, fuzziness="auto").sort('_score', 'id')
+        return await self._get_cursor_page(s.source(FILM_LIST_FIELDS), cursor, size)
+
+    async def _get_cursor_page(self, s: Search, cursor: str, size: str) -> Optional[CursorPage]:
+        films, next_cursor = await get_cursor_page(
+            self.elastic, s, cursor, int(size), lambda page: self._get_data(page, fields=FILM_LIST_FIELDS),
+        )
+        if not films:
+            return None
+        return CursorPage([BaseFilm.construct_trusted(film['_source']) for film in films], next_cursor)
 
     async def search_film_in_elastic(self, query: str, page_number: str, size: str) -> Union[list[BaseFilm], None]:
         start_number, end_number = self._get_pagination_param(page_number, size)
         s = Search(index='movies').query("multi_match", query=query, fuzziness="auto")[start_number:end_number]
-        films = await self._get_data(s)
+        films = await self._get_data(s.source(FILM_LIST_FIELDS), fields=FILM_LIST_FIELDS)
         if films is None:
             return None
-        films_out = [BaseFilm(**film['_source']) for film in films]
+        films_out = [BaseFilm.construct_trusted(film['_source']) for film in films]
         return films_out
 
+    async def suggest_films(self, prefix: str, size: int) -> list[BaseFilm]:
+        if self.suggest_index is not None:
+            return self.suggest_index.suggest_films(prefix, size)
+        # Пока индекс подсказок не построен - префиксный запрос вместо нечёткого multi_match, тоже через кеш
+        s = Search(index='movies').query('match_phrase_prefix', title=prefix)[:size]
+        films = await self._get_data(s.source(FILM_LIST_FIELDS), fields=FILM_LIST_FIELDS)
+        return [BaseFilm.construct_trusted(film['_source']) for film in films or []]
+
     async def _get_film_from_elastic(self, s: Search) -> Optional[FullFilm]:
         doc = await self.elastic.search(index=s._index, body=s.to_dict())
         doc = doc['hits']['hits']
@@ -1,49 +1,69 @@
+from typing import Optional
+
 import elasticsearch
 from elasticsearch import AsyncElasticsearch
-from elasticsearch_dsl import Search
+from elasticsearch_dsl import MultiSearch, Search
 from fastapi import Depends
 
 from src.core.config import settings
 from src.db.elastic import get_elastic
+from src.db.snapshot import CatalogueSnapshot
 from src.models.genre import Genre
+from src.services.cache_keys import make_document_key
+from src.services.codecs import project_hits
+from src.services.genre_catalogue import GenreCatalogue, get_genre_catalogue
+from src.services.helpers import get_documents_by_ids, msearch_hits
+from src.services.snapshot import get_snapshot
 
 from .redis import RedisBaseClass
 
 
 class GenreService:
-    def __init__(self, redis: RedisBaseClass = Depends(), elastic: AsyncElasticsearch = Depends(get_elastic)):
+    def __init__(self, redis: RedisBaseClass = Depends(), elastic: AsyncElasticsearch = Depends(get_elastic),
+                 catalogue: Optional[GenreCatalogue] = Depends(get_genre_catalogue),
+                 snapshot: Optional[CatalogueSnapshot] = Depends(get_snapshot)):
         self.redis = redis
         self.elastic = elastic
+        self.catalogue = catalogue
+        self.snapshot = snapshot
 
         self.es_index = "genre"
 
     async def get_genre_by_id(self, genre_id):
-        elastic_request = Search(index=self.es_index).query("match", id=genre_id)
-
-        genre = await self._get_request_from_cache_or_es(elastic_request)
-
-        return Genre(**genre[0]["_source"])
+        if self.catalogue is not None:
+            return self.catalogue.get(genre_id)
+        if self.snapshot is not None:
+            genre = self.snapshot.get_genre(genre_id)
+            return Genre.construct_trusted(genre) if genre else None
+        genres = await self.redis.get_or_fill_many(
+            [str(genre_id)], self.es_index, lambda ids: get_documents_by_ids(self.elastic, self.es_index, ids),
+            settings.GENRE_CACHE_EXPIRE_IN_SECONDS, key_builder=make_document_key,
+        )
+        if not genres[0]:
+            return None
+        return Genre.construct_trusted(genres[0])
 
     async def get_genre_list(self):
+        if self.catalogue is not None:
+            return list(self.catalogue.genres)
+        if self.snapshot is not None:
+            return [Genre.construct_trusted(genre) for genre in self.snapshot.list_genres()]
         elastic_request = Search(index=self.es_index).query("match_all")[:1000]
 
         genres = await self._get_request_from_cache_or_es(elastic_request)
-
-        return [Genre(**g["_source"]) for g in genres]
+        if not genres:
+            return []
+        return [Genre.construct_trusted(g["_source"]) for g in genres]
 
     async def _get_request_from_cache_or_es(self, search_query: Search):
-        index = search_query._index[0]
-        genre = await self.redis.get_data_from_cache(str(search_query.to_dict()), index)
-        if not genre:
+        async def get_from_elastic():
             try:
-                genre = await self._get_genre_from_elastic(search_query)
+                return project_hits(await self._get_genre_from_elastic(search_query))
             except elasticsearch.exceptions.NotFoundError:
                 return None
-            if not genre:
-                return None
-            await self.redis.put_data_to_cache(genre, str(search_query.to_dict()), index,
-                                               settings.GENRE_CACHE_EXPIRE_IN_SECONDS)
-        return genre
+
+        return await self.redis.get_or_fill(search_query.to_dict(), search_query._index[0], get_from_elastic,
+                                            settings.GENRE_CACHE_EXPIRE_IN_SECONDS)
 
     async def _get_genre_from_elastic(self, search: Search):
         document = await self.elastic.search(index=self.es_index, body=search.to_dict())
@@ -51,6 +71,27 @@ class GenreService:
         return document
 
     async def get_genres_by_name(self, genre_names_list: list[str]) -> list[dict]:
-        s_list = [Search(index='genre').query("match", name=name) for name in genre_names_list]
-        out = [await self._get_request_from_cache_or_es(s) for s in s_list]
+        out = [None] * len(genre_names_list)
+        # Точные совпадения имён отдаём из памяти, в Elasticsearch идёт только полнотекстовый поиск остальных
+        if self.catalogue is not None:
+            for position, name in enumerate(genre_names_list):
+                genre = self.catalogue.find_by_name(name)
+                if genre is not None:
+                    out[position] = [{'_id': str(genre.id), '_source': {'id': str(genre.id), 'name': genre.name}}]
+        missing = [position for position, genres in enumerate(out) if genres is None]
+        if not missing:
+            return out
+        queries = [Search(index=self.es_index).query("match", name=genre_names_list[position]).to_dict()
+                   for position in missing]
+        found = await self.redis.get_or_fill_many(queries, self.es_index, self._get_genres_from_elastic,
+                                                  settings.GENRE_CACHE_EXPIRE_IN_SECONDS)
+        for position, genres in zip(missing, found):
+            out[position] = genres
         return out
+
+    async def _get_genres_from_elastic(self, queries: list[dict]) -> list[list]:
+        multi_search = MultiSearch(index=self.es_index)
+        for query in queries:
+            multi_search = multi_search.add(Search.from_dict(query))
+        response = await self.elastic.msearch(body=multi_search.to_dict())
+        return [project_hits(hits) or None for hits in msearch_hits(response)]
@@ -0,0 +1,57 @@
+import hashlib
+import logging
+from types import MappingProxyType
+from typing import Optional
+
+from elasticsearch import AsyncElasticsearch
+from elasticsearch_dsl import Search
+
+from src.models.genre import Genre
+
+logger = logging.getLogger(__name__)
+
+GENRE_INDEX = 'genre'
+GENRE_CATALOGUE_LIMIT = 1000
+
+
+class GenreCatalogue:
+    """Неизменяемый снимок всех жанров с индексами по id и по имени.
+
+    При обновлении создаётся новый объект и подменяется ссылка, поэтому читателям не нужны блокировки.
+    """
+
+    def __init__(self, genres: list[Genre]):
+        self.genres = tuple(genres)
+        self.by_id = MappingProxyType({str(genre.id): genre for genre in self.genres})
+        self.by_name = MappingProxyType({genre.name.lower(): genre for genre in self.genres})
+        self.version = hashlib.sha1(
+            '\n'.join(f'{genre.id}:{genre.name}' for genre in self.genres).encode()
+        ).hexdigest()
+
+    def get(self, genre_id) -> Optional[Genre]:
+        return self.by_id.get(str(genre_id))
+
+    def find_by_name(self, name: str) -> Optional[Genre]:
+        return self.by_name.get(name.lower())
+
+    def __contains__(self, genre_id) -> bool:
+        return str(genre_id) in self.by_id
+
+
+genre_catalogue: Optional[GenreCatalogue] = None
+
+
+async def refresh_genre_catalogue(elastic: AsyncElasticsearch) -> GenreCatalogue:
+    global genre_catalogue
+    search = Search(index=GENRE_INDEX).query('match_all')[:GENRE_CATALOGUE_LIMIT]
+    response = await elastic.search(index=GENRE_INDEX, body=search.to_dict())
+    catalogue = GenreCatalogue([Genre(**hit['_source']) for hit in response['hits']['hits']])
+    if genre_catalogue is None or genre_catalogue.version != catalogue.version:
+        logger.info('Genre catalogue loaded: %s genres, version %s', len(catalogue.genres), catalogue.version)
+        genre_catalogue = catalogue
+    return genre_catalogue
+
+
+# Функция понадобится при внедрении зависимостей
+async def get_genre_catalogue() -> Optional[GenreCatalogue]:
+    return genre_catalogue
@@ -0,0 +1,49 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, TypeVar
+
+from aioredis import Redis
+from elasticsearch import AsyncElasticsearch
+
+from src.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+async def retry_with_backoff(func: Callable[[], Awaitable[T]], name: str) -> T:
+    """Повторяет подключение STARTUP_CONNECT_ATTEMPTS раз, удваивая паузу; последняя ошибка пробрасывается."""
+    delay = settings.STARTUP_RETRY_BACKOFF_IN_SECONDS
+    for attempt in range(1, settings.STARTUP_CONNECT_ATTEMPTS + 1):
+        try:
+            return await func()
+        except Exception as error:
+            if attempt == settings.STARTUP_CONNECT_ATTEMPTS:
+                raise
+            logger.warning('%s is not available (attempt %s): %r, retrying in %.1fs', name, attempt, error, delay)
+            await asyncio.sleep(delay)
+            delay *= 2
+
+
+async def check_redis(redis: Redis) -> bool:
+    try:
+        await asyncio.wait_for(redis.ping(), settings.HEALTH_CHECK_TIMEOUT_IN_SECONDS)
+    except Exception:
+        logger.warning('Redis health check failed', exc_info=True)
+        return False
+    return True
+
+
+async def check_elastic(elastic: AsyncElasticsearch) -> bool:
+    # ping не бросает исключений на недоступный кластер, а возвращает False
+    try:
+        return await asyncio.wait_for(elastic.ping(), settings.HEALTH_CHECK_TIMEOUT_IN_SECONDS)
+    except Exception:
+        logger.warning('Elasticsearch health check failed', exc_info=True)
+        return False
+
+
+async def check_backends(redis: Redis, elastic: AsyncElasticsearch) -> dict[str, bool]:
+    redis_ok, elastic_ok = await asyncio.gather(check_redis(redis), check_elastic(elastic))
+    return {'redis': redis_ok, 'elasticsearch': elastic_ok}
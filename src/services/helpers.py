@@ -1,4 +1,141 @@
+import base64
+import binascii
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+import elasticsearch
+import orjson
+from elasticsearch.exceptions import HTTP_EXCEPTIONS, TransportError
+from elasticsearch import AsyncElasticsearch
+from elasticsearch_dsl import Search
+
+from src.core.config import settings
+
+SCAN_PAGE_SIZE = 1000
+# Значения сортировки, которые ES возвращает в sort и принимает в search_after
+CURSOR_VALUE_TYPES = (str, int, float, bool)
+
+
+class CursorPage(NamedTuple):
+    items: list
+    next_cursor: Optional[str]
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
 def get_pagination_param(page_number: int, size: int) -> tuple:
     start_number = (page_number - 1) * size
     end_number = page_number * size
     return start_number, end_number
+
+
+def encode_cursor(search_after: list, pit_id: Optional[str] = None) -> str:
+    payload = {'after': search_after}
+    if pit_id is not None:
+        payload['pit'] = pit_id
+    return base64.urlsafe_b64encode(orjson.dumps(payload)).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[Optional[list], Optional[str]]:
+    # Пустой курсор означает первую страницу
+    if not cursor:
+        return None, None
+    try:
+        payload = orjson.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        search_after, pit_id = payload['after'], payload.get('pit')
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        raise InvalidCursorError(f'Invalid page cursor {cursor!r}')
+    # Курсор приходит от клиента: всё, что не похоже на наш search_after, должно давать 400, а не ошибку ES
+    if (not isinstance(search_after, list) or not search_after
+            or not all(value is None or isinstance(value, CURSOR_VALUE_TYPES) for value in search_after)
+            or not (pit_id is None or isinstance(pit_id, str))):
+        raise InvalidCursorError(f'Invalid page cursor {cursor!r}')
+    return search_after, pit_id
+
+
+async def get_documents_by_ids(elastic: AsyncElasticsearch, index: str, ids: list[str]) -> list[Optional[dict]]:
+    # Документ по известному id забираем realtime GET/MGET, а не поисковым запросом со скорингом
+    try:
+        if len(ids) == 1:
+            document = await elastic.get(index=index, id=ids[0])
+            return [document['_source']]
+        response = await elastic.mget(index=index, body={'ids': ids})
+    except elasticsearch.exceptions.NotFoundError:
+        return [None] * len(ids)
+    return [document['_source'] if document.get('found') else None for document in response['docs']]
+
+
+def msearch_hits(response: dict) -> list[list[dict]]:
+    # Ошибка отдельного запроса msearch приходит элементом responses, а не исключением транспорта: поднимаем её
+    # так же, как транспорт поднял бы ответ с этим статусом, чтобы пустой результат не попал в кеш как верный
+    results = []
+    for result in response['responses']:
+        if 'error' in result:
+            status = result.get('status', 500)
+            error = result['error']
+            error_type = error.get('type', 'msearch_error') if isinstance(error, dict) else str(error)
+            raise HTTP_EXCEPTIONS.get(status, TransportError)(status, error_type, error)
+        results.append(result['hits']['hits'])
+    return results
+
+
+async def scan_documents(elastic: AsyncElasticsearch, index: str, fields: Optional[list[str]] = None) -> list[dict]:
+    # search_after по id вместо scroll: не держим контекст на кластере между страницами
+    documents = []
+    search = Search(index=index).query('match_all').sort('id')[:SCAN_PAGE_SIZE]
+    if fields is not None:
+        search = search.source(fields)
+    while True:
+        response = await elastic.search(index=index, body=search.to_dict())
+        hits = response['hits']['hits']
+        documents.extend(hit['_source'] for hit in hits)
+        if len(hits) < SCAN_PAGE_SIZE:
+            return documents
+        search = search.extra(search_after=hits[-1]['sort'])
+
+
+async def get_index_marker(elastic: AsyncElasticsearch, indexes: list[str]) -> tuple:
+    """Признак изменения индексов без чтения документов: число документов и счётчики записей по первичным шардам.
+
+    Счётчик refresh учитывается, чтобы запись, ещё не видимая поиску при прошлом чтении, всё равно сменила признак.
+    """
+    stats = await elastic.indices.stats(index=','.join(indexes), metric='docs,indexing,refresh')
+    return tuple(sorted(
+        (name, primaries['docs']['count'], primaries['docs']['deleted'], primaries['indexing']['index_total'],
+         primaries['indexing']['delete_total'], primaries['refresh']['total'])
+        for name, primaries in ((name, index_stats['primaries']) for name, index_stats in stats['indices'].items())
+    ))
+
+
+async def open_point_in_time(elastic: AsyncElasticsearch, index: str) -> str:
+    # В elasticsearch-py 7.9 нет open_point_in_time, поэтому идём в API напрямую
+    response = await elastic.transport.perform_request(
+        'POST', f'/{index}/_pit', params={'keep_alive': settings.ELASTIC_PIT_KEEP_ALIVE},
+    )
+    return response['id']
+
+
+async def get_cursor_page(
+    elastic: AsyncElasticsearch, search: Search, cursor: str, size: int,
+    get_hits: Callable[[Search], Awaitable[Optional[list]]],
+) -> tuple[list[dict], Optional[str]]:
+    """Страница выдачи через search_after. search должен быть отсортирован с уникальным тайбрейкером.
+
+    Без point-in-time страницы кешируются через get_hits как обычные запросы, с point-in-time идут напрямую в ES.
+    """
+    search_after, pit_id = decode_cursor(cursor)
+    search = search[:size]
+    if search_after is not None:
+        search = search.extra(search_after=search_after)
+    if settings.ELASTIC_PIT_ENABLED:
+        if pit_id is None:
+            pit_id = await open_point_in_time(elastic, search._index[0])
+        body = search.extra(pit={'id': pit_id, 'keep_alive': settings.ELASTIC_PIT_KEEP_ALIVE}).to_dict()
+        response = await elastic.search(body=body)
+        hits = response['hits']['hits']
+        pit_id = response.get('pit_id', pit_id)
+    else:
+        hits = await get_hits(search) or []
+    next_cursor = encode_cursor(hits[-1]['sort'], pit_id) if len(hits) == size else None
+    return hits, next_cursor
@@ -1,30 +1,52 @@
+from typing import Iterable, Optional
+
 import elasticsearch
 from elasticsearch import AsyncElasticsearch
-from elasticsearch_dsl import Q, Search
+from elasticsearch_dsl import MultiSearch, Q, Search
 from fastapi import Depends
 from pydantic import UUID4
 
-from src.services.helpers import get_pagination_param
+from src.services.helpers import CursorPage, get_cursor_page, get_documents_by_ids, get_pagination_param, msearch_hits
 from src.core.config import settings
 from src.db.elastic import get_elastic
-from src.models.person import Person
+from src.db.snapshot import CatalogueSnapshot
+from src.models.person import Person, PersonBase
+from src.services.cache_keys import make_document_key
+from src.services.codecs import project_hits
+from src.services.person_films import PersonFilmsProjection
 from src.services.redis import RedisBaseClass
+from src.services.snapshot import get_snapshot
+from src.services.suggest_index import SuggestIndex, get_suggest_index
 
 
 class PersonService:
-    def __init__(self, redis: RedisBaseClass = Depends(), elastic: AsyncElasticsearch = Depends(get_elastic)):
+    def __init__(self, redis: RedisBaseClass = Depends(), elastic: AsyncElasticsearch = Depends(get_elastic),
+                 suggest_index: Optional[SuggestIndex] = Depends(get_suggest_index),
+                 person_films: PersonFilmsProjection = Depends(),
+                 snapshot: Optional[CatalogueSnapshot] = Depends(get_snapshot)):
         self.redis = redis
         self.elastic = elastic
+        self.suggest_index = suggest_index
+        self.person_films = person_films
+        self.snapshot = snapshot
 
         self.es_index = "person"
 
-    async def get_person_by_id(self, person_id) -> Person:
-        elastic_request = Search(index=self.es_index).query("ids", values=[person_id])
-
-        person = await self._get_request_from_cache_or_es(elastic_request)
-        films = await self.get_person_films_by_person_id(person_id)
-        film_ids = [film["id"] for film in films]
-        return Person(**person[0]["_source"], film_ids=film_ids)
+    async def get_person_by_id(self, person_id) -> Optional[Person]:
+        if self.snapshot is not None:
+            person = self.snapshot.get_person(person_id)
+            if person is None:
+                return None
+            film_ids = [film['id'] for film in self.snapshot.get_person_films(person_id)]
+            return Person.construct_trusted({**person, 'film_ids': film_ids})
+        persons = await self.redis.get_or_fill_many(
+            [str(person_id)], self.es_index, lambda ids: get_documents_by_ids(self.elastic, self.es_index, ids),
+            settings.PERSON_CACHE_EXPIRE_IN_SECONDS, key_builder=make_document_key,
+        )
+        if not persons[0]:
+            return None
+        film_ids = await self.get_film_ids_by_person_ids([person_id])
+        return Person.construct_trusted({**persons[0], 'film_ids': film_ids[str(person_id)]})
 
     async def search_person(self, query: str, page_number: int, page_size: int) -> list[Person]:
         start_number, end_number = get_pagination_param(int(page_number), int(page_size))
@@ -32,36 +54,78 @@ class PersonService:
             Search(index=self.es_index).query("multi_match", query=query, fuzziness="auto")[start_number:end_number]
         )
         persons = await self._get_request_from_cache_or_es(elastic_request)
-        out_persons = list()
-        for p in persons:
-            films = await self.get_person_films_by_person_id(p["_source"]["id"])
-            film_ids = [f["id"] for f in films]
-            person = Person(**p["_source"], film_ids=film_ids)
-            out_persons.append(person)
-        return out_persons
-
-    async def get_person_films_by_person_id(self, person_id: UUID4):
-        search_query = Search(index="movies").query("bool", minimum_should_match=1, should=[
-            Q("nested", path="actors", query=Q("match", actors__id=str(person_id))),
-            Q("nested", path="writers", query=Q("match", writers__id=str(person_id))),
-            Q("nested", path="directors", query=Q("match", directors__id=str(person_id))),
+        if not persons:
+            return []
+        return await self._build_persons(persons)
+
+    async def search_person_after(self, query: str, page_size: int, cursor: str) -> CursorPage:
+        elastic_request = (
+            Search(index=self.es_index).query("multi_match", query=query, fuzziness="auto").sort("_score", "id")
+        )
+        persons, next_cursor = await get_cursor_page(
+            self.elastic, elastic_request, cursor, int(page_size), self._get_request_from_cache_or_es,
+        )
+        return CursorPage(await self._build_persons(persons), next_cursor)
+
+    async def suggest_persons(self, prefix: str, size: int) -> list[PersonBase]:
+        if self.suggest_index is not None:
+            return self.suggest_index.suggest_persons(prefix, size)
+        elastic_request = Search(index=self.es_index).query("match_phrase_prefix", full_name=prefix)[:size]
+        persons = await self._get_request_from_cache_or_es(elastic_request)
+        return [PersonBase.construct_trusted(p["_source"]) for p in persons or []]
+
+    async def _build_persons(self, persons: list[dict]) -> list[Person]:
+        # Фильмы всех персон страницы получаем одним обращением к проекции (или одним msearch), а не по персоне
+        film_ids = await self.get_film_ids_by_person_ids([p["_source"]["id"] for p in persons])
+        return [
+            Person.construct_trusted({**p["_source"], "film_ids": film_ids[str(p["_source"]["id"])]}) for p in persons
+        ]
+
+    async def get_person_films_by_person_id(self, person_id: UUID4) -> list[dict]:
+        films = await self.get_films_by_person_ids([person_id])
+        return films[str(person_id)]
+
+    async def get_film_ids_by_person_ids(self, person_ids: Iterable[UUID4]) -> dict[str, list[str]]:
+        films = await self.get_films_by_person_ids(person_ids)
+        return {person_id: [film["id"] for film in person_films] for person_id, person_films in films.items()}
+
+    async def get_films_by_person_ids(self, person_ids: Iterable[UUID4]) -> dict[str, list[dict]]:
+        person_ids = list(dict.fromkeys(str(person_id) for person_id in person_ids))
+        if not person_ids:
+            return {}
+        if self.snapshot is not None:
+            return {person_id: self.snapshot.get_person_films(person_id) or [] for person_id in person_ids}
+        if settings.PERSON_FILMS_PROJECTION_ENABLED:
+            films = await self.person_films.get_films(person_ids)
+            if films is not None:
+                return films
+        # Пока проекция не построена - поиск по вложенным ролям, по запросу на персону
+        multi_search = MultiSearch(index="movies")
+        for person_id in person_ids:
+            multi_search = multi_search.add(self._person_films_query(person_id))
+        response = await self.elastic.msearch(body=multi_search.to_dict())
+        return {
+            person_id: [film["_source"] for film in hits]
+            for person_id, hits in zip(person_ids, msearch_hits(response))
+        }
+
+    @staticmethod
+    def _person_films_query(person_id: str) -> Search:
+        return Search(index="movies").query("bool", minimum_should_match=1, should=[
+            Q("nested", path="actors", query=Q("match", actors__id=person_id)),
+            Q("nested", path="writers", query=Q("match", writers__id=person_id)),
+            Q("nested", path="directors", query=Q("match", directors__id=person_id)),
         ])
-        films_from_elastic = await self.elastic.search(index='movies', body=search_query.to_dict())
-        return [film["_source"] for film in films_from_elastic["hits"]["hits"]]
 
     async def _get_request_from_cache_or_es(self, search_query: Search):
-        index = search_query._index[0]
-        result = await self.redis.get_data_from_cache(str(search_query.to_dict()), index)
-        if not result:
+        async def get_from_elastic():
             try:
-                result = await self._get_person_from_elastic(search_query)
+                return project_hits(await self._get_person_from_elastic(search_query))
             except elasticsearch.exceptions.NotFoundError:
                 return None
-            if not result:
-                return None
-            await self.redis.put_data_to_cache(result, str(search_query.to_dict()), index,
-                                               settings.PERSON_CACHE_EXPIRE_IN_SECONDS)
-        return result
+
+        return await self.redis.get_or_fill(search_query.to_dict(), search_query._index[0], get_from_elastic,
+                                            settings.PERSON_CACHE_EXPIRE_IN_SECONDS)
 
     async def _get_person_from_elastic(self, search: Search):
         document = await self.elastic.search(index=self.es_index, body=search.to_dict())
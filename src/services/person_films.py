@@ -0,0 +1,117 @@
+import logging
+from typing import Iterable, Optional
+
+import orjson
+from aioredis import Redis
+from elasticsearch import AsyncElasticsearch
+from fastapi import Depends
+
+from src.core import metrics
+from src.db.redis import get_redis
+from src.services.cache_keys import make_film_persons_key, make_person_films_key, make_person_films_ready_key
+from src.services.helpers import get_documents_by_ids, scan_documents
+
+logger = logging.getLogger(__name__)
+
+PERSON_ROLES = ('actors', 'writers', 'directors')
+# Поля фильма, которые отдаёт /person/{id}/film
+FILM_CARD_FIELDS = ('id', 'title', 'imdb_rating')
+PROJECTION_SOURCE_FIELDS = [*FILM_CARD_FIELDS, *(f'{role}.id' for role in PERSON_ROLES)]
+UPDATE_BATCH_SIZE = 500
+
+# Замена персон фильма в проекции одним атомарным шагом: при чтении старых персон и записи новых отдельными
+# командами параллельные обновления одного фильма видят одно и то же старое множество и оставляют фильм в hash
+# персон, которых в нём уже нет. Ключи hash персон строятся в скрипте: старые персоны заранее неизвестны.
+# KEYS[1] - персоны фильма; ARGV - id фильма, карточка, префикс ключей hash персон, новые персоны
+APPLY_FILM_SCRIPT = """
+local film_id, card, prefix = ARGV[1], ARGV[2], ARGV[3]
+local new_person_ids = {}
+for i = 4, #ARGV do
+    new_person_ids[ARGV[i]] = true
+end
+for _, person_id in ipairs(redis.call('smembers', KEYS[1])) do
+    if not new_person_ids[person_id] then
+        redis.call('hdel', prefix .. person_id, film_id)
+    end
+end
+redis.call('del', KEYS[1])
+for i = 4, #ARGV do
+    redis.call('hset', prefix .. ARGV[i], film_id, card)
+    redis.call('sadd', KEYS[1], ARGV[i])
+end
+return #ARGV - 3
+"""
+
+
+class PersonFilmsProjection:
+    """Денормализованная проекция персона -> фильмы в Redis.
+
+    Для каждой персоны - hash film_id -> карточка фильма, для каждого фильма - множество персон, в чьих hash он
+    лежит. Обратная связь позволяет при изменении фильма обновить только затронутые персоны.
+    """
+
+    def __init__(self, redis: Redis = Depends(get_redis)):
+        self.redis = redis
+
+    async def get_films(self, person_ids: list[str]) -> Optional[dict[str, list[dict]]]:
+        # None - проекция ещё не построена и по ней нельзя отличить персону без фильмов от непросчитанной
+        pipeline = self.redis.pipeline()
+        pipeline.exists(make_person_films_ready_key())
+        for person_id in person_ids:
+            pipeline.hvals(make_person_films_key(person_id))
+        with metrics.timer(metrics.REDIS_COMMAND_DURATION, 'redis', 'hvals'):
+            ready, *cards = await pipeline.execute()
+        if not ready:
+            return None
+        return {
+            person_id: sorted((orjson.loads(card) for card in person_cards),
+                              key=lambda film: (-(film.get('imdb_rating') or 0), film.get('title') or ''))
+            for person_id, person_cards in zip(person_ids, cards)
+        }
+
+    async def rebuild(self, elastic: AsyncElasticsearch) -> int:
+        """Полное построение: прогоняет все фильмы индекса и убирает те, которых в нём больше нет."""
+        films = await scan_documents(elastic, 'movies', PROJECTION_SOURCE_FIELDS)
+        for start in range(0, len(films), UPDATE_BATCH_SIZE):
+            await self.update_films(films[start:start + UPDATE_BATCH_SIZE])
+
+        film_ids = {str(film['id']) for film in films}
+        prefix = make_film_persons_key('')
+        removed = []
+        async for key in self.redis.iscan(match=f'{prefix}*', count=500):
+            film_id = key.decode()[len(prefix):]
+            if film_id not in film_ids:
+                removed.append(film_id)
+        await self.remove_films(removed)
+        await self.redis.set(make_person_films_ready_key(), 1)
+        logger.info('Person films projection rebuilt: %s films, %s removed', len(films), len(removed))
+        return len(films)
+
+    async def refresh_films(self, elastic: AsyncElasticsearch, film_ids: list[str]) -> tuple[int, int]:
+        # Перечитывает изменившиеся фильмы; отсутствующие в индексе считаются удалёнными
+        documents = await get_documents_by_ids(elastic, 'movies', film_ids)
+        films = [document for document in documents if document is not None]
+        removed = [film_id for film_id, document in zip(film_ids, documents) if document is None]
+        await self.update_films(films)
+        await self.remove_films(removed)
+        return len(films), len(removed)
+
+    async def update_films(self, films: list[dict]):
+        await self._apply([(str(film['id']), film) for film in films])
+
+    async def remove_films(self, film_ids: Iterable[str]):
+        await self._apply([(str(film_id), None) for film_id in film_ids])
+
+    async def _apply(self, changes: list[tuple[str, Optional[dict]]]):
+        if not changes:
+            return
+        person_key_prefix = make_person_films_key('')
+        pipeline = self.redis.pipeline()
+        for film_id, film in changes:
+            person_ids = sorted({
+                str(person['id']) for role in PERSON_ROLES for person in (film or {}).get(role) or ()
+            })
+            card = orjson.dumps({field: film.get(field) for field in FILM_CARD_FIELDS}) if person_ids else b''
+            pipeline.eval(APPLY_FILM_SCRIPT, keys=[make_film_persons_key(film_id)],
+                          args=[film_id, card, person_key_prefix, *person_ids])
+        await pipeline.execute()
@@ -1,30 +1,389 @@
-import hashlib
-import json
-from typing import Optional
+import asyncio
+import logging
+import math
+import random
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterable, Optional
 
+import elasticsearch
 from aioredis import Redis
 from fastapi import Depends
 
+from src.core import metrics
+from src.core.config import settings
+from src.db.elastic import breaker_rejects_requests
+from src.db.local_cache import LocalCache, get_local_cache
 from src.db.redis import get_redis
+from src.services.cache_keys import extract_entity_ids, make_cache_key, make_tag_key
+from src.services.codecs import CachePayloadError, cache_codec
+from src.services.singleflight import cache_fills
+
+logger = logging.getLogger(__name__)
+
+# Снимаем блокировку, только если она всё ещё наша
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Строит ключ Redis по запросу (или id документа) и индексу
+KeyBuilder = Callable[[Any, str], str]
+
+# Ссылки на фоновые обновления, чтобы задачи не собрал сборщик мусора
+_background_refreshes: set = set()
+
+# Ключи, фоновое обновление которых упало: до следующего заполнения ответы из их устаревших записей помечаются.
+# Словарь как упорядоченное множество, старые ключи вытесняются
+FAILED_REFRESHES_MAX_SIZE = 10000
+_failed_refreshes: dict[str, None] = {}
+
+
+class Freshness:
+    """Отметка HTTP-запроса: в ответ попали устаревшие записи кеша, которые сейчас не удаётся обновить."""
+
+    __slots__ = ('stale',)
+
+    def __init__(self):
+        self.stale = False
+
+
+current_freshness: ContextVar[Optional[Freshness]] = ContextVar('current_freshness', default=None)
+
+
+def mark_stale():
+    freshness = current_freshness.get()
+    if freshness is not None:
+        freshness.stale = True
+
+
+def refresh_unavailable(key: str) -> bool:
+    # Обычное обновление устаревшей записи в фоне (stale-while-revalidate) ответ не помечает: деградация - это
+    # разомкнутый предохранитель или упавшее обновление
+    return key in _failed_refreshes or breaker_rejects_requests()
+
+
+def _remember_failed_refreshes(keys: Iterable[str]):
+    for key in keys:
+        _failed_refreshes.pop(key, None)
+        _failed_refreshes[key] = None
+    while len(_failed_refreshes) > FAILED_REFRESHES_MAX_SIZE:
+        del _failed_refreshes[next(iter(_failed_refreshes))]
+
+
+async def wait_for_background_refreshes(timeout: float):
+    # При остановке даём фоновым обновлениям кеша закончиться, пока клиенты Redis и Elasticsearch ещё открыты
+    if _background_refreshes:
+        await asyncio.wait(list(_background_refreshes), timeout=timeout)
 
 
 class RedisBaseClass:
-    def __init__(self, redis: Redis = Depends(get_redis)):
+    def __init__(self, redis: Redis = Depends(get_redis),
+                 local_cache: Optional[LocalCache] = Depends(get_local_cache)):
         self.redis = redis
+        self.local_cache = local_cache
+
+    async def get_or_fill(self, query: Any, index: str, fill: Callable[[], Awaitable[Any]], expire: int = 20):
+        key = make_cache_key(query, index)
+        entry = await self._get_entry(key)
+        if entry is not None:
+            # После мягкого TTL (или раньше, по XFetch) отдаём что есть и обновляем запись в фоне
+            if self._should_refresh(entry):
+                metrics.CACHE_REQUESTS.inc(index, 'stale')
+                self._schedule_refresh(key, query, index, fill, expire)
+            else:
+                metrics.CACHE_REQUESTS.inc(index, 'hit')
+            if time.time() >= entry['soft'] and refresh_unavailable(key):
+                mark_stale()
+            return entry['data']
+        metrics.CACHE_REQUESTS.inc(index, 'miss')
+        return await cache_fills.do(key, lambda: self._fill_cache(key, query, index, fill, expire))
+
+    @staticmethod
+    def _should_refresh(entry: dict) -> bool:
+        now = time.time()
+        if now >= entry['soft']:
+            return True
+        if settings.CACHE_XFETCH_BETA <= 0 or not entry['delta']:
+            return False
+        # 1 - random() лежит в (0, 1], поэтому логарифм определён
+        return now - entry['delta'] * settings.CACHE_XFETCH_BETA * math.log(1 - random.random()) >= entry['soft']
 
-    async def put_data_to_cache(self, data: dict, s_key: str, index: str, expire: int = 20):
-        hash_key = hashlib.md5(s_key.encode()).hexdigest()
-        key = f'{index}::{hash_key}'
-        data = json.dumps(data)
-        await self.redis.set(self._format_redis_key(s_key, index), data, expire=expire)
+    def _schedule_refresh(self, key: str, query: Any, index: str, fill: Callable[[], Awaitable[Any]], expire: int):
+        # При разомкнутом предохранителе устаревшая запись просто отдаётся: обновление упало бы сразу, а каждое
+        # такое падение писало бы предупреждение в лог. В half-open одно обновление становится пробным вызовом
+        if key in cache_fills or breaker_rejects_requests():
+            return
+        self._run_in_background(
+            cache_fills.start(key, lambda: self._fill_cache(key, query, index, fill, expire, wait=False)), [key],
+        )
 
-    async def get_data_from_cache(self, s_key: str, index: str) -> Optional[dict]:
-        data = await self.redis.get(self._format_redis_key(s_key, index))
-        if not data:
+    def _run_in_background(self, coroutine: Awaitable[Any], keys: list[str]):
+        task = asyncio.ensure_future(coroutine)
+        _background_refreshes.add(task)
+        task.add_done_callback(lambda _: self._on_refresh_done(task, keys))
+
+    @staticmethod
+    def _on_refresh_done(task: asyncio.Future, keys: list[str]):
+        _background_refreshes.discard(task)
+        if task.cancelled() or task.exception() is None:
+            return
+        _remember_failed_refreshes(keys)
+        if isinstance(task.exception(), elasticsearch.exceptions.ConnectionError):
+            # Пока Elasticsearch недоступен, устаревшие записи продолжают отдаваться; трейсбек на каждую не нужен
+            logger.warning('Background cache refresh failed: %s', task.exception())
+        else:
+            logger.warning('Background cache refresh failed', exc_info=task.exception())
+
+    async def _fill_cache(self, key: str, query: Any, index: str, fill: Callable[[], Awaitable[Any]], expire: int,
+                          wait: bool = True):
+        token = None
+        if settings.CACHE_LOCK_ENABLED:
+            token = await self._acquire_lock(key)
+            if token is None:
+                if not wait:
+                    return None
+                data = await self._wait_for_fill(query, index)
+                if data:
+                    return data
+        try:
+            started = time.monotonic()
+            data = await fill()
+            if data:
+                metrics.CACHE_FILLS.inc(index)
+                await self.put_data_to_cache(data, query, index, expire, delta=time.monotonic() - started,
+                                             tags=extract_entity_ids(data))
+            return data
+        finally:
+            if token is not None:
+                await self.redis.eval(RELEASE_LOCK_SCRIPT, keys=[self._lock_key(key)], args=[token])
+
+    async def _acquire_lock(self, key: str) -> Optional[str]:
+        token = uuid.uuid4().hex
+        acquired = await self.redis.set(self._lock_key(key), token, pexpire=settings.CACHE_LOCK_LEASE_IN_MS,
+                                        exist=Redis.SET_IF_NOT_EXIST)
+        return token if acquired else None
+
+    async def _wait_for_fill(self, query: Any, index: str) -> Optional[Any]:
+        # Ждём, пока другой воркер заполнит кеш, но не дольше срока аренды блокировки
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + settings.CACHE_LOCK_LEASE_IN_MS / 1000
+        while loop.time() < deadline:
+            await asyncio.sleep(settings.CACHE_LOCK_POLL_INTERVAL_IN_MS / 1000)
+            data = await self.get_data_from_cache(query, index)
+            if data:
+                return data
+        return None
+
+    async def get_or_fill_many(self, queries: list[Any], index: str,
+                               fill_many: Callable[[list[Any]], Awaitable[list[Any]]], expire: int = 20,
+                               key_builder: KeyBuilder = make_cache_key) -> list[Any]:
+        # Пакетный вариант get_or_fill: один MGET на все ключи и один вызов fill_many на все промахи
+        keys = [key_builder(query, index) for query in queries]
+        entries = await self._get_entries(keys)
+        results = [entry['data'] if entry is not None else None for entry in entries]
+        missing = [query for query, entry in zip(queries, entries) if entry is None]
+        stale = [query for query, entry in zip(queries, entries) if entry is not None and self._should_refresh(entry)]
+        metrics.CACHE_REQUESTS.inc(index, 'hit', amount=len(queries) - len(missing) - len(stale))
+        metrics.CACHE_REQUESTS.inc(index, 'stale', amount=len(stale))
+        metrics.CACHE_REQUESTS.inc(index, 'miss', amount=len(missing))
+        now = time.time()
+        if any(entry is not None and now >= entry['soft'] and refresh_unavailable(key)
+               for key, entry in zip(keys, entries)):
+            mark_stale()
+        if missing:
+            # Дедупликация по ключам: пересекающиеся пакеты и одиночные get_or_fill заполняют общий ключ один раз
+            missing_queries = {key: query for key, query, entry in zip(keys, queries, entries) if entry is None}
+            filled = await cache_fills.do_many(list(missing_queries), lambda fill_keys: self._fill_cache_many(
+                [missing_queries[key] for key in fill_keys], index, fill_many, expire, key_builder,
+            ))
+            filled = dict(zip(missing_queries, filled))
+            results = [data if entry is not None else filled[key] for key, data, entry in zip(keys, results, entries)]
+        if stale and not breaker_rejects_requests():
+            # Как в _schedule_refresh: ключи, которые уже обновляются, повторно не обновляем
+            stale = [query for query in stale if key_builder(query, index) not in cache_fills]
+            if stale:
+                stale_keys = [key_builder(query, index) for query in stale]
+                self._run_in_background(cache_fills.start_many(
+                    stale_keys,
+                    lambda: self._fill_cache_many(stale, index, fill_many, expire, key_builder, wait=False),
+                ), stale_keys)
+        return results
+
+    async def _fill_cache_many(self, queries: list[Any], index: str,
+                               fill_many: Callable[[list[Any]], Awaitable[list[Any]]], expire: int,
+                               key_builder: KeyBuilder = make_cache_key, wait: bool = True) -> list[Any]:
+        results: list[Any] = [None] * len(queries)
+        keys = [key_builder(query, index) for query in queries]
+        tokens = {}
+        if settings.CACHE_LOCK_ENABLED:
+            tokens = await self._acquire_locks(keys)
+            # Ключи, которые заполняет другой воркер: при фоновом обновлении пропускаем, иначе ждём их
+            busy = [position for position, key in enumerate(keys) if key not in tokens]
+            if busy and wait:
+                waited = await self._wait_for_fill_many([queries[position] for position in busy], index, key_builder)
+                for position, data in zip(busy, waited):
+                    results[position] = data
+            # Не дождались (или обновление фоновое) - ключ без блокировки заполняется, только если его ждут
+            busy = {position for position in busy if results[position] or not wait}
+        else:
+            busy = set()
+        own = [position for position in range(len(queries)) if position not in busy]
+        try:
+            if own:
+                started = time.monotonic()
+                filled = await fill_many([queries[position] for position in own])
+                delta = time.monotonic() - started
+                metrics.CACHE_FILLS.inc(index, amount=sum(1 for data in filled if data))
+                await self.put_many_to_cache(
+                    [(queries[position], data, extract_entity_ids(data))
+                     for position, data in zip(own, filled) if data],
+                    index, expire, delta=delta, key_builder=key_builder,
+                )
+                for position, data in zip(own, filled):
+                    results[position] = data
+        finally:
+            if tokens:
+                await asyncio.gather(*(
+                    self.redis.eval(RELEASE_LOCK_SCRIPT, keys=[self._lock_key(key)], args=[token])
+                    for key, token in tokens.items()
+                ))
+        return results
+
+    async def _acquire_locks(self, keys: list[str]) -> dict[str, str]:
+        token = uuid.uuid4().hex
+        pipeline = self.redis.pipeline()
+        for key in keys:
+            pipeline.set(self._lock_key(key), token, pexpire=settings.CACHE_LOCK_LEASE_IN_MS,
+                         exist=Redis.SET_IF_NOT_EXIST)
+        acquired = await pipeline.execute()
+        return {key: token for key, ok in zip(keys, acquired) if ok}
+
+    async def _wait_for_fill_many(self, queries: list[Any], index: str, key_builder: KeyBuilder) -> list[Any]:
+        # Пакетный вариант _wait_for_fill: ждём чужого заполнения не дольше срока аренды блокировки
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + settings.CACHE_LOCK_LEASE_IN_MS / 1000
+        results = [None] * len(queries)
+        while loop.time() < deadline:
+            await asyncio.sleep(settings.CACHE_LOCK_POLL_INTERVAL_IN_MS / 1000)
+            results = await self.get_many_from_cache(queries, index, key_builder=key_builder)
+            if all(results):
+                break
+        return results
+
+    async def put_data_to_cache(self, data: dict, query: Any, index: str, expire: int = 20, delta: float = 0,
+                                tags: Iterable[str] = ()):
+        await self.put_many_to_cache([(query, data, tags)], index, expire, delta)
+
+    async def put_many_to_cache(self, items: list[tuple[Any, Any, Iterable[str]]], index: str, expire: int = 20,
+                                delta: float = 0, key_builder: KeyBuilder = make_cache_key):
+        # expire - мягкий TTL, после него запись ещё CACHE_STALE_TTL_IN_SECONDS живёт в Redis как устаревшая
+        if not items:
+            return
+        hard_expire = expire + settings.CACHE_STALE_TTL_IN_SECONDS
+        pipeline = self.redis.pipeline()
+        for query, data, tags in items:
+            key = key_builder(query, index)
+            _failed_refreshes.pop(key, None)
+            entry = {'data': data, 'soft': time.time() + expire, 'delta': delta}
+            with metrics.timer(metrics.CACHE_CODEC_DURATION, 'codec', 'dumps'):
+                raw_entry = cache_codec.dumps(entry)
+            metrics.CACHE_ENTRY_SIZE.observe(len(raw_entry), index, 'write')
+            pipeline.set(key, raw_entry, expire=hard_expire)
+            # Тег сущности -> ключи записей, в которых она встречается. Нужен для точечной инвалидации
+            for tag in tags:
+                pipeline.sadd(make_tag_key(tag), key)
+                pipeline.expire(make_tag_key(tag), hard_expire)
+            if self.local_cache is not None:
+                self.local_cache.set(key, entry, len(raw_entry), ttl=hard_expire)
+        with metrics.timer(metrics.REDIS_COMMAND_DURATION, 'redis', 'set'):
+            await pipeline.execute()
+
+    async def get_data_from_cache(self, query: Any, index: str) -> Optional[dict]:
+        entry = await self._get_entry(make_cache_key(query, index))
+        if entry is None:
+            return None
+        return entry['data']
+
+    async def get_many_from_cache(self, queries: list[Any], index: str,
+                                  key_builder: KeyBuilder = make_cache_key) -> list[Optional[Any]]:
+        entries = await self._get_entries([key_builder(query, index) for query in queries])
+        return [entry['data'] if entry is not None else None for entry in entries]
+
+    async def _get_entry(self, key: str) -> Optional[dict]:
+        entries = await self._get_entries([key])
+        return entries[0]
+
+    async def _get_entries(self, keys: list[str]) -> list[Optional[dict]]:
+        if not keys:
+            return []
+        if self.local_cache is None:
+            with metrics.timer(metrics.REDIS_COMMAND_DURATION, 'redis', 'mget'):
+                raw_entries = await self.redis.mget(*keys)
+            return [self._load_entry(key, raw_entry) if raw_entry else None
+                    for key, raw_entry in zip(keys, raw_entries)]
+
+        entries = [self.local_cache.get(key) for key in keys]
+        missing = [key for key, entry in zip(keys, entries) if entry is None]
+        if not missing:
+            return entries
+        # Забираем значения вместе с оставшимся TTL за один запрос, чтобы локальные записи не пережили Redis
+        pipeline = self.redis.pipeline()
+        pipeline.mget(*missing)
+        for key in missing:
+            pipeline.pttl(key)
+        with metrics.timer(metrics.REDIS_COMMAND_DURATION, 'redis', 'mget'):
+            raw_entries, *ttls_ms = await pipeline.execute()
+        loaded = {}
+        for key, raw_entry, ttl_ms in zip(missing, raw_entries, ttls_ms):
+            if not raw_entry:
+                continue
+            loaded[key] = self._load_entry(key, raw_entry)
+            if loaded[key] is not None and ttl_ms > 0:
+                self.local_cache.set(key, loaded[key], len(raw_entry), ttl=ttl_ms / 1000)
+        return [entry if entry is not None else loaded.get(key) for key, entry in zip(keys, entries)]
+
+    @staticmethod
+    def _load_entry(key: str, raw_entry: bytes) -> Optional[dict]:
+        # Индекс - первая часть ключа, см. cache_keys
+        metrics.CACHE_ENTRY_SIZE.observe(len(raw_entry), key.partition('::')[0], 'read')
+        try:
+            with metrics.timer(metrics.CACHE_CODEC_DURATION, 'codec', 'loads'):
+                return cache_codec.loads(raw_entry)
+        except CachePayloadError:
+            # Повреждённая запись - промах: её перезапишет следующее заполнение
+            logger.warning('Cache entry %s is corrupt, treating it as a miss', key, exc_info=True)
             return None
-        data = json.loads(data)
-        return data
 
-    def _format_redis_key(self, s_key: str, index: str) -> str:
-        hash_key = hashlib.md5(s_key.encode()).hexdigest()
-        return f'{index}::{hash_key}'
+    async def invalidate_entities(self, entity_ids: Iterable[str]) -> int:
+        tag_keys = [make_tag_key(str(entity_id)) for entity_id in entity_ids]
+        if not tag_keys:
+            return 0
+        keys = await self.redis.sunion(*tag_keys)
+        await self.redis.delete(*tag_keys, *keys)
+        self._forget_locally(keys)
+        await self.redis.publish(settings.CACHE_INVALIDATION_CHANNEL, 'entities')
+        return len(keys)
+
+    async def invalidate_index(self, index: str) -> int:
+        deleted = 0
+        async for key in self.redis.iscan(match=f'{index}::*', count=500):
+            await self.redis.delete(key)
+            self._forget_locally([key])
+            deleted += 1
+        await self.redis.publish(settings.CACHE_INVALIDATION_CHANNEL, index)
+        return deleted
+
+    def _forget_locally(self, keys: Iterable[bytes]):
+        # Локальный кеш чистится только в текущем процессе, в остальных воркерах записи доживут свой короткий TTL
+        if self.local_cache is None:
+            return
+        for key in keys:
+            self.local_cache.delete(key.decode() if isinstance(key, bytes) else key)
+
+    @staticmethod
+    def _lock_key(key: str) -> str:
+        return f'lock::{key}'
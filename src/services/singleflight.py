@@ -0,0 +1,77 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class SingleFlight:
+    """Дедупликация одновременных вызовов с одинаковым ключом в пределах воркера.
+
+    Первый вызов запускает корутину отдельной задачей, остальные ждут её результат.
+    Отмена одного из ожидающих не отменяет саму задачу.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        return await asyncio.shield(self.start(key, func))
+
+    def start(self, key: str, func: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        # Ключ занимается сразу, а не при первом шаге задачи, поэтому проверка `key in` после вызова уже его видит
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        return task
+
+    def start_many(self, keys: list[str], func: Callable[[], Awaitable[list[Any]]]) -> asyncio.Future:
+        """Один вызов func на набор ключей, func возвращает по результату на ключ.
+
+        Пока вызов идёт, каждый ключ занят отдельно: do(key) с тем же ключом дождётся своего элемента результата.
+        """
+        batch = asyncio.ensure_future(func())
+        loop = asyncio.get_event_loop()
+        futures = []
+        for key in keys:
+            future = loop.create_future()
+            self._calls[key] = future
+            futures.append((key, future))
+
+        def resolve(_):
+            for position, (key, future) in enumerate(futures):
+                self._forget(key, future)
+                if batch.cancelled():
+                    future.cancel()
+                elif batch.exception() is not None:
+                    future.set_exception(batch.exception())
+                    # Ошибку получит владелец batch, ожидающие по отдельным ключам могут и не появиться
+                    future.exception()
+                else:
+                    future.set_result(batch.result()[position])
+
+        batch.add_done_callback(resolve)
+        return batch
+
+    async def do_many(self, keys: list[str], func: Callable[[list[str]], Awaitable[list[Any]]]) -> list[Any]:
+        """Пакетный do: результаты по ключам в том же порядке.
+
+        Ключи, которые уже заполняются (одиночным вызовом или другим пакетом), ждут свой вызов, остальные
+        заполняются одним вызовом func(новые ключи).
+        """
+        unique_keys = list(dict.fromkeys(keys))
+        new_keys = [key for key in unique_keys if key not in self._calls]
+        if new_keys:
+            self.start_many(new_keys, lambda: func(new_keys))
+        futures = [self._calls[key] for key in unique_keys]
+        results = dict(zip(unique_keys, await asyncio.shield(asyncio.gather(*futures))))
+        return [results[key] for key in keys]
+
+    def _forget(self, key: str, future: asyncio.Future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._calls
+
+
+cache_fills = SingleFlight()
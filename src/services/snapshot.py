@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from elasticsearch import AsyncElasticsearch
+
+from src.core.config import settings
+from src.db.snapshot import CatalogueSnapshot, write_snapshot
+from src.services.helpers import scan_documents
+
+logger = logging.getLogger(__name__)
+
+# Файл в каталоге снимков с именем текущего снимка; подменяется через os.replace
+CURRENT_POINTER = 'CURRENT'
+SNAPSHOT_PREFIX = 'snapshot-'
+
+snapshot: Optional[CatalogueSnapshot] = None
+
+
+def read_current_name(directory: Path) -> Optional[str]:
+    try:
+        return (directory / CURRENT_POINTER).read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+async def refresh_snapshot() -> Optional[CatalogueSnapshot]:
+    """Подхватывает новый снимок, если экспорт обновил указатель.
+
+    Ссылка подменяется целиком, как у каталога жанров.
+    """
+    global snapshot
+    directory = Path(settings.SNAPSHOT_DIR)
+    name = read_current_name(directory)
+    if name is None or (snapshot is not None and snapshot.name == name):
+        return snapshot
+    snapshot = CatalogueSnapshot(directory / name)
+    logger.info('Catalogue snapshot %s loaded: %s films, %s persons, %s genres',
+                name, len(snapshot.movies), len(snapshot.persons), len(snapshot.genres))
+    return snapshot
+
+
+async def export_snapshot(elastic: AsyncElasticsearch, directory: Path) -> Path:
+    movies = await scan_documents(elastic, 'movies')
+    persons = await scan_documents(elastic, 'person')
+    genres = await scan_documents(elastic, 'genre')
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'{SNAPSHOT_PREFIX}{time.strftime("%Y%m%d%H%M%S")}.bin'
+    await asyncio.get_event_loop().run_in_executor(None, write_snapshot, path, movies, persons, genres)
+
+    pointer = directory / f'{CURRENT_POINTER}.tmp'
+    pointer.write_text(path.name)
+    os.replace(pointer, directory / CURRENT_POINTER)
+    # Воркеры, ещё не подхватившие новый снимок, продолжают читать удалённые файлы: mmap держит их до закрытия
+    snapshots = sorted(directory.glob(f'{SNAPSHOT_PREFIX}*.bin'))
+    for old_path in snapshots[:-settings.SNAPSHOT_KEEP]:
+        old_path.unlink()
+    return path
+
+
+# Функция понадобится при внедрении зависимостей
+async def get_snapshot() -> Optional[CatalogueSnapshot]:
+    return snapshot
@@ -0,0 +1,150 @@
+import asyncio
+import bisect
+import heapq
+import logging
+from collections import Counter
+from typing import Any, Iterable, Optional
+
+from elasticsearch import AsyncElasticsearch
+
+from src.core.config import settings
+from src.db.local_cache import LocalCache
+from src.models.film import BaseFilm
+from src.models.person import PersonBase
+from src.services.helpers import get_index_marker, scan_documents
+
+logger = logging.getLogger(__name__)
+
+FILM_SUGGEST_FIELDS = ['id', 'title', 'imdb_rating', 'actors.id', 'writers.id', 'directors.id']
+PERSON_SUGGEST_FIELDS = ['id', 'full_name']
+SUGGEST_INDEXES = ['movies', 'person']
+
+
+def normalize(text: str) -> str:
+    return ' '.join(text.casefold().split())
+
+
+class PrefixIndex:
+    """Неизменяемый индекс подсказок: top-k элементов по префиксу любого слова названия.
+
+    Ключи - хвосты нормализованного названия от начала каждого слова ("star wars", "wars"), отсортированные для
+    бинарного поиска, так что "sta", "star w" и "war" находят "Star Wars". Для коротких префиксов, под которые
+    попадает большая часть индекса, top-k посчитан заранее; для длинных диапазон ключей мал и разбирается на лету.
+    """
+
+    def __init__(self, items: list[Any], titles: list[str], top_k: int, precomputed_length: int):
+        # items и titles уже упорядочены по убыванию популярности: позиция элемента - его ранг
+        self.items = tuple(items)
+        self.top_k = top_k
+        self.precomputed_length = precomputed_length
+        pairs = sorted((suffix, rank) for rank, title in enumerate(titles) for suffix in self._suffixes(title))
+        self.keys = [key for key, _ in pairs]
+        self.ranks = [rank for _, rank in pairs]
+        self.top: dict[str, list[int]] = {}
+        for rank, title in enumerate(titles):
+            for suffix in self._suffixes(title):
+                for length in range(1, min(len(suffix), precomputed_length) + 1):
+                    best = self.top.setdefault(suffix[:length], [])
+                    # Элементы идут по рангу, поэтому список заполняется лучшими и дальше не меняется
+                    if len(best) < top_k and (not best or best[-1] != rank):
+                        best.append(rank)
+
+    @staticmethod
+    def _suffixes(title: str) -> Iterable[str]:
+        words = title.split(' ')
+        return {' '.join(words[position:]) for position in range(len(words)) if words[position]}
+
+    def search(self, prefix: str, size: int) -> list[Any]:
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        size = min(size, self.top_k)
+        if len(prefix) <= self.precomputed_length:
+            return [self.items[rank] for rank in self.top.get(prefix, ())[:size]]
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + '\uffff', start)
+        ranks = heapq.nsmallest(size, set(self.ranks[start:end]))
+        return [self.items[rank] for rank in ranks]
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+
+class SuggestIndex:
+    """Снимок подсказок по фильмам и персонам. При обновлении подменяется целиком, как каталог жанров."""
+
+    def __init__(self, films: PrefixIndex, persons: PrefixIndex):
+        self.films = films
+        self.persons = persons
+        # Готовые ответы по префиксам живут вместе со снимком и не требуют инвалидации.
+        # Размер записи считаем за 1, так что кеш ограничен числом префиксов
+        self.results = LocalCache(max_entries=settings.SUGGEST_CACHE_MAX_ENTRIES,
+                                  max_bytes=settings.SUGGEST_CACHE_MAX_ENTRIES, ttl=float('inf'))
+
+    def suggest_films(self, prefix: str, size: int) -> list[BaseFilm]:
+        return self._cached('films', self.films, prefix, size)
+
+    def suggest_persons(self, prefix: str, size: int) -> list[PersonBase]:
+        return self._cached('persons', self.persons, prefix, size)
+
+    def _cached(self, kind: str, index: PrefixIndex, prefix: str, size: int) -> list:
+        key = f'{kind}:{size}:{normalize(prefix)}'
+        result = self.results.get(key)
+        if result is None:
+            result = index.search(prefix, size)
+            self.results.set(key, result, 1)
+        return result
+
+
+suggest_index: Optional[SuggestIndex] = None
+# Признак индексов, из которых построен suggest_index (см. get_index_marker)
+_suggest_marker: Optional[tuple] = None
+
+
+def _film_count_by_person(films: list[dict]) -> Counter:
+    counts = Counter()
+    for film in films:
+        person_ids = {person['id'] for role in ('actors', 'writers', 'directors') for person in film.get(role) or ()}
+        counts.update(person_ids)
+    return counts
+
+
+async def refresh_suggest_index(elastic: AsyncElasticsearch) -> SuggestIndex:
+    global suggest_index, _suggest_marker
+    # Каждый воркер строит свой индекс; полное чтение movies и person - только если индексы изменились
+    marker = await get_index_marker(elastic, SUGGEST_INDEXES)
+    if suggest_index is not None and marker == _suggest_marker:
+        return suggest_index
+    films = await scan_documents(elastic, 'movies', FILM_SUGGEST_FIELDS)
+    persons = await scan_documents(elastic, 'person', PERSON_SUGGEST_FIELDS)
+
+    # Сортировка и построение занимают сотни миллисекунд на больших индексах, не держим на это event loop
+    suggest_index = await asyncio.get_event_loop().run_in_executor(None, _build_suggest_index, films, persons)
+    _suggest_marker = marker
+    logger.info('Suggest index built: %s films, %s persons', len(suggest_index.films), len(suggest_index.persons))
+    return suggest_index
+
+
+def _build_suggest_index(films: list[dict], persons: list[dict]) -> SuggestIndex:
+    # Фильмы ранжируются по рейтингу, персоны - по числу фильмов
+    films.sort(key=lambda film: (-(film.get('imdb_rating') or 0), film['title']))
+    film_counts = _film_count_by_person(films)
+    persons.sort(key=lambda person: (-film_counts[person['id']], person['full_name']))
+
+    top_k = settings.SUGGEST_MAX_SIZE
+    length = settings.SUGGEST_PRECOMPUTED_PREFIX_LENGTH
+    return SuggestIndex(
+        films=PrefixIndex(
+            [BaseFilm.construct_trusted(film) for film in films],
+            [normalize(film['title']) for film in films], top_k, length,
+        ),
+        persons=PrefixIndex(
+            [PersonBase.construct_trusted(person) for person in persons],
+            [normalize(person['full_name']) for person in persons], top_k, length,
+        ),
+    )
+
+
+# Функция понадобится при внедрении зависимостей
+async def get_suggest_index() -> Optional[SuggestIndex]:
+    return suggest_index
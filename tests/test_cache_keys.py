@@ -0,0 +1,72 @@
+import asyncio
+
+from elasticsearch_dsl import Q, Search
+
+from benchmarks.fakes import FakeRedis
+from src.core.config import settings
+from src.db.local_cache import LocalCache
+from src.services.cache_keys import extract_entity_ids, make_cache_key, make_document_key
+from src.services.redis import RedisBaseClass
+
+FILM = {'id': 'film-1', 'title': 'A', 'genre': [{'id': 'genre-1', 'name': 'Drama'}],
+        'actors': [{'id': 'person-1', 'name': 'Keanu'}], 'writers': None, 'directors': []}
+
+
+def test_key_does_not_depend_on_dict_order():
+    assert make_cache_key({'a': 1, 'b': {'c': 2, 'd': [3]}}, 'movies') == \
+        make_cache_key({'b': {'d': [3], 'c': 2}, 'a': 1}, 'movies')
+
+
+def test_equivalent_searches_share_key():
+    first = Search(index='movies').query('match', title='star').sort('-imdb_rating')[10:20]
+    second = Search(index='movies')[10:20].sort('-imdb_rating').query(Q('match', title='star'))
+    assert make_cache_key(first.to_dict(), 'movies') == make_cache_key(second.to_dict(), 'movies')
+
+
+def test_different_queries_indexes_and_schema_versions_get_different_keys(monkeypatch):
+    query = {'query': {'match_all': {}}}
+    key = make_cache_key(query, 'movies')
+    assert key.startswith(f'movies::v{settings.CACHE_KEY_SCHEMA_VERSION}::')
+    assert make_cache_key({'query': {'match_all': {}}, 'size': 10}, 'movies') != key
+    assert make_cache_key(query, 'person') != key
+    monkeypatch.setattr(settings, 'CACHE_KEY_SCHEMA_VERSION', settings.CACHE_KEY_SCHEMA_VERSION + 1)
+    assert make_cache_key(query, 'movies') != key
+
+
+def test_entity_ids_of_hits_and_documents():
+    hits = [{'_id': 'film-1', '_source': FILM}, {'_id': 'film-2', '_source': {'id': 'film-2'}}]
+    assert extract_entity_ids(hits) == {'film-1', 'film-2', 'genre-1', 'person-1'}
+    assert extract_entity_ids(FILM) == {'film-1', 'genre-1', 'person-1'}
+
+
+def test_invalidation_by_entity_and_index():
+    redis = FakeRedis()
+    local_cache = LocalCache(max_entries=100, max_bytes=1 << 20, ttl=60)
+    cache = RedisBaseClass(redis=redis, local_cache=local_cache)
+    film_list = [{'_id': 'film-1', '_source': FILM}]
+    other_list = [{'_id': 'film-2', '_source': {'id': 'film-2'}}]
+    genres = [{'_id': 'genre-2', '_source': {'id': 'genre-2'}}]
+
+    async def cached(query, index='movies'):
+        return await cache.get_data_from_cache(query, index)
+
+    async def scenario():
+        await cache.put_data_to_cache(film_list, 'list', 'movies', 60, tags=extract_entity_ids(film_list))
+        await cache.put_data_to_cache(other_list, 'other', 'movies', 60, tags=extract_entity_ids(other_list))
+        await cache.put_data_to_cache(genres, 'genres', 'genre', 60, tags=extract_entity_ids(genres))
+        await cache.put_many_to_cache([('film-1', FILM, extract_entity_ids(FILM))], 'movies', 60,
+                                      key_builder=make_document_key)
+
+        # Персона встречается в списке и в карточке фильма - обе записи удаляются, остальные остаются
+        assert await cache.invalidate_entities(['person-1']) == 2
+        assert await cached('list') is None
+        assert await cache.get_many_from_cache(['film-1'], 'movies', key_builder=make_document_key) == [None]
+        assert local_cache.get(make_cache_key('list', 'movies')) is None
+        assert await cached('other') == other_list
+        assert await cache.invalidate_entities(['person-1']) == 0
+
+        assert await cache.invalidate_index('movies') == 1
+        assert await cached('other') is None
+        assert await cached('genres', 'genre') == genres
+
+    asyncio.run(scenario())
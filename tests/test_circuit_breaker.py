@@ -0,0 +1,86 @@
+import pytest
+
+from src.db import circuit_breaker
+from src.db.circuit_breaker import CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', clock)
+    return clock
+
+
+def open_breaker(breaker: CircuitBreaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow_request()
+        breaker.record_failure()
+
+
+def test_opens_after_threshold_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=5)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.rejects_requests()
+    assert not breaker.allow_request()
+
+
+def test_half_open_allows_single_trial(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=5)
+    open_breaker(breaker)
+    clock.now += 5
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.rejects_requests()
+    assert breaker.allow_request()
+    assert breaker.rejects_requests()
+    assert not breaker.allow_request()
+
+
+def test_trial_success_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=5)
+    open_breaker(breaker)
+    clock.now += 5
+    assert breaker.allow_request()
+    breaker.record_success()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow_request()
+
+
+def test_trial_failure_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=5)
+    open_breaker(breaker)
+    clock.now += 5
+    assert breaker.allow_request()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 5
+    assert breaker.allow_request()
+
+
+def test_released_trial_can_be_taken_again(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=5)
+    open_breaker(breaker)
+    clock.now += 5
+    assert breaker.allow_request()
+    breaker.release_trial()
+
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fakes import FakeRedis
+from src.services.cache_keys import make_cache_key
+from src.services.codecs import (
+    HEADER_SIZE, PAYLOAD_VERSION, CachePayloadCodec, CachePayloadError, NoCompressor, available_codecs,
+    available_compressors, project_hits,
+)
+from src.services.redis import RedisBaseClass
+
+ENTRY = {'data': [{'_id': 'a', '_source': {'id': 'a', 'title': 'Star Wars ' * 100}}], 'soft': 1.5, 'delta': 0.01}
+
+
+@pytest.mark.parametrize('codec', list(available_codecs()))
+@pytest.mark.parametrize('compression', list(available_compressors()))
+def test_round_trip(codec, compression):
+    payload_codec = CachePayloadCodec(codec, compression, compression_min_bytes=0)
+    payload = payload_codec.dumps(ENTRY)
+    version, codec_id, compressor_id = payload[:HEADER_SIZE]
+    assert (version, codec_id, compressor_id) == (
+        PAYLOAD_VERSION, payload_codec.codec.codec_id, payload_codec.compressor.compressor_id,
+    )
+    assert payload_codec.loads(payload) == ENTRY
+
+
+def test_small_payloads_are_not_compressed():
+    payload_codec = CachePayloadCodec('orjson', 'zlib', compression_min_bytes=64)
+    assert payload_codec.dumps({'data': []})[2] == NoCompressor.compressor_id
+    assert payload_codec.dumps(ENTRY)[2] != NoCompressor.compressor_id
+
+
+def test_payload_written_with_other_settings_is_readable():
+    # Кодек и сжатие берутся из заголовка записи, а не из текущих настроек
+    payload = CachePayloadCodec('orjson', 'zlib', compression_min_bytes=0).dumps(ENTRY)
+    assert CachePayloadCodec('orjson', 'none').loads(payload) == ENTRY
+
+
+def test_unavailable_codec_is_rejected():
+    with pytest.raises(ValueError):
+        CachePayloadCodec('pickle')
+    with pytest.raises(ValueError):
+        CachePayloadCodec('orjson', 'brotli')
+
+
+@pytest.mark.parametrize('payload', [
+    b'',
+    b'\x01\x01',
+    bytes((PAYLOAD_VERSION + 1, 1, 0)) + b'{}',
+    bytes((PAYLOAD_VERSION, 99, 0)) + b'{}',
+    bytes((PAYLOAD_VERSION, 1, 99)) + b'{}',
+    b'{"data": []}',
+])
+def test_corrupt_header_is_rejected(payload):
+    with pytest.raises(CachePayloadError):
+        CachePayloadCodec().loads(payload)
+
+
+def test_corrupt_entry_is_a_cache_miss():
+    redis = FakeRedis()
+    cache = RedisBaseClass(redis=redis, local_cache=None)
+
+    async def fill():
+        return [{'_id': 'a'}]
+
+    async def scenario():
+        key = make_cache_key('query', 'movies')
+        await redis.set(key, b'\xff\x00garbage')
+        assert await cache.get_or_fill('query', 'movies', fill, 60) == [{'_id': 'a'}]
+        assert await cache.get_data_from_cache('query', 'movies') == [{'_id': 'a'}]
+
+    asyncio.run(scenario())
+
+
+def test_project_hits_keeps_only_needed_fields():
+    hits = [{'_index': 'movies', '_type': '_doc', '_score': 1.0, '_id': 'a', 'sort': [1],
+             '_source': {'id': 'a', 'title': 'A', 'description': 'long'}}]
+    assert project_hits(hits) == [{'_id': 'a', '_source': hits[0]['_source'], 'sort': [1]}]
+    assert project_hits(hits, ['id', 'title', 'missing']) == [{'_id': 'a', '_source': {'id': 'a', 'title': 'A'},
+                                                               'sort': [1]}]
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from src.db.concurrency import ConcurrencyLimiter, ConcurrencyLimitExceeded
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def settle():
+    # Ожидание внутри acquire обёрнуто в wait_for, передача слота доходит до ожидающего за несколько итераций цикла
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_acquires_up_to_limit_without_waiting():
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=2, max_queue=1, max_wait=1)
+        await limiter.acquire()
+        await limiter.acquire()
+        assert limiter.active == 2
+        assert limiter.queued == 0
+
+    run(scenario())
+
+
+def test_rejects_when_queue_is_full():
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=1, max_queue=1, max_wait=1)
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(ConcurrencyLimitExceeded, match='queue is full'):
+            await limiter.acquire()
+        limiter.release()
+        await waiter
+
+    run(scenario())
+
+
+def test_rejects_after_max_wait():
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=1, max_queue=1, max_wait=0.01)
+        await limiter.acquire()
+        with pytest.raises(ConcurrencyLimitExceeded, match='wait timeout'):
+            await limiter.acquire()
+        assert limiter.queued == 0
+        assert limiter.active == 1
+
+    run(scenario())
+
+
+def test_release_hands_slot_to_waiters_in_order():
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=1, max_queue=2, max_wait=1)
+        await limiter.acquire()
+        order = []
+
+        async def waiter(name):
+            await limiter.acquire()
+            order.append(name)
+
+        waiters = [asyncio.ensure_future(waiter('first')), asyncio.ensure_future(waiter('second'))]
+        await asyncio.sleep(0)
+        limiter.release()
+        await settle()
+        assert order == ['first']
+        # Слот передан ожидающему, а не освобождён для новых вызовов
+        assert limiter.active == 1
+        limiter.release()
+        await asyncio.gather(*waiters)
+        assert order == ['first', 'second']
+        limiter.release()
+        assert limiter.active == 0
+
+    run(scenario())
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+    async def scenario():
+        limiter = ConcurrencyLimiter(limit=1, max_queue=1, max_wait=1)
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter.queued == 0
+        limiter.release()
+        assert limiter.active == 0
+
+    run(scenario())
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+from elasticsearch._async.transport import AsyncTransport
+
+from src.core.config import settings
+from src.db.circuit_breaker import CircuitBreaker
+from src.db.elastic import CircuitOpenError, ElasticOverloadedError, ElasticTransport
+
+
+@pytest.fixture
+def transport(monkeypatch) -> ElasticTransport:
+    monkeypatch.setattr(settings, 'ELASTIC_BREAKER_ENABLED', True)
+    monkeypatch.setattr(settings, 'ELASTIC_CONCURRENCY_LIMITS_ENABLED', True)
+    transport = ElasticTransport([{'host': 'localhost', 'port': 9200}])
+    transport.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    transport.breaker.record_failure()
+    assert transport.breaker.state == CircuitBreaker.HALF_OPEN
+    return transport
+
+
+def test_cancelled_trial_releases_breaker(transport, monkeypatch):
+    async def hang(self, *args, **kwargs):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(AsyncTransport, 'perform_request', hang)
+
+    async def scenario():
+        trial = asyncio.ensure_future(transport.perform_request('HEAD', '/'))
+        await asyncio.sleep(0)
+        assert transport.breaker.rejects_requests()
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+    asyncio.run(scenario())
+    assert transport.breaker.state == CircuitBreaker.HALF_OPEN
+    assert transport.breaker.allow_request()
+
+
+def test_limiter_rejection_does_not_take_trial(transport):
+    limiter = transport.limiters['list']
+    limiter.active = limiter.limit
+    limiter.max_queue = 0
+
+    with pytest.raises(ElasticOverloadedError):
+        asyncio.run(transport.perform_request('GET', '/movies/_search', body={'query': {'match_all': {}}}))
+    assert not transport.breaker.rejects_requests()
+
+
+def test_trial_in_flight_rejects_other_requests(transport):
+    transport.breaker.allow_request()
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(transport.perform_request('GET', '/movies/_doc/1'))
+    assert transport.limiters['by_id'].active == 0
@@ -0,0 +1,34 @@
+import asyncio
+
+import orjson
+
+from src.api.health import readiness
+
+
+class Backend:
+    def __init__(self, available: bool):
+        self.available = available
+
+    async def ping(self) -> bool:
+        if not self.available:
+            raise ConnectionError('backend is down')
+        return True
+
+
+def ready(redis_available: bool, elastic_available: bool) -> tuple[int, dict]:
+    response = asyncio.run(readiness(redis=Backend(redis_available), elastic=Backend(elastic_available)))
+    return response.status_code, orjson.loads(response.body)
+
+
+def test_ready_when_all_backends_answer():
+    assert ready(True, True) == (200, {'status': 'ok', 'backends': {'redis': True, 'elasticsearch': True}})
+
+
+def test_elastic_outage_keeps_worker_ready():
+    assert ready(True, False) == (200, {'status': 'degraded', 'backends': {'redis': True, 'elasticsearch': False}})
+
+
+def test_redis_outage_fails_readiness():
+    status_code, body = ready(False, True)
+    assert status_code == 503
+    assert body['status'] == 'unavailable'
@@ -0,0 +1,78 @@
+import asyncio
+import base64
+
+import orjson
+import pytest
+from elasticsearch.exceptions import NotFoundError, TransportError
+
+from src.core.config import settings
+from src.services.genre import GenreService
+from src.services.helpers import InvalidCursorError, decode_cursor, encode_cursor, msearch_hits
+from src.services.person import PersonService
+
+SHARD_FAILURE = {'error': {'type': 'search_phase_execution_exception', 'reason': 'all shards failed'}, 'status': 503}
+
+
+def hits(*ids: str) -> dict:
+    return {'hits': {'hits': [{'_id': film_id, '_source': {'id': film_id}} for film_id in ids]}, 'status': 200}
+
+
+def test_msearch_hits_returns_hits_per_query():
+    assert msearch_hits({'responses': [hits('a'), hits()]}) == [[{'_id': 'a', '_source': {'id': 'a'}}], []]
+
+
+def test_msearch_item_error_is_raised():
+    with pytest.raises(TransportError) as error:
+        msearch_hits({'responses': [hits('a'), SHARD_FAILURE]})
+    assert error.value.status_code == 503
+    assert error.value.error == 'search_phase_execution_exception'
+    with pytest.raises(NotFoundError):
+        msearch_hits({'responses': [{'error': {'type': 'index_not_found_exception'}, 'status': 404}]})
+
+
+class Elastic:
+    def __init__(self, responses: list[dict]):
+        self.responses = responses
+
+    async def msearch(self, body):
+        return {'responses': self.responses}
+
+
+def test_person_films_fail_on_msearch_item_error(monkeypatch):
+    monkeypatch.setattr(settings, 'PERSON_FILMS_PROJECTION_ENABLED', False)
+    service = PersonService(redis=None, elastic=Elastic([hits('a'), SHARD_FAILURE]), suggest_index=None,
+                            person_films=None, snapshot=None)
+    with pytest.raises(TransportError):
+        asyncio.run(service.get_films_by_person_ids(['first', 'second']))
+
+
+def test_genre_lookup_fails_on_msearch_item_error():
+    service = GenreService(redis=None, elastic=Elastic([hits('a'), SHARD_FAILURE]), catalogue=None, snapshot=None)
+    with pytest.raises(TransportError):
+        asyncio.run(service._get_genres_from_elastic([{'query': {'match': {'name': 'drama'}}}] * 2))
+
+
+def raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(payload)).decode().rstrip('=')
+
+
+def test_cursor_round_trip():
+    assert decode_cursor('') == (None, None)
+    assert decode_cursor(encode_cursor([8.5, 'title', None])) == ([8.5, 'title', None], None)
+    assert decode_cursor(encode_cursor([1], 'pit-id')) == ([1], 'pit-id')
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64 at all!',
+    raw_cursor([1]),
+    raw_cursor({}),
+    raw_cursor({'after': 1}),
+    raw_cursor({'after': {}}),
+    raw_cursor({'after': []}),
+    raw_cursor({'after': [{'nested': 1}]}),
+    raw_cursor({'after': [[1]]}),
+    raw_cursor({'after': [1], 'pit': 5}),
+])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor)
@@ -0,0 +1,135 @@
+import asyncio
+from typing import Optional
+
+import pytest
+
+from benchmarks.fakes import FakeRedis
+from src.api.http_cache import HTTPCacheMiddleware, listen_for_invalidations, purge_response_caches
+from src.core.config import settings
+from src.services.redis import RedisBaseClass
+
+FILM_PATH = '/api/v1/film/'
+
+
+class Backend:
+    """ASGI-приложение за middleware: считает вызовы и отдаёт заданный ответ."""
+
+    def __init__(self):
+        self.calls = 0
+        self.body = b'[{"id": 1}]'
+        self.status = 200
+        self.headers = [(b'content-type', b'application/json')]
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        await send({'type': 'http.response.start', 'status': self.status, 'headers': list(self.headers)})
+        await send({'type': 'http.response.body', 'body': self.body})
+
+
+def request(middleware: HTTPCacheMiddleware, path: str = FILM_PATH, query: bytes = b'sort=-imdb_rating',
+            method: str = 'GET', if_none_match: Optional[bytes] = None) -> tuple[int, dict, bytes]:
+    headers = [(b'if-none-match', if_none_match)] if if_none_match is not None else []
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query, 'headers': headers}
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(middleware(scope, None, send))
+    start, body = messages
+    return start['status'], dict(start['headers']), body['body']
+
+
+@pytest.fixture
+def backend() -> Backend:
+    return Backend()
+
+
+@pytest.fixture
+def middleware(backend) -> HTTPCacheMiddleware:
+    return HTTPCacheMiddleware(backend)
+
+
+def test_response_gets_etag_and_cache_control(middleware, backend):
+    status, headers, body = request(middleware)
+    assert (status, body) == (200, backend.body)
+    assert headers[b'etag'].startswith(b'"') and headers[b'etag'].endswith(b'"')
+    assert headers[b'cache-control'] == f'public, max-age={settings.FILM_CACHE_EXPIRE_IN_SECONDS}'.encode()
+    assert headers[b'content-type'] == b'application/json'
+
+
+def test_repeated_request_is_served_from_store(middleware, backend):
+    first = request(middleware)
+    assert request(middleware) == first
+    assert backend.calls == 1
+    # Порядок параметров не важен
+    request(middleware, query=b'page%5Bsize%5D=50&sort=-imdb_rating')
+    request(middleware, query=b'sort=-imdb_rating&page%5Bsize%5D=50')
+    assert backend.calls == 2
+
+
+def test_matching_if_none_match_gets_304(middleware, backend):
+    _, headers, _ = request(middleware)
+    status, not_modified_headers, body = request(middleware, if_none_match=b'"other", ' + headers[b'etag'])
+    assert (status, body) == (304, b'')
+    assert not_modified_headers == {b'etag': headers[b'etag'], b'cache-control': headers[b'cache-control']}
+    assert backend.calls == 1
+
+    status, _, body = request(middleware, if_none_match=b'"other"')
+    assert (status, body) == (200, backend.body)
+
+
+def test_304_after_body_expired_does_not_reach_backend(monkeypatch, backend):
+    monkeypatch.setattr(settings, 'HTTP_CACHE_STORE_EXPIRE_IN_SECONDS', 0)
+    middleware = HTTPCacheMiddleware(backend)
+    _, headers, _ = request(middleware)
+    status, not_modified_headers, _ = request(middleware, if_none_match=headers[b'etag'])
+    assert status == 304
+    assert not_modified_headers[b'etag'] == headers[b'etag']
+    max_age = int(not_modified_headers[b'cache-control'].decode().rpartition('=')[2])
+    assert 0 < max_age <= settings.FILM_CACHE_EXPIRE_IN_SECONDS
+    assert backend.calls == 1
+    # Без If-None-Match тело собирается заново
+    assert request(middleware)[0] == 200
+    assert backend.calls == 2
+
+
+def test_stale_and_error_responses_are_not_cached(middleware, backend):
+    _, headers, _ = request(middleware)
+    purge_response_caches()
+    backend.headers.append((b'x-cache-status', b'stale'))
+    status, stale_headers, _ = request(middleware)
+    assert status == 200
+    assert stale_headers[b'cache-control'] == b'no-cache'
+    assert b'etag' not in stale_headers
+    assert request(middleware, if_none_match=headers[b'etag'])[0] == 200
+
+    backend.headers.pop()
+    backend.status = 404
+    assert request(middleware)[0] == 404
+    assert request(middleware)[0] == 404
+    assert backend.calls == 5
+
+
+def test_other_requests_pass_through(middleware, backend):
+    for path, method in (('/health/ready', 'GET'), (FILM_PATH, 'POST')):
+        _, headers, _ = request(middleware, path=path, method=method)
+        assert b'etag' not in headers and b'cache-control' not in headers
+    assert backend.calls == 2
+
+
+def test_invalidation_purges_worker_cache(middleware, backend):
+    async def scenario():
+        redis = FakeRedis()
+        listener = asyncio.ensure_future(listen_for_invalidations(redis))
+        await asyncio.sleep(0)
+        await RedisBaseClass(redis=redis, local_cache=None).invalidate_index('movies')
+        await asyncio.sleep(0)
+        redis.close()
+        await listener
+
+    _, headers, _ = request(middleware)
+    backend.body = b'[{"id": 2}]'
+    asyncio.run(scenario())
+    assert request(middleware, if_none_match=headers[b'etag'])[::2] == (200, backend.body)
+    assert backend.calls == 2
@@ -0,0 +1,44 @@
+from uuid import uuid4
+
+import orjson
+import pytest
+
+from src.models.film import FullFilm
+from src.models.genre import GenreFacet
+from src.models.person import Person
+
+PERSON = {'id': str(uuid4()), 'name': 'Keanu Reeves'}
+FILM = {
+    'id': str(uuid4()), 'title': 'The Matrix', 'imdb_rating': 8.7, 'description': 'Neo',
+    'genre': [{'id': str(uuid4()), 'name': 'Sci-Fi'}], 'actors': [PERSON], 'writers': [PERSON], 'directors': None,
+}
+
+
+def same_as_validated(model, data: dict):
+    trusted, validated = model.construct_trusted(data), model.parse_obj(data)
+    assert orjson.loads(trusted.json(by_alias=True)) == orjson.loads(validated.json(by_alias=True))
+    assert orjson.loads(trusted.json()) == orjson.loads(validated.json())
+    assert trusted.__fields_set__ == validated.__fields_set__
+    return trusted
+
+
+@pytest.mark.parametrize('data', [
+    FILM,
+    {key: value for key, value in FILM.items() if key not in ('description', 'writers', 'directors')},
+], ids=['full', 'defaults'])
+def test_film_serialises_like_validated(data):
+    same_as_validated(FullFilm, data)
+
+
+def test_aliases_and_nested_models():
+    person = same_as_validated(Person, {'uuid': str(uuid4()), 'full_name': 'Carrie', 'role': ['actor'],
+                                        'film_ids': [FILM['id']]})
+    assert person.name == 'Carrie'
+    same_as_validated(GenreFacet, {'id': str(uuid4()), 'count': 3, 'name': None})
+
+
+def test_default_factory_is_not_shared():
+    data = {key: value for key, value in FILM.items() if key != 'writers'}
+    first, second = FullFilm.construct_trusted(data), FullFilm.construct_trusted(data)
+    first.writers.append(PERSON)
+    assert second.writers == []
@@ -0,0 +1,124 @@
+import asyncio
+from collections import defaultdict
+
+import pytest
+
+from benchmarks.fakes import Dataset, FakeElasticsearch, FakeRedis
+from src.services.cache_keys import make_film_persons_key, make_person_films_key
+from src.services.person_films import FILM_CARD_FIELDS, PERSON_ROLES, PersonFilmsProjection
+
+
+def expected_films(dataset: Dataset) -> dict[str, list[dict]]:
+    films = defaultdict(list)
+    for film in dataset.films:
+        for person_id in {person['id'] for role in PERSON_ROLES for person in film[role]}:
+            films[person_id].append({field: film[field] for field in FILM_CARD_FIELDS})
+    return {
+        person['id']: sorted(films[person['id']], key=lambda film: (-film['imdb_rating'], film['title']))
+        for person in dataset.persons
+    }
+
+
+def person_ids(film: dict) -> set[str]:
+    return {person['id'] for role in PERSON_ROLES for person in film[role]}
+
+
+@pytest.fixture
+def dataset() -> Dataset:
+    return Dataset(films=30, persons=40)
+
+
+def changed(elastic: FakeElasticsearch):
+    # Движок поиска строится по данным один раз, после правки набора его нужно сбросить
+    elastic._engines.clear()
+
+
+def test_rebuild_matches_dataset(dataset):
+    projection = PersonFilmsProjection(redis=FakeRedis())
+    person_ids_ = [person['id'] for person in dataset.persons]
+
+    async def scenario():
+        assert await projection.get_films(person_ids_) is None
+        assert await projection.rebuild(FakeElasticsearch(dataset)) == 30
+        return await projection.get_films(person_ids_)
+
+    assert asyncio.run(scenario()) == expected_films(dataset)
+
+
+def test_rebuild_drops_films_missing_from_index(dataset):
+    redis = FakeRedis()
+    projection = PersonFilmsProjection(redis=redis)
+    elastic = FakeElasticsearch(dataset)
+    removed = dataset.films[0]
+
+    async def scenario():
+        await projection.rebuild(elastic)
+        dataset.films.remove(removed)
+        changed(elastic)
+        await projection.rebuild(elastic)
+        return await projection.get_films([person['id'] for person in dataset.persons])
+
+    assert asyncio.run(scenario()) == expected_films(dataset)
+    assert not redis._exists(make_film_persons_key(removed['id']))
+
+
+def test_refresh_moves_film_between_persons(dataset):
+    projection = PersonFilmsProjection(redis=FakeRedis())
+    elastic = FakeElasticsearch(dataset)
+    film = dataset.films[0]
+    old_person, kept_person = film['actors'][0], film['actors'][1]
+    new_person = next(person for person in dataset.persons if person['id'] not in person_ids(film))
+
+    async def scenario():
+        await projection.rebuild(elastic)
+        film['actors'] = [{'id': new_person['id'], 'name': new_person['full_name']}, *film['actors'][1:]]
+        film['title'] = 'Renamed'
+        changed(elastic)
+        assert await projection.refresh_films(elastic, [film['id']]) == (1, 0)
+        return await projection.get_films([old_person['id'], kept_person['id'], new_person['id']])
+
+    films = asyncio.run(scenario())
+    assert film['id'] not in {card['id'] for card in films[old_person['id']]}
+    for person_id in (kept_person['id'], new_person['id']):
+        assert {'id': film['id'], 'title': 'Renamed', 'imdb_rating': film['imdb_rating']} in films[person_id]
+    assert films == {person_id: expected_films(dataset)[person_id] for person_id in films}
+
+
+def test_refresh_removes_deleted_film(dataset):
+    redis = FakeRedis()
+    projection = PersonFilmsProjection(redis=redis)
+    elastic = FakeElasticsearch(dataset)
+    film = dataset.films[0]
+
+    async def scenario():
+        await projection.rebuild(elastic)
+        dataset.films.remove(film)
+        changed(elastic)
+        assert await projection.refresh_films(elastic, [film['id'], dataset.films[0]['id']]) == (1, 1)
+        return await projection.get_films(list(person_ids(film)))
+
+    films = asyncio.run(scenario())
+    assert all(film['id'] not in {card['id'] for card in cards} for cards in films.values())
+    assert not redis._exists(make_film_persons_key(film['id']))
+
+
+def test_concurrent_updates_of_one_film_stay_consistent(dataset):
+    # С задержкой Redis обновления чередуются: при отдельных чтении и записи фильм остался бы у персоны
+    # одной из версий, хотя в итоговой его уже нет
+    redis = FakeRedis(latency_ms=1)
+    projection = PersonFilmsProjection(redis=redis)
+    film = dataset.films[0]
+    first, second, third = (person['id'] for person in dataset.persons[:3])
+
+    def version(person_id: str) -> dict:
+        return {**film, 'actors': [{'id': person_id}], 'writers': [], 'directors': []}
+
+    async def scenario():
+        await projection.update_films([version(first)])
+        await asyncio.gather(projection.update_films([version(second)]), projection.update_films([version(third)]))
+
+    asyncio.run(scenario())
+    holders = [person_id for person_id in (first, second, third)
+               if redis._hget(make_person_films_key(person_id), film['id']) is not None]
+    assert holders == [third]
+    assert redis._smembers(make_film_persons_key(film['id'])) == [third.encode()]
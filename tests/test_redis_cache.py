@@ -0,0 +1,122 @@
+import asyncio
+from typing import Any
+
+import pytest
+
+from benchmarks.fakes import FakeRedis
+from src.core.config import settings
+from src.services.cache_keys import make_document_key
+from src.services import redis as redis_service
+from src.services.redis import Freshness, RedisBaseClass, _background_refreshes, current_freshness
+
+
+@pytest.fixture(params=[False, True], ids=['no-lock', 'lock'])
+def cache(request, monkeypatch) -> RedisBaseClass:
+    monkeypatch.setattr(settings, 'CACHE_LOCK_ENABLED', request.param)
+    return RedisBaseClass(redis=FakeRedis(), local_cache=None)
+
+
+class Documents:
+    def __init__(self):
+        self.calls = []
+
+    async def fill_many(self, ids: list[str]) -> list[dict]:
+        self.calls.append(list(ids))
+        await asyncio.sleep(0.01)
+        return [{'id': document_id} for document_id in ids]
+
+    def filled(self) -> list[str]:
+        return sorted(document_id for call in self.calls for document_id in call)
+
+
+def test_overlapping_batches_fill_shared_keys_once(cache):
+    documents = Documents()
+
+    async def scenario():
+        return await asyncio.gather(
+            cache.get_or_fill_many(['a', 'b', 'c'], 'movies', documents.fill_many, 60, make_document_key),
+            cache.get_or_fill_many(['b', 'c', 'd'], 'movies', documents.fill_many, 60, make_document_key),
+            cache.get_or_fill_many(['c', 'c'], 'movies', documents.fill_many, 60, make_document_key),
+        )
+
+    first, second, third = asyncio.run(scenario())
+    assert [film['id'] for film in first] == ['a', 'b', 'c']
+    assert [film['id'] for film in second] == ['b', 'c', 'd']
+    assert [film['id'] for film in third] == ['c', 'c']
+    assert documents.filled() == ['a', 'b', 'c', 'd']
+
+
+def test_batch_joins_single_key_fill(cache):
+    documents = Documents()
+
+    async def fill_one():
+        return (await documents.fill_many(['a']))[0]
+
+    async def scenario():
+        return await asyncio.gather(
+            cache.get_or_fill('a', 'movies', fill_one, 60),
+            cache.get_or_fill_many(['a', 'b'], 'movies', documents.fill_many, 60),
+        )
+
+    single, batch = asyncio.run(scenario())
+    assert single == {'id': 'a'}
+    assert batch == [{'id': 'a'}, {'id': 'b'}]
+    assert documents.filled() == ['a', 'b']
+    assert documents.calls == [['a'], ['b']]
+
+
+def test_failed_batch_fill_reaches_every_waiter(cache):
+    async def fail(ids):
+        await asyncio.sleep(0.01)
+        raise ConnectionError('backend is down')
+
+    async def scenario():
+        return await asyncio.gather(
+            cache.get_or_fill_many(['a', 'b'], 'movies', fail, 60),
+            cache.get_or_fill_many(['b'], 'movies', fail, 60),
+            return_exceptions=True,
+        )
+
+    assert all(isinstance(result, ConnectionError) for result in asyncio.run(scenario()))
+
+
+async def read_marked(cache: RedisBaseClass, fill) -> tuple[Any, bool]:
+    freshness = Freshness()
+    token = current_freshness.set(freshness)
+    try:
+        data = await cache.get_or_fill('query', 'movies', fill, 60)
+    finally:
+        current_freshness.reset(token)
+    await asyncio.gather(*list(_background_refreshes), return_exceptions=True)
+    await asyncio.sleep(0)
+    return data, freshness.stale
+
+
+def test_stale_marker_only_when_refresh_cannot_run(cache, monkeypatch):
+    backend = {'up': True}
+
+    async def fill():
+        if not backend['up']:
+            raise ConnectionError('backend is down')
+        return {'id': 'a'}
+
+    async def scenario():
+        await cache.put_data_to_cache({'id': 'old'}, 'query', 'movies', expire=0)
+        # Обычное обновление в фоне: отдаём старое без пометки
+        assert await read_marked(cache, fill) == ({'id': 'old'}, False)
+        assert await read_marked(cache, fill) == ({'id': 'a'}, False)
+
+        await cache.put_data_to_cache({'id': 'old'}, 'query', 'movies', expire=0)
+        backend['up'] = False
+        assert await read_marked(cache, fill) == ({'id': 'old'}, False)
+        # Обновление упало - следующие ответы из этой записи помечены, пока запись не заполнится заново
+        assert await read_marked(cache, fill) == ({'id': 'old'}, True)
+        backend['up'] = True
+        assert await read_marked(cache, fill) == ({'id': 'old'}, True)
+        assert await read_marked(cache, fill) == ({'id': 'a'}, False)
+
+        await cache.put_data_to_cache({'id': 'old'}, 'query', 'movies', expire=0)
+        monkeypatch.setattr(redis_service, 'breaker_rejects_requests', lambda: True)
+        assert await read_marked(cache, fill) == ({'id': 'old'}, True)
+
+    asyncio.run(scenario())
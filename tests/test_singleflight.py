@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from src.services.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def fill():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return 'value'
+
+        results = await asyncio.gather(*(flight.do('key', fill) for _ in range(10)))
+        assert results == ['value'] * 10
+        assert calls == 1
+        assert 'key' not in flight
+
+    asyncio.run(scenario())
+
+
+def test_key_is_taken_as_soon_as_started():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fill():
+            return 1
+
+        task = flight.start('key', fill)
+        assert 'key' in flight
+        await task
+
+    asyncio.run(scenario())
+
+
+def test_start_many_resolves_each_key_separately():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fill_many():
+            await asyncio.sleep(0.01)
+            return ['a-value', 'b-value']
+
+        async def unexpected():
+            raise AssertionError('key is already in flight')
+
+        batch = flight.start_many(['a', 'b'], fill_many)
+        assert 'a' in flight and 'b' in flight
+        assert await flight.do('b', unexpected) == 'b-value'
+        assert await batch == ['a-value', 'b-value']
+        assert 'a' not in flight and 'b' not in flight
+
+    asyncio.run(scenario())
+
+
+def test_start_many_propagates_errors_to_key_waiters():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fill_many():
+            raise ValueError('backend failed')
+
+        batch = flight.start_many(['a'], fill_many)
+        with pytest.raises(ValueError):
+            await flight.do('a', fill_many)
+        with pytest.raises(ValueError):
+            await batch
+
+    asyncio.run(scenario())
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from uuid import UUID, uuid4
+
+import pytest
+
+from src.core.config import settings
+from src.db.snapshot import FILM_CARD_FIELDS, CatalogueSnapshot, write_snapshot
+from src.services import snapshot as snapshot_service
+
+DRAMA, COMEDY, WESTERN = (str(uuid4()) for _ in range(3))
+KEANU, CARRIE, NOBODY = (str(uuid4()) for _ in range(3))
+ALPHA, BETA, GAMMA, DELTA = (str(uuid4()) for _ in range(4))
+
+
+def person(person_id: str) -> dict:
+    return {'id': person_id, 'name': person_id[:8]}
+
+
+def genre(genre_id: str) -> dict:
+    return {'id': genre_id, 'name': genre_id[:8]}
+
+
+GENRES = [genre(DRAMA), genre(COMEDY), genre(WESTERN)]
+PERSONS = [{'id': person_id, 'full_name': person_id[:8]} for person_id in (KEANU, CARRIE, NOBODY)]
+MOVIES = [
+    {'id': ALPHA, 'title': 'Alpha', 'imdb_rating': 8.0, 'description': 'first', 'genre': [genre(DRAMA)],
+     'actors': [person(KEANU)], 'writers': [], 'directors': []},
+    {'id': BETA, 'title': 'Beta', 'imdb_rating': 6.5, 'description': None, 'genre': [genre(DRAMA), genre(COMEDY)],
+     'actors': [], 'writers': [person(KEANU)], 'directors': [person(CARRIE)]},
+    {'id': GAMMA, 'title': 'Gamma', 'imdb_rating': 9.1, 'description': None, 'genre': [genre(COMEDY)],
+     'actors': [person(CARRIE)], 'writers': [], 'directors': [person(CARRIE)]},
+    {'id': DELTA, 'title': 'Delta', 'imdb_rating': 7.0, 'description': None, 'genre': [genre(DRAMA)],
+     'actors': [], 'writers': [], 'directors': []},
+]
+
+
+def ids(documents: list[dict]) -> list[str]:
+    return [document['id'] for document in documents]
+
+
+@pytest.fixture
+def snapshot(tmp_path) -> CatalogueSnapshot:
+    path = tmp_path / 'snapshot.bin'
+    write_snapshot(path, MOVIES, PERSONS, GENRES)
+    return CatalogueSnapshot(path)
+
+
+def test_documents_by_id(snapshot):
+    assert snapshot.get_film(BETA) == MOVIES[1]
+    assert snapshot.get_film(UUID(GAMMA)) == MOVIES[2]
+    assert snapshot.get_person(CARRIE) == PERSONS[1]
+    assert snapshot.get_genre(WESTERN) == GENRES[2]
+    assert snapshot.list_genres() == GENRES
+
+
+def test_missing_and_malformed_ids(snapshot):
+    assert snapshot.get_film(str(uuid4())) is None
+    assert snapshot.get_film('not-a-uuid') is None
+    assert snapshot.get_person(DRAMA) is None
+
+
+def test_sorted_pages(snapshot):
+    assert ids(snapshot.list_films('-imdb_rating', 0, 2)) == [GAMMA, ALPHA]
+    assert ids(snapshot.list_films('-imdb_rating', 2, 4)) == [DELTA, BETA]
+    assert ids(snapshot.list_films('imdb_rating', 0, 10)) == [BETA, DELTA, ALPHA, GAMMA]
+    assert ids(snapshot.list_films('title', 1, 3)) == [BETA, DELTA]
+    assert snapshot.list_films('title', 4, 8) == []
+    assert snapshot.list_films('-year', 0, 10) is None
+
+
+def test_pages_hold_only_card_fields(snapshot):
+    assert snapshot.list_films('title', 0, 1) == [{field: MOVIES[0][field] for field in FILM_CARD_FIELDS}]
+
+
+def test_genre_postings(snapshot):
+    assert ids(snapshot.list_films('-imdb_rating', 0, 10, DRAMA)) == [ALPHA, DELTA, BETA]
+    assert ids(snapshot.list_films('-imdb_rating', 1, 2, DRAMA)) == [DELTA]
+    assert ids(snapshot.list_films('title', 0, 10, COMEDY)) == [BETA, GAMMA]
+    assert ids(snapshot.list_films('-title', 0, 10, UUID(COMEDY))) == [GAMMA, BETA]
+    assert snapshot.list_films('title', 0, 10, WESTERN) == []
+    assert snapshot.list_films('title', 0, 10, str(uuid4())) == []
+
+
+def test_person_films(snapshot):
+    # По убыванию рейтинга, без повторов для персоны в нескольких ролях
+    assert ids(snapshot.get_person_films(KEANU)) == [ALPHA, BETA]
+    assert ids(snapshot.get_person_films(CARRIE)) == [GAMMA, BETA]
+    assert snapshot.get_person_films(NOBODY) == []
+    assert snapshot.get_person_films(str(uuid4())) is None
+
+
+def test_empty_snapshot(tmp_path):
+    path = tmp_path / 'empty.bin'
+    write_snapshot(path, [], [], [])
+    snapshot = CatalogueSnapshot(path)
+    assert snapshot.get_film(ALPHA) is None
+    assert snapshot.get_person_films(KEANU) is None
+    assert snapshot.list_films('-imdb_rating', 0, 10) == []
+    assert snapshot.list_films('title', 0, 10, DRAMA) == []
+    assert snapshot.list_genres() == []
+
+
+def test_documents_without_uuid_are_skipped(tmp_path, caplog):
+    path = tmp_path / 'snapshot.bin'
+    with caplog.at_level(logging.WARNING):
+        write_snapshot(path, MOVIES + [{'id': 'tt0111161', 'title': 'Broken', 'imdb_rating': 9.3}], PERSONS, GENRES)
+    assert 'tt0111161' in caplog.text
+    snapshot = CatalogueSnapshot(path)
+    assert snapshot.get_film('tt0111161') is None
+    assert ids(snapshot.list_films('-imdb_rating', 0, 10)) == [GAMMA, ALPHA, DELTA, BETA]
+
+
+def test_refresh_follows_current_pointer(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'SNAPSHOT_DIR', tmp_path)
+    monkeypatch.setattr(snapshot_service, 'snapshot', None)
+    assert asyncio.run(snapshot_service.refresh_snapshot()) is None
+
+    for name, movies in (('snapshot-1.bin', MOVIES[:1]), ('snapshot-2.bin', MOVIES)):
+        write_snapshot(tmp_path / name, movies, PERSONS, GENRES)
+        (tmp_path / snapshot_service.CURRENT_POINTER).write_text(name)
+        loaded = asyncio.run(snapshot_service.refresh_snapshot())
+        assert loaded.name == name
+        assert len(loaded.movies) == len(movies)
+    assert asyncio.run(snapshot_service.refresh_snapshot()) is loaded
@@ -0,0 +1,80 @@
+import asyncio
+import uuid
+
+import pytest
+
+from benchmarks.fakes import Dataset, FakeElasticsearch
+from src.services import suggest_index as suggest_service
+from src.services.suggest_index import PrefixIndex, SuggestIndex, normalize
+
+# Уже упорядочены по убыванию популярности
+TITLES = ['Star Wars', 'Star Trek', 'The Last Starfighter', 'Wars of the Worlds', 'Return of the Star', 'War War']
+
+
+def index(precomputed_length: int, top_k: int = 10) -> PrefixIndex:
+    titles = [normalize(title) for title in TITLES]
+    return PrefixIndex(list(TITLES), titles, top_k=top_k, precomputed_length=precomputed_length)
+
+
+@pytest.fixture(params=[0, 3, 50], ids=['scan', 'precomputed-short', 'precomputed-all'])
+def prefix_index(request) -> PrefixIndex:
+    return index(request.param)
+
+
+def test_prefix_of_any_word(prefix_index):
+    assert prefix_index.search('sta', 10) == ['Star Wars', 'Star Trek', 'The Last Starfighter', 'Return of the Star']
+    assert prefix_index.search('star w', 10) == ['Star Wars']
+    assert prefix_index.search('worl', 10) == ['Wars of the Worlds']
+    assert prefix_index.search('the star', 10) == ['Return of the Star']
+
+
+def test_only_word_boundaries_match(prefix_index):
+    assert prefix_index.search('tar', 10) == []
+    assert prefix_index.search('ars', 10) == []
+    assert prefix_index.search('starw', 10) == []
+
+
+def test_query_is_normalized(prefix_index):
+    assert prefix_index.search('  STAR   wars ', 10) == ['Star Wars']
+    assert prefix_index.search('   ', 10) == []
+
+
+def test_ranking_and_limits(prefix_index):
+    # Каждый элемент один раз, даже если префикс подходит к нескольким его словам
+    assert prefix_index.search('war', 10) == ['Star Wars', 'Wars of the Worlds', 'War War']
+    assert prefix_index.search('war', 2) == ['Star Wars', 'Wars of the Worlds']
+    assert prefix_index.search('zzz', 10) == []
+
+
+def test_size_is_capped_by_top_k():
+    assert index(precomputed_length=3, top_k=2).search('s', 10) == ['Star Wars', 'Star Trek']
+    assert index(precomputed_length=0, top_k=2).search('star', 10) == ['Star Wars', 'Star Trek']
+
+
+def test_suggest_results_are_cached():
+    suggest = SuggestIndex(films=index(3), persons=index(3))
+    first = suggest.suggest_films('Star', 5)
+    assert suggest.suggest_films('star ', 5) is first
+    assert suggest.suggest_films('star', 1) == ['Star Wars']
+
+
+def test_rebuild_only_when_indexes_change(monkeypatch):
+    monkeypatch.setattr(suggest_service, 'suggest_index', None)
+    monkeypatch.setattr(suggest_service, '_suggest_marker', None)
+    dataset = Dataset(films=50, persons=20)
+    elastic = FakeElasticsearch(dataset)
+
+    async def scenario():
+        built = await suggest_service.refresh_suggest_index(elastic)
+        assert len(built.films) == 50
+        scans = elastic.calls['search']
+        assert await suggest_service.refresh_suggest_index(elastic) is built
+        assert elastic.calls['search'] == scans
+
+        dataset.films.append({**dataset.films[0], 'id': str(uuid.uuid4()), 'title': 'Brand New Film'})
+        elastic._engines.clear()
+        rebuilt = await suggest_service.refresh_suggest_index(elastic)
+        assert rebuilt is not built
+        assert [film.title for film in rebuilt.suggest_films('brand new', 5)] == ['Brand New Film']
+
+    asyncio.run(scenario())